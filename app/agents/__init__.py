@@ -6,10 +6,12 @@ from .classifier_agent import classifier_agent
 from .email_agent import email_agent
 from .json_agent import json_agent
 from .pdf_agent import pdf_agent
+from .llm import llm_cache
 
 __all__ = [
     'classifier_agent',
     'email_agent',
     'json_agent',
-    'pdf_agent'
+    'pdf_agent',
+    'llm_cache'
 ] 
\ No newline at end of file
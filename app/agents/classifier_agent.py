@@ -1,23 +1,22 @@
-from typing import Dict, Any, Tuple
-import google.generativeai as genai
-import os
+from typing import Dict, Any, Tuple, Union
 import json
+import os
 import re
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from .llm import LLMClient
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# RFC 822 header line, e.g. "Subject: Quarterly invoice"
+HEADER_LINE = re.compile(r'^([A-Za-z0-9-]+):')
 
 class ClassifierAgent:
     """Agent responsible for classifying input type and business intent"""
     
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.llm = LLMClient('gemini-1.5-flash')
+        # Local classifications at or above this confidence skip the LLM
+        self.fast_path_threshold = float(os.getenv("CLASSIFIER_FAST_PATH_THRESHOLD", "0.85"))
 
-    def classify(self, content: str) -> Dict[str, Any]:
+    def classify(self, content: Union[str, bytes]) -> Dict[str, Any]:
         """
         Classify the input content
         
@@ -28,7 +27,161 @@ class ClassifierAgent:
             dict: Classification results
         """
         try:
-            prompt = f"""Classify this content and return ONLY a JSON object with no other text.
+            fast = self.classify_fast(content)
+            # Binary formats are only recognised here; there is no text for the model yet
+            if fast["confidence"] >= self.fast_path_threshold or fast["method"] == "magic_bytes":
+                return {"status": "success", "classification": fast}
+            
+            content = self._decode(content)
+            response_text = self.llm.generate(self._build_prompt(content))
+            return self._parse_classification(response_text, content)
+        except Exception as e:
+            print(f"Classification error: {e}")
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
+    async def classify_async(self, content: Union[str, bytes]) -> Dict[str, Any]:
+        """
+        Classify the input content without blocking the event loop
+        
+        Args:
+            content: The content to classify
+            
+        Returns:
+            dict: Classification results
+        """
+        try:
+            fast = self.classify_fast(content)
+            # Binary formats are only recognised here; there is no text for the model yet
+            if fast["confidence"] >= self.fast_path_threshold or fast["method"] == "magic_bytes":
+                return {"status": "success", "classification": fast}
+            
+            content = self._decode(content)
+            response_text = await self.llm.generate_async(self._build_prompt(content))
+            return self._parse_classification(response_text, content)
+        except Exception as e:
+            print(f"Classification error: {e}")
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
+    async def classify_extracted_async(self, text: str, input_type: str) -> Dict[str, Any]:
+        """
+        Classify the business intent of text extracted from a binary upload
+        
+        The format is already known from the magic bytes and is kept; intent,
+        urgency and confidence come from the text, through the fast path or
+        the LLM as in classify_async.
+        
+        Args:
+            text: Text extracted by the agent
+            input_type: The format recognised from the raw upload
+            
+        Returns:
+            dict: Classification results
+        """
+        result = await self.classify_async(text)
+        if result["status"] == "success":
+            classification = result["classification"]
+            classification["input_type"] = input_type
+            metadata = classification.setdefault("metadata", {})
+            for key, value in self._extract_metadata(text, input_type).items():
+                metadata.setdefault(key, value)
+        return result
+
+    def classify_fast(self, content: Union[str, bytes]) -> Dict[str, Any]:
+        """
+        Classify the input locally without calling the LLM
+        
+        Stages run from cheapest and most certain to least: magic bytes,
+        structural JSON parse, RFC 822 header sniffing, then the keyword
+        heuristics.
+        
+        Args:
+            content: The raw upload or decoded content
+            
+        Returns:
+            dict: Classification with a confidence between 0.0 and 1.0
+        """
+        head = content[:5] if isinstance(content, bytes) else content[:5].encode('utf-8', errors='ignore')
+        if head.startswith(b'%PDF'):
+            # Only the format is certain: raw PDF bytes carry no readable text, so the
+            # intent is classified from the extracted text (classify_extracted_async)
+            return {
+                "input_type": "pdf",
+                "business_intent": self._detect_intent(""),
+                "confidence": 0.0,
+                "method": "magic_bytes",
+                "metadata": self._extract_metadata("", "pdf")
+            }
+        
+        text = self._decode(content)
+        stripped = text.strip()
+        
+        if stripped[:1] in ('{', '[') and self._is_json(stripped):
+            input_type, confidence, method = "json", 0.95, "structural_parse"
+        elif self._has_email_headers(text):
+            input_type, confidence, method = "email", 0.9, "header_sniffing"
+        else:
+            input_type, method = self._detect_input_type(text), "keyword_heuristics"
+            confidence = 0.5 if input_type != "unknown" else 0.0
+        
+        business_intent = self._detect_intent(text)
+        if business_intent == "General":
+            # No intent keyword matched; the model may still find one
+            confidence *= 0.8
+        
+        metadata = self._extract_metadata(text, input_type)
+        metadata.setdefault(
+            "urgency",
+            "high" if any(word in text.lower() for word in ["urgent", "critical", "asap"]) else "medium"
+        )
+        
+        return {
+            "input_type": input_type,
+            "business_intent": business_intent,
+            "confidence": round(confidence, 2),
+            "method": method,
+            "metadata": metadata
+        }
+
+    def _decode(self, content: Union[str, bytes]) -> str:
+        """Decode raw bytes as UTF-8, falling back to latin-1"""
+        if isinstance(content, str):
+            return content
+        try:
+            return content.decode('utf-8')
+        except UnicodeDecodeError:
+            return content.decode('latin-1', errors='ignore')
+
+    def _is_json(self, text: str) -> bool:
+        """Check whether text parses as JSON"""
+        try:
+            json.loads(text)
+            return True
+        except ValueError:
+            return False
+
+    def _has_email_headers(self, text: str) -> bool:
+        """Check whether text starts with an RFC 822 header block containing From and To/Subject"""
+        headers = set()
+        for line in text.lstrip().splitlines()[:50]:
+            if not line.strip():
+                break
+            if line[0] in ' \t':
+                continue  # folded header continuation
+            match = HEADER_LINE.match(line)
+            if not match:
+                return False
+            headers.add(match.group(1).lower())
+        return "from" in headers and ("to" in headers or "subject" in headers)
+
+    def _build_prompt(self, content: str) -> str:
+        """Build the classification prompt"""
+        return f"""Classify this content and return ONLY a JSON object with no other text.
 
 IMPORTANT: business_intent must NEVER be null. Always assign one of these values:
 - "Invoice" (for bills, payments, receipts, financial documents)
@@ -52,55 +205,48 @@ Return this exact JSON structure:
 
 Content to classify: {content[:800]}"""
 
-            # Get classification from Gemini
-            response = self.model.generate_content(prompt)
+    def _parse_classification(self, response_text: str, content: str) -> Dict[str, Any]:
+        """Parse the model response, falling back to heuristics if it is not valid JSON"""
+        content_str = response_text
+        try:
+            content_str = response_text.strip()
+            print(f"Classifier raw response: '{content_str}'")
             
-            # Clean and parse the response
-            try:
-                content_str = response.text.strip()
-                print(f"Classifier raw response: '{content_str}'")
+            # Remove markdown formatting if present
+            if content_str.startswith('```'):
+                content_str = re.sub(r'```[a-z]*\s*', '', content_str)
+                content_str = re.sub(r'```\s*$', '', content_str)
+                content_str = content_str.strip()
+            
+            # Try to find JSON in the response
+            if '{' in content_str and '}' in content_str:
+                start = content_str.find('{')
+                end = content_str.rfind('}') + 1
+                json_str = content_str[start:end]
                 
-                # Remove markdown formatting if present
-                if content_str.startswith('```'):
-                    content_str = re.sub(r'```[a-z]*\s*', '', content_str)
-                    content_str = re.sub(r'```\s*$', '', content_str)
-                    content_str = content_str.strip()
+                # Clean any problematic characters
+                json_str = json_str.replace('\n', ' ').replace('\t', ' ')
+                json_str = re.sub(r'\s+', ' ', json_str)
                 
-                # Try to find JSON in the response
-                if '{' in content_str and '}' in content_str:
-                    start = content_str.find('{')
-                    end = content_str.rfind('}') + 1
-                    json_str = content_str[start:end]
-                    
-                    # Clean any problematic characters
-                    json_str = json_str.replace('\n', ' ').replace('\t', ' ')
-                    json_str = re.sub(r'\s+', ' ', json_str)
-                    
-                    classification = json.loads(json_str)
-                else:
-                    raise json.JSONDecodeError("No JSON found", content_str, 0)
-                    
-            except (json.JSONDecodeError, Exception) as e:
-                print(f"JSON parsing failed: {e}")
-                print(f"Failed content: '{content_str[:200]}'")
-                # Fallback classification using simple heuristics
-                classification = {
-                    "input_type": self._detect_input_type(content),
-                    "business_intent": self._detect_intent(content),
-                    "confidence": 0.5,
-                    "metadata": self._extract_metadata(content, self._detect_input_type(content))
-                }
-            
-            return {
-                "status": "success",
-                "classification": classification
-            }
-        except Exception as e:
-            print(f"Classification error: {e}")
-            return {
-                "status": "error",
-                "error": str(e)
+                classification = json.loads(json_str)
+            else:
+                raise json.JSONDecodeError("No JSON found", content_str, 0)
+                
+        except (json.JSONDecodeError, Exception) as e:
+            print(f"JSON parsing failed: {e}")
+            print(f"Failed content: '{content_str[:200]}'")
+            # Fallback classification using simple heuristics
+            classification = {
+                "input_type": self._detect_input_type(content),
+                "business_intent": self._detect_intent(content),
+                "confidence": 0.5,
+                "metadata": self._extract_metadata(content, self._detect_input_type(content))
             }
+        
+        return {
+            "status": "success",
+            "classification": classification
+        }
 
     def _detect_input_type(self, content: str) -> str:
         """Fallback method to detect input type"""
@@ -184,7 +330,7 @@ Content to classify: {content[:800]}"""
                 metadata.update({
                     "has_nested_objects": any(isinstance(v, dict) for v in data.values()) if isinstance(data, dict) else False,
                     "field_count": len(data) if isinstance(data, dict) else 0,
-                    "amount": data.get("amount") or (data.get("data", {}).get("amount") if isinstance(data.get("data"), dict) else None)
+                    "amount": (data.get("amount") or (data.get("data", {}).get("amount") if isinstance(data.get("data"), dict) else None)) if isinstance(data, dict) else None
                 })
             except json.JSONDecodeError:
                 metadata.update({
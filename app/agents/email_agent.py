@@ -1,23 +1,17 @@
-from typing import Dict, Any
-import google.generativeai as genai
+from typing import Dict, Any, Tuple
 import json
-import os
 from email.parser import Parser
 from email.policy import default
 import re
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+from .executor import run_blocking
+from .llm import LLMClient
 
 class EmailAgent:
     """Agent responsible for processing email content"""
     
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.llm = LLMClient('gemini-1.5-flash')
 
     def process_email(self, email_content: str) -> Dict[str, Any]:
         """
@@ -30,30 +24,65 @@ class EmailAgent:
             dict: Analysis results
         """
         try:
-            # Parse email
-            email = Parser(policy=default).parsestr(email_content)
+            metadata, body = self._parse_email(email_content)
+            response_text = self.llm.generate(self._build_prompt(body))
+            return self._build_result(response_text, metadata, body)
             
-            # Extract basic metadata
-            metadata = {
-                "from": email.get("from", ""),
-                "to": email.get("to", ""),
-                "subject": email.get("subject", ""),
-                "date": email.get("date", ""),
-                "has_attachments": bool(email.get_payload() and len(email.get_payload()) > 1)
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e)
             }
+
+    async def process_email_async(self, email_content: str) -> Dict[str, Any]:
+        """
+        Process email content without blocking the event loop
+        
+        Args:
+            email_content: Raw email content
             
-            # Get email body
-            body = ""
-            if email.is_multipart():
-                for part in email.get_payload():
-                    if part.get_content_type() == "text/plain":
-                        body = part.get_payload(decode=True).decode()
-                        break
-            else:
-                body = email.get_payload(decode=True).decode()
+        Returns:
+            dict: Analysis results
+        """
+        try:
+            metadata, body = await run_blocking(self._parse_email, email_content)
+            response_text = await self.llm.generate_async(self._build_prompt(body))
+            return self._build_result(response_text, metadata, body)
             
-            # Analyze content with Gemini
-            prompt = f"""You are an email analysis expert. Your task is to:
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
+    def _parse_email(self, email_content: str) -> Tuple[Dict[str, Any], str]:
+        """Parse raw email content into metadata and plain-text body"""
+        email = Parser(policy=default).parsestr(email_content)
+        
+        # Extract basic metadata
+        metadata = {
+            "from": email.get("from", ""),
+            "to": email.get("to", ""),
+            "subject": email.get("subject", ""),
+            "date": email.get("date", ""),
+            "has_attachments": bool(email.get_payload() and len(email.get_payload()) > 1)
+        }
+        
+        # Get email body
+        body = ""
+        if email.is_multipart():
+            for part in email.get_payload():
+                if part.get_content_type() == "text/plain":
+                    body = part.get_payload(decode=True).decode()
+                    break
+        else:
+            body = email.get_payload(decode=True).decode()
+            
+        return metadata, body
+
+    def _build_prompt(self, body: str) -> str:
+        """Build the email analysis prompt"""
+        return f"""You are an email analysis expert. Your task is to:
 1. Analyze the email content
 2. Determine the tone (formal, informal, urgent, etc.)
 3. Identify key entities and relationships
@@ -78,43 +107,37 @@ Provide your response in JSON format with the following structure:
 Email content to analyze:
 {body[:1000]}"""
 
-            response = self.model.generate_content(prompt)
-            
-            # Parse the response safely
-            try:
-                content_str = response.text.strip()
-                # Find JSON content between curly braces
-                if '{' in content_str and '}' in content_str:
-                    start = content_str.find('{')
-                    end = content_str.rfind('}') + 1
-                    json_str = content_str[start:end]
-                    analysis = json.loads(json_str)
-                else:
-                    analysis = json.loads(content_str)
-            except json.JSONDecodeError:
-                # Fallback analysis if parsing fails
-                analysis = {
-                    "tone": "neutral",
-                    "urgency": "medium",
-                    "entities": self._extract_entities(body),
-                    "action_items": [],
-                    "sentiment": "neutral",
-                    "key_topics": []
-                }
-            
-            # Combine results
-            return {
-                "status": "success",
-                "metadata": metadata,
-                "analysis": analysis,
-                "raw_content": body
-            }
-            
-        except Exception as e:
-            return {
-                "status": "error",
-                "error": str(e)
+    def _build_result(self, response_text: str, metadata: Dict[str, Any], body: str) -> Dict[str, Any]:
+        """Parse the model response and combine it with the email metadata"""
+        # Parse the response safely
+        try:
+            content_str = response_text.strip()
+            # Find JSON content between curly braces
+            if '{' in content_str and '}' in content_str:
+                start = content_str.find('{')
+                end = content_str.rfind('}') + 1
+                json_str = content_str[start:end]
+                analysis = json.loads(json_str)
+            else:
+                analysis = json.loads(content_str)
+        except json.JSONDecodeError:
+            # Fallback analysis if parsing fails
+            analysis = {
+                "tone": "neutral",
+                "urgency": "medium",
+                "entities": self._extract_entities(body),
+                "action_items": [],
+                "sentiment": "neutral",
+                "key_topics": []
             }
+        
+        # Combine results
+        return {
+            "status": "success",
+            "metadata": metadata,
+            "analysis": analysis,
+            "raw_content": body
+        }
 
     def _extract_entities(self, text: str) -> Dict[str, list]:
         """Extract named entities from text"""
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+import asyncio
+import multiprocessing
+import os
+
+# Bounded pool for blocking parsing work (pypdf, email parsing, JSON validation)
+_parse_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PARSE_WORKERS", str(min(32, (os.cpu_count() or 1) + 4)))),
+    thread_name_prefix="parse"
+)
+
+# Process pool for CPU-bound work that needs more than one core; created on first use
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking function on the parse executor without stalling the event loop
+    
+    Args:
+        func: The blocking callable
+        *args, **kwargs: Arguments passed to the callable
+        
+    Returns:
+        The callable's return value
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_parse_executor, partial(func, *args, **kwargs))
+
+async def run_in_process(func: Callable[..., Any], *args) -> Any:
+    """
+    Run a picklable top-level function on the shared process pool
+    
+    Args:
+        func: The module-level callable
+        *args: Picklable arguments passed to the callable
+        
+    Returns:
+        The callable's return value
+    """
+    global _process_pool
+    if _process_pool is None:
+        # spawn avoids forking a process that already runs executor threads
+        _process_pool = ProcessPoolExecutor(
+            max_workers=int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1))),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_process_pool, func, *args)
+
+def shutdown_process_pool():
+    """Shut down the process pool; it is recreated on next use"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
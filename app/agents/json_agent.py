@@ -1,21 +1,15 @@
 from typing import Dict, Any, List
 import json
-import google.generativeai as genai
-import os
 from jsonschema import validate, ValidationError
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-# Configure Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+from .executor import run_blocking
+from .llm import LLMClient
 
 class JSONAgent:
     """Agent responsible for processing and validating JSON data"""
     
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.llm = LLMClient('gemini-1.5-flash')
         
         # Common JSON schemas
         self.schemas = {
@@ -53,8 +47,52 @@ class JSONAgent:
             # Parse JSON
             data = json.loads(json_content)
             
-            # Analyze with Gemini
-            prompt = f"""You are a JSON analysis expert. Your task is to:
+            response_text = self.llm.generate(self._build_prompt(json_content))
+            return self._build_result(response_text, data)
+            
+        except json.JSONDecodeError as e:
+            return {
+                "status": "error",
+                "error": f"Invalid JSON: {str(e)}"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
+    async def process_json_async(self, json_content: str) -> Dict[str, Any]:
+        """
+        Process JSON content without blocking the event loop
+        
+        Args:
+            json_content: Raw JSON content as string
+            
+        Returns:
+            dict: Analysis results
+        """
+        try:
+            # Parse JSON
+            data = await run_blocking(json.loads, json_content)
+            
+            response_text = await self.llm.generate_async(self._build_prompt(json_content))
+            # Schema validation is CPU-bound on large payloads
+            return await run_blocking(self._build_result, response_text, data)
+            
+        except json.JSONDecodeError as e:
+            return {
+                "status": "error",
+                "error": f"Invalid JSON: {str(e)}"
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
+    def _build_prompt(self, json_content: str) -> str:
+        """Build the JSON analysis prompt"""
+        return f"""You are a JSON analysis expert. Your task is to:
 1. Analyze the JSON structure
 2. Identify key fields and their types
 3. Detect potential anomalies or inconsistencies
@@ -84,64 +122,53 @@ Provide your response in JSON format with the following structure:
 JSON content to analyze:
 {json_content[:1000]}"""
 
-            response = self.model.generate_content(prompt)
-            
-            # Parse the response safely
-            try:
-                content_str = response.text.strip()
-                # Find JSON content between curly braces
-                if '{' in content_str and '}' in content_str:
-                    start = content_str.find('{')
-                    end = content_str.rfind('}') + 1
-                    json_str = content_str[start:end]
-                    analysis = json.loads(json_str)
-                else:
-                    analysis = json.loads(content_str)
-            except json.JSONDecodeError:
-                # Fallback analysis if parsing fails
-                analysis = {
-                    "schema_analysis": {
-                        "required_fields": list(data.keys()) if isinstance(data, dict) else [],
-                        "optional_fields": [],
-                        "field_types": {k: type(v).__name__ for k, v in data.items()} if isinstance(data, dict) else {}
-                    },
-                    "anomalies": [],
-                    "data_quality": {
-                        "completeness": 0.8,
-                        "consistency": 0.9,
-                        "issues": []
-                    },
-                    "business_context": {
-                        "type": "other",
-                        "priority": "medium",
-                        "action_required": False
-                    }
+    def _build_result(self, response_text: str, data: Any) -> Dict[str, Any]:
+        """Parse the model response and add schema validation and anomaly checks"""
+        # Parse the response safely
+        try:
+            content_str = response_text.strip()
+            # Find JSON content between curly braces
+            if '{' in content_str and '}' in content_str:
+                start = content_str.find('{')
+                end = content_str.rfind('}') + 1
+                json_str = content_str[start:end]
+                analysis = json.loads(json_str)
+            else:
+                analysis = json.loads(content_str)
+        except json.JSONDecodeError:
+            # Fallback analysis if parsing fails
+            analysis = {
+                "schema_analysis": {
+                    "required_fields": list(data.keys()) if isinstance(data, dict) else [],
+                    "optional_fields": [],
+                    "field_types": {k: type(v).__name__ for k, v in data.items()} if isinstance(data, dict) else {}
+                },
+                "anomalies": [],
+                "data_quality": {
+                    "completeness": 0.8,
+                    "consistency": 0.9,
+                    "issues": []
+                },
+                "business_context": {
+                    "type": "other",
+                    "priority": "medium",
+                    "action_required": False
                 }
-            
-            # Validate against known schemas
-            schema_validation = self._validate_against_schemas(data)
-            
-            # Check for anomalies
-            anomalies = self._detect_anomalies(data)
-            
-            return {
-                "status": "success",
-                "analysis": analysis,
-                "schema_validation": schema_validation,
-                "anomalies": anomalies,
-                "parsed_data": data
-            }
-            
-        except json.JSONDecodeError as e:
-            return {
-                "status": "error",
-                "error": f"Invalid JSON: {str(e)}"
-            }
-        except Exception as e:
-            return {
-                "status": "error",
-                "error": str(e)
             }
+        
+        # Validate against known schemas
+        schema_validation = self._validate_against_schemas(data)
+        
+        # Check for anomalies
+        anomalies = self._detect_anomalies(data)
+        
+        return {
+            "status": "success",
+            "analysis": analysis,
+            "schema_validation": schema_validation,
+            "anomalies": anomalies,
+            "parsed_data": data
+        }
 
     def _validate_against_schemas(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Validate JSON against known schemas"""
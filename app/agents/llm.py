@@ -0,0 +1,271 @@
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+import google.generativeai as genai
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure Gemini
+genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+# Caps concurrent Gemini requests across all agents in this process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+_llm_slots: Optional[asyncio.Semaphore] = None
+_llm_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _loop_llm_slots() -> asyncio.Semaphore:
+    """The request semaphore, recreated when agents run on a new event loop"""
+    global _llm_slots, _llm_slots_loop
+    loop = asyncio.get_running_loop()
+    if loop is not _llm_slots_loop:
+        # A semaphore is tied to the loop that first waits on it
+        _llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        _llm_slots_loop = loop
+    return _llm_slots
+
+# The response cache lives in its own database so it can be shared or wiped independently
+CacheBase = declarative_base()
+
+class LLMCacheEntry(CacheBase):
+    """Model for cached LLM responses"""
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)  # SHA-256 of model name and prompt
+    model_name = Column(String(100))
+    response = Column(Text)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class LLMResponseCache:
+    """On-disk cache of LLM responses keyed by model name and prompt hash"""
+
+    def __init__(self):
+        db_url = os.getenv("LLM_CACHE_URL", "sqlite:///./llm_cache.db")
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self.ttl = timedelta(seconds=int(os.getenv("LLM_CACHE_TTL_SECONDS", "2592000")))
+        self.max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+        self.engine = create_engine(db_url)
+        CacheBase.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, model_name: str, prompt: str) -> str:
+        """Hash the model name and prompt into a cache key"""
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model_name: str, prompt: str) -> Optional[str]:
+        """
+        Look up a cached response
+
+        Args:
+            model_name: Name of the model the prompt was sent to
+            prompt: The full prompt text
+
+        Returns:
+            str: The cached response text, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        session = self.Session()
+        try:
+            entry = session.get(LLMCacheEntry, self.make_key(model_name, prompt))
+            now = datetime.utcnow()
+            if entry and entry.created_at < now - self.ttl:
+                session.delete(entry)
+                session.commit()
+                entry = None
+            if not entry:
+                with self._lock:
+                    self.misses += 1
+                return None
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.last_accessed_at = now
+            response = entry.response
+            session.commit()
+            with self._lock:
+                self.hits += 1
+            return response
+        finally:
+            session.close()
+
+    def put(self, model_name: str, prompt: str, response: str) -> None:
+        """Store a response, periodically evicting expired and least recently used entries"""
+        if not self.enabled:
+            return
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            session.merge(LLMCacheEntry(
+                key=self.make_key(model_name, prompt),
+                model_name=model_name,
+                response=response,
+                hit_count=0,
+                created_at=now,
+                last_accessed_at=now
+            ))
+            session.commit()
+        finally:
+            session.close()
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % 100 == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries and trim the cache to its maximum size"""
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            removed = session.query(LLMCacheEntry).filter(
+                LLMCacheEntry.created_at < now - self.ttl
+            ).delete(synchronize_session=False)
+
+            overflow = session.query(LLMCacheEntry).count() - self.max_entries
+            if overflow > 0:
+                oldest = session.query(LLMCacheEntry.key).order_by(
+                    LLMCacheEntry.last_accessed_at
+                ).limit(overflow)
+                removed += session.query(LLMCacheEntry).filter(
+                    LLMCacheEntry.key.in_(oldest.scalar_subquery())
+                ).delete(synchronize_session=False)
+            session.commit()
+            return removed
+        finally:
+            session.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process and the number of stored entries"""
+        session = self.Session()
+        try:
+            entries = session.query(LLMCacheEntry).count()
+        finally:
+            session.close()
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def export_entries(self, path: str) -> int:
+        """
+        Write all live entries to an NDJSON file
+
+        Args:
+            path: Destination file path
+
+        Returns:
+            int: Number of entries written
+        """
+        session = self.Session()
+        count = 0
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                for entry in session.query(LLMCacheEntry).yield_per(1000):
+                    f.write(json.dumps({
+                        "key": entry.key,
+                        "model_name": entry.model_name,
+                        "response": entry.response,
+                        "created_at": entry.created_at.isoformat()
+                    }) + "\n")
+                    count += 1
+            return count
+        finally:
+            session.close()
+
+    def import_entries(self, path: str) -> int:
+        """
+        Warm the cache from an NDJSON file produced by export_entries
+
+        Args:
+            path: Source file path
+
+        Returns:
+            int: Number of entries imported
+        """
+        session = self.Session()
+        count = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    now = datetime.utcnow()
+                    session.merge(LLMCacheEntry(
+                        key=item["key"],
+                        model_name=item["model_name"],
+                        response=item["response"],
+                        hit_count=0,
+                        created_at=datetime.fromisoformat(item["created_at"]),
+                        last_accessed_at=now
+                    ))
+                    count += 1
+                    if count % 1000 == 0:
+                        session.commit()
+            session.commit()
+            return count
+        finally:
+            session.close()
+
+# Initialize the shared response cache
+llm_cache = LLMResponseCache()
+
+class LLMClient:
+    """Thin wrapper around a Gemini model with sync and async text generation"""
+
+    def __init__(self, model_name: str = 'gemini-1.5-flash', cache: Optional[LLMResponseCache] = None):
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.cache = cache or llm_cache
+
+    def generate(self, prompt: str) -> str:
+        """
+        Generate a response, blocking the calling thread
+
+        Args:
+            prompt: The prompt to send
+
+        Returns:
+            str: The response text
+        """
+        cached = self.cache.get(self.model_name, prompt)
+        if cached is not None:
+            return cached
+        response = self.model.generate_content(prompt)
+        self.cache.put(self.model_name, prompt, response.text)
+        return response.text
+
+    async def generate_async(self, prompt: str) -> str:
+        """
+        Generate a response using Gemini's native async API
+
+        Args:
+            prompt: The prompt to send
+
+        Returns:
+            str: The response text
+        """
+        cached = await asyncio.to_thread(self.cache.get, self.model_name, prompt)
+        if cached is not None:
+            return cached
+        async with _loop_llm_slots():
+            response = await self.model.generate_content_async(prompt)
+        await asyncio.to_thread(self.cache.put, self.model_name, prompt, response.text)
+        return response.text
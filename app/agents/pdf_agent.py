@@ -1,23 +1,151 @@
-from typing import Dict, Any, List
-import google.generativeai as genai
-import os
+from typing import Dict, Any, List, Tuple, Optional, AsyncIterator, Union
+from collections import deque
+import asyncio
 import json
 import io
+import os
+import signal
 from pypdf import PdfReader
 import re
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from .executor import run_blocking, run_in_process
+from .llm import LLMClient
+
+class PageTimeout(Exception):
+    """Raised inside an extraction worker when a single page takes too long"""
+
+def _on_page_timeout(signum, frame):
+    raise PageTimeout()
+
+def _open_reader(source: Union[bytes, str]) -> PdfReader:
+    """Open a PDF from raw bytes or a file path"""
+    return PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+def _count_pages(source: Union[bytes, str]) -> int:
+    """Count the pages of a PDF"""
+    return len(_open_reader(source).pages)
+
+def _extract_page_range(source: Union[bytes, str], start: int, end: int, page_timeout: float) -> List[Optional[str]]:
+    """
+    Extract text from pages [start, end) of a PDF
+    
+    Runs in a worker process. Each page gets its own timer, so one
+    pathological page is skipped instead of stalling the whole range.
+    
+    Args:
+        source: Raw PDF bytes or the path of a spooled file
+        start: First page index
+        end: Page index to stop before
+        page_timeout: Seconds allowed per page
+        
+    Returns:
+        list: Text per page, or None for pages that timed out or failed
+    """
+    reader = _open_reader(source)
+    # SIGALRM is only available on Unix and only from the main thread
+    use_timer = hasattr(signal, "setitimer") and page_timeout > 0
+    if use_timer:
+        try:
+            previous = signal.signal(signal.SIGALRM, _on_page_timeout)
+        except ValueError:
+            use_timer = False
+    
+    pages = []
+    try:
+        for index in range(start, end):
+            try:
+                if use_timer:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                pages.append(reader.pages[index].extract_text())
+            except Exception:
+                pages.append(None)
+            finally:
+                if use_timer:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if use_timer:
+            signal.signal(signal.SIGALRM, previous)
+    return pages
+
+# Patterns that might indicate tables
+TABLE_PATTERNS = [
+    re.compile(r'\|\s*[^\n]+\s*\|'),  # Pipe-separated tables
+    re.compile(r'\+[-+]+\+'),         # ASCII tables
+    re.compile(r'\t[^\n]+\t')         # Tab-separated content
+]
+
+# Patterns that might indicate signatures
+SIGNATURE_PATTERNS = [
+    re.compile(r'(?i)signed by:'),
+    re.compile(r'(?i)signature:'),
+    re.compile(r'(?i)authorized by:'),
+    re.compile(r'(?i)approved by:')
+]
+
+class DocumentScanner:
+    """Single-pass compliance, table and signature detection over a stream of page texts"""
+    
+    def __init__(self, compliance_keywords: Dict[str, List[str]]):
+        self.compliance_keywords = compliance_keywords
+        self.pending_keywords = {k for keywords in compliance_keywords.values() for k in keywords}
+        self.found_keywords = set()
+        self.has_tables = False
+        self.has_signatures = False
+        # Pages are joined without separators, so keep the trailing lines
+        # of the previous page to catch matches across the boundary
+        self._tail = ""
+
+    def feed(self, text: str) -> None:
+        """Scan the next chunk of text"""
+        window = self._tail + text
+        
+        if self.pending_keywords:
+            window_lower = window.lower()
+            hits = {k for k in self.pending_keywords if k in window_lower}
+            self.found_keywords |= hits
+            self.pending_keywords -= hits
+        if not self.has_tables:
+            self.has_tables = any(pattern.search(window) for pattern in TABLE_PATTERNS)
+        if not self.has_signatures:
+            self.has_signatures = any(pattern.search(window) for pattern in SIGNATURE_PATTERNS)
+        
+        cut = window.rfind('\n', 0, window.rfind('\n'))
+        self._tail = window[cut + 1:][-4096:]
+
+    @property
+    def done(self) -> bool:
+        """Whether further text cannot change the results"""
+        return not self.pending_keywords and self.has_tables and self.has_signatures
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    def compliance(self) -> Dict[str, Any]:
+        """Compliance keywords found so far, grouped by category"""
+        found_keywords = {}
+        for category, keywords in self.compliance_keywords.items():
+            found = [k for k in keywords if k in self.found_keywords]
+            if found:
+                found_keywords[category] = found
+                
+        return {
+            "keywords_found": found_keywords,
+            "risk_level": "high" if len(found_keywords) > 2 else "medium" if found_keywords else "low"
+        }
 
 class PDFAgent:
     """Agent responsible for processing PDF documents"""
     
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.llm = LLMClient('gemini-1.5-flash')
+        
+        # Page-parallel extraction settings
+        self.page_timeout = float(os.getenv("PDF_PAGE_TIMEOUT_SECONDS", "10"))
+        self.pages_per_task = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+        self.parallel_min_pages = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+        # Page ranges extracted ahead of the consumer
+        self.lookahead = int(os.getenv("PDF_EXTRACT_LOOKAHEAD", "4"))
+        # Characters of raw text retained per document
+        self.max_text_chars = int(os.getenv("PDF_MAX_TEXT_CHARS", "1000000"))
+        # Characters of text sent to the model
+        self.prompt_chars = 1000
         
         # Compliance keywords to check for
         self.compliance_keywords = {
@@ -28,28 +156,150 @@ class PDFAgent:
             "SOX": ["sox", "sarbanes-oxley", "financial control"]
         }
 
-    async def process_pdf(self, pdf_content: bytes) -> Dict[str, Any]:
+    async def process_pdf(self, pdf_content: Union[bytes, str]) -> Dict[str, Any]:
         """
         Process PDF content
         
         Args:
-            pdf_content: Raw PDF content as bytes
+            pdf_content: Raw PDF content as bytes, or the path of a spooled PDF file;
+                paths are passed to extraction workers instead of the bytes
             
         Returns:
             dict: Analysis results
         """
+        llm_task = None
         try:
-            # Parse PDF from bytes
-            pdf_stream = io.BytesIO(pdf_content)
-            pdf = PdfReader(pdf_stream)
+            page_count = await run_blocking(_count_pages, pdf_content)
+            scanner = DocumentScanner(self.compliance_keywords)
+            prompt_parts, prompt_len = [], 0
+            text_parts, text_len = [], 0
+            truncated = False
+            skipped_pages = []
             
-            # Extract text from all pages
-            text_content = ""
-            for page in pdf.pages:
-                text_content += page.extract_text()
+            # One pass over the page stream feeds the prompt, the scanner and the
+            # retained text; the scanner keeps reading past the text cap
+            pages = self._iter_pages(pdf_content, page_count)
+            try:
+                async for index, page_text in pages:
+                    if page_text is None:
+                        skipped_pages.append(index)
+                        continue
+                    
+                    scanner.feed(page_text)
+                    
+                    if llm_task is None:
+                        prompt_parts.append(page_text)
+                        prompt_len += len(page_text)
+                        if prompt_len >= self.prompt_chars:
+                            # Analyze with Gemini while the rest of the document is scanned
+                            llm_task = asyncio.create_task(
+                                self.llm.generate_async(self._build_prompt("".join(prompt_parts)))
+                            )
+                    
+                    if text_len < self.max_text_chars:
+                        kept = page_text[:self.max_text_chars - text_len]
+                        text_parts.append(kept)
+                        text_len += len(kept)
+                        truncated = len(kept) < len(page_text)
+                    elif page_text:
+                        truncated = True
+                    
+                    # Past the text cap pages are only scanned, so stop extracting
+                    # once the scanner has nothing left to find
+                    if truncated and scanner.done:
+                        break
+            finally:
+                await pages.aclose()
+            
+            if llm_task is None:
+                llm_task = asyncio.create_task(
+                    self.llm.generate_async(self._build_prompt("".join(prompt_parts)))
+                )
+            response_text = await llm_task
+            
+            result = self._build_result(response_text, "".join(text_parts), page_count, scanner)
+            if skipped_pages:
+                result["metadata"]["skipped_pages"] = skipped_pages
+            if truncated:
+                result["metadata"]["text_truncated"] = True
+            return result
+            
+        except Exception as e:
+            if llm_task is not None:
+                llm_task.cancel()
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+
+    async def _iter_pages(self, pdf_content: Union[bytes, str], page_count: int) -> AsyncIterator[Tuple[int, Optional[str]]]:
+        """
+        Stream page texts in order, extracting a bounded number of ranges ahead
+        
+        Large documents are split into ranges extracted in parallel on the
+        process pool; small ones are extracted in one go on the parse executor.
+        Both are bounded by the page timeout.
+        Ranges not yet consumed are cancelled when the consumer stops early.
+        
+        Args:
+            pdf_content: Raw PDF bytes or the path of a spooled file
+            page_count: Number of pages in the document
             
-            # Analyze with Gemini
-            prompt = f"""You are a PDF analysis expert. Your task is to:
+        Yields:
+            tuple: Page index and its text, or None if the page was skipped
+        """
+        if page_count < self.parallel_min_pages:
+            ranges = iter([(0, page_count)] if page_count else [])
+        else:
+            ranges = iter([
+                (start, min(start + self.pages_per_task, page_count))
+                for start in range(0, page_count, self.pages_per_task)
+            ])
+        
+        # Small documents are not worth the inter-process transfer
+        in_process = page_count >= self.parallel_min_pages
+        
+        def submit(start: int, end: int) -> asyncio.Future:
+            return asyncio.ensure_future(self._extract_range(pdf_content, start, end, in_process))
+        
+        pending = deque()
+        try:
+            for start, end in ranges:
+                pending.append((start, submit(start, end)))
+                if len(pending) >= self.lookahead:
+                    break
+            while pending:
+                start, future = pending.popleft()
+                chunk = await future
+                next_range = next(ranges, None)
+                if next_range:
+                    pending.append((next_range[0], submit(*next_range)))
+                for offset, page_text in enumerate(chunk):
+                    yield start + offset, page_text
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    async def _extract_range(self, pdf_content: Union[bytes, str], start: int, end: int, in_process: bool = True) -> List[Optional[str]]:
+        """
+        Extract a page range, giving up on the whole range if it overruns
+        
+        On the process pool each page also has its own timer. Threads of the
+        parse executor cannot use one, so there only the range deadline
+        applies; a thread that overruns it finishes in the background.
+        """
+        if in_process:
+            extraction = run_in_process(_extract_page_range, pdf_content, start, end, self.page_timeout)
+        else:
+            extraction = run_blocking(_extract_page_range, pdf_content, start, end, 0)
+        try:
+            return await asyncio.wait_for(extraction, timeout=self.page_timeout * (end - start) + 5)
+        except asyncio.TimeoutError:
+            return [None] * (end - start)
+
+    def _build_prompt(self, text_content: str) -> str:
+        """Build the PDF analysis prompt"""
+        return f"""You are a PDF analysis expert. Your task is to:
 1. Extract key information from the document
 2. Identify document type (invoice, contract, report, etc.)
 3. Extract line items and totals
@@ -85,100 +335,57 @@ Provide your response in JSON format with the following structure:
 PDF content to analyze:
 {text_content[:1000]}"""
 
-            response = self.model.generate_content(prompt)
-            
-            # Parse the response safely
-            try:
-                content_str = response.text.strip()
-                # Find JSON content between curly braces
-                if '{' in content_str and '}' in content_str:
-                    start = content_str.find('{')
-                    end = content_str.rfind('}') + 1
-                    json_str = content_str[start:end]
-                    analysis = json.loads(json_str)
-                else:
-                    analysis = json.loads(content_str)
-            except json.JSONDecodeError:
-                # Fallback analysis if parsing fails
-                analysis = {
-                    "document_type": "other",
-                    "line_items": [],
-                    "totals": {
-                        "subtotal": 0.0,
-                        "tax": 0.0,
-                        "total": 0.0
-                    },
-                    "compliance": {
-                        "keywords_found": [],
-                        "risk_level": "low"
-                    },
-                    "metadata": {
-                        "page_count": len(pdf.pages),
-                        "has_tables": self._detect_tables(text_content),
-                        "has_signatures": self._detect_signatures(text_content)
-                    }
+    def _build_result(self, response_text: str, text_content: str, page_count: int, scanner: DocumentScanner) -> Dict[str, Any]:
+        """Parse the model response and add the scanner's compliance and layout results"""
+        # Parse the response safely
+        try:
+            content_str = response_text.strip()
+            # Find JSON content between curly braces
+            if '{' in content_str and '}' in content_str:
+                start = content_str.find('{')
+                end = content_str.rfind('}') + 1
+                json_str = content_str[start:end]
+                analysis = json.loads(json_str)
+            else:
+                analysis = json.loads(content_str)
+        except json.JSONDecodeError:
+            # Fallback analysis if parsing fails
+            analysis = {
+                "document_type": "other",
+                "line_items": [],
+                "totals": {
+                    "subtotal": 0.0,
+                    "tax": 0.0,
+                    "total": 0.0
+                },
+                "compliance": {
+                    "keywords_found": [],
+                    "risk_level": "low"
+                },
+                "metadata": {
+                    "page_count": page_count,
+                    "has_tables": scanner.has_tables,
+                    "has_signatures": scanner.has_signatures
                 }
-            
-            # Check for compliance keywords
-            compliance_check = self._check_compliance(text_content)
-            
-            # Extract metadata
-            metadata = {
-                "page_count": len(pdf.pages),
-                "has_tables": self._detect_tables(text_content),
-                "has_signatures": self._detect_signatures(text_content)
-            }
-            
-            return {
-                "status": "success",
-                "analysis": analysis,
-                "compliance_check": compliance_check,
-                "metadata": metadata,
-                "raw_text": text_content
             }
-            
-        except Exception as e:
-            return {
-                "status": "error",
-                "error": str(e)
-            }
-
-    def _check_compliance(self, text: str) -> Dict[str, Any]:
-        """Check for compliance keywords in text"""
-        found_keywords = {}
-        text_lower = text.lower()
         
-        for category, keywords in self.compliance_keywords.items():
-            found = [k for k in keywords if k in text_lower]
-            if found:
-                found_keywords[category] = found
-                
-        return {
-            "keywords_found": found_keywords,
-            "risk_level": "high" if len(found_keywords) > 2 else "medium" if found_keywords else "low"
-        }
-
-    def _detect_tables(self, text: str) -> bool:
-        """Detect if text contains table-like structures"""
-        # Look for patterns that might indicate tables
-        table_patterns = [
-            r'\|\s*[^\n]+\s*\|',  # Pipe-separated tables
-            r'\+[-+]+\+',         # ASCII tables
-            r'\t[^\n]+\t'         # Tab-separated content
-        ]
+        # Check for compliance keywords
+        compliance_check = scanner.compliance()
         
-        return any(re.search(pattern, text) for pattern in table_patterns)
-
-    def _detect_signatures(self, text: str) -> bool:
-        """Detect if text contains signature-like content"""
-        signature_patterns = [
-            r'(?i)signed by:',
-            r'(?i)signature:',
-            r'(?i)authorized by:',
-            r'(?i)approved by:'
-        ]
+        # Extract metadata
+        metadata = {
+            "page_count": page_count,
+            "has_tables": scanner.has_tables,
+            "has_signatures": scanner.has_signatures
+        }
         
-        return any(re.search(pattern, text) for pattern in signature_patterns)
+        return {
+            "status": "success",
+            "analysis": analysis,
+            "compliance_check": compliance_check,
+            "metadata": metadata,
+            "raw_text": text_content
+        }
 
 # Initialize PDF agent
 pdf_agent = PDFAgent() 
\ No newline at end of file
@@ -3,9 +3,22 @@ Core functionality modules
 """
 
 from .memory import memory_manager
+from .async_memory import async_memory_manager
 from .router import action_router
+from .queue import job_queue, JobWorkerPool
+from .events import status_broadcaster
+from .status_cache import status_cache
+from .outbox import outbox_dispatcher
+from .blobs import blob_store
 
 __all__ = [
     'memory_manager',
-    'action_router'
+    'async_memory_manager',
+    'action_router',
+    'job_queue',
+    'JobWorkerPool',
+    'status_broadcaster',
+    'status_cache',
+    'outbox_dispatcher',
+    'blob_store'
 ] 
\ No newline at end of file
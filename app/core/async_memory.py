@@ -0,0 +1,545 @@
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple, Callable
+import asyncio
+import json
+import logging
+import os
+import threading
+
+from .memory import (
+    ProcessingRecord,
+    ResultCacheEntry,
+    OutboxMessage,
+    RecordAction,
+    memory_manager,
+    promote_columns,
+    action_type_rows,
+    history_query,
+    history_page,
+    database_pool_settings,
+    uses_sqlite_profile,
+    sqlite_busy_timeout,
+    install_sqlite_pragmas
+)
+from .events import status_broadcaster
+from .status_cache import StatusEntry, status_cache
+
+logger = logging.getLogger(__name__)
+
+# Async drivers for the sync URLs accepted in DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg"
+}
+
+def async_database_url(db_url: str) -> str:
+    """Swap the driver of a database URL for its asyncio counterpart"""
+    scheme, sep, rest = db_url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+def create_async_database_engine(db_url: str):
+    """
+    Create an asyncio engine with the same profile as create_database_engine
+
+    Args:
+        db_url: SQLAlchemy database URL, sync or async driver
+
+    Returns:
+        AsyncEngine: The configured engine
+    """
+    url = async_database_url(db_url)
+    if not db_url.startswith("sqlite"):
+        return create_async_engine(url, pool_pre_ping=True, **database_pool_settings())
+    if not uses_sqlite_profile(db_url):
+        return create_async_engine(url)
+    # aiosqlite defaults to NullPool, which would reopen the file and re-run the pragmas per session.
+    # Each aiosqlite connection runs its own thread and SQLite has a single writer anyway,
+    # so the pool is kept small rather than sized like the sync one
+    engine = create_async_engine(
+        url,
+        connect_args={"timeout": sqlite_busy_timeout()},
+        poolclass=AsyncAdaptedQueuePool,
+        **{
+            **database_pool_settings(),
+            "pool_size": int(os.getenv("SQLITE_ASYNC_POOL_SIZE", "8")),
+            "max_overflow": 0
+        }
+    )
+    install_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+class JobStateBuffer:
+    """
+    In-memory side of the write-behind job state
+    
+    Holds staged updates until the next grouped commit, overlays them (and
+    the batch being flushed) for readers, and remembers primary keys of
+    records created by this process so updates need no re-select.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flushing: Dict[str, Dict[str, Any]] = {}
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._ids_max = int(os.getenv("STATE_ID_CACHE_SIZE", "100000"))
+
+    def stage(self, process_id: str, updates: Dict[str, Any]) -> None:
+        with self._lock:
+            self._pending.setdefault(process_id, {}).update(updates)
+
+    def take(self, process_id: str) -> Dict[str, Any]:
+        """Remove and return the staged updates of one record"""
+        with self._lock:
+            return self._pending.pop(process_id, {})
+
+    def begin_flush(self) -> Dict[str, Dict[str, Any]]:
+        """Take everything staged; it stays overlaid until end_flush"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushing = pending
+            return pending
+
+    def end_flush(self, pending: Dict[str, Dict[str, Any]], failed: bool = False) -> None:
+        """Finish a flush, keeping failed updates unless newer ones superseded them"""
+        with self._lock:
+            if failed:
+                for process_id, updates in pending.items():
+                    self._pending[process_id] = {**updates, **self._pending.get(process_id, {})}
+            self._flushing = {}
+
+    def overlay(self, process_id: str) -> Dict[str, Any]:
+        """Staged fields not yet committed for a record"""
+        with self._lock:
+            return {**self._flushing.get(process_id, {}), **self._pending.get(process_id, {})}
+
+    def remember_ids(self, ids: Dict[str, int]) -> None:
+        with self._lock:
+            self._ids.update(ids)
+            while len(self._ids) > self._ids_max:
+                self._ids.popitem(last=False)
+
+    def forget_id(self, process_id: str) -> None:
+        with self._lock:
+            self._ids.pop(process_id, None)
+
+    def known_ids(self, process_ids: List[str]) -> Dict[str, int]:
+        with self._lock:
+            return {pid: self._ids[pid] for pid in process_ids if pid in self._ids}
+
+    @staticmethod
+    def group_rows(pending: Dict[str, Dict[str, Any]], ids: Dict[str, int]) -> List[List[Dict[str, Any]]]:
+        """Primary-key update rows, grouped by column set so each group is one executemany"""
+        now = datetime.utcnow()
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for process_id, updates in pending.items():
+            if process_id in ids:
+                row = {**updates, "id": ids[process_id], "updated_at": now}
+                groups.setdefault(tuple(sorted(row)), []).append(row)
+        return list(groups.values())
+
+class AsyncMemoryManager:
+    """
+    Record reads and writes for the event loop
+
+    This is the only write path for processing records, so one lock orders
+    the grouped flushes of staged state against direct writes. The tables
+    are created by memory_manager when it is imported.
+    """
+
+    def __init__(self):
+        db_url = os.getenv("DATABASE_URL", "sqlite:///./flowbit.db")
+        self.engine = create_async_database_engine(db_url)
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.result_cache_ttl = timedelta(seconds=int(os.getenv("RESULT_CACHE_TTL_SECONDS", "604800")))
+        self.result_cache_max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+        # Write-behind job state: staged updates waiting for the next grouped commit,
+        # the same updates as an overlay for readers, and known primary keys
+        self.state_flush_interval = float(os.getenv("STATE_FLUSH_INTERVAL_MS", "250")) / 1000
+        self.state = JobStateBuffer()
+        # Serializes flushes with direct writes so a flush never lands after a newer write
+        self._write_lock = asyncio.Lock()
+        self._write_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _loop_write_lock(self) -> asyncio.Lock:
+        """The write lock, recreated when the manager is used from a new event loop"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._write_lock_loop:
+            # A lock is tied to the loop that first waits on it
+            self._write_lock = asyncio.Lock()
+            self._write_lock_loop = loop
+        return self._write_lock
+
+    async def create_record(
+        self,
+        process_id: str,
+        input_type: str,
+        metadata: Dict[str, Any],
+        updates: Optional[Dict[str, Any]] = None,
+        with_rows: Optional[List[Any]] = None
+    ) -> ProcessingRecord:
+        """
+        Create a new processing record, optionally with further fields already set
+
+        Args:
+            process_id: Unique ID of the record
+            input_type: Detected or requested input type
+            metadata: Upload metadata
+            updates: Further fields to set on the new record
+            with_rows: Other ORM rows (e.g. the record's job) to insert in the same transaction
+
+        Returns:
+            ProcessingRecord: The new record
+        """
+        async with self.Session() as session:
+            record = ProcessingRecord(
+                process_id=process_id,
+                input_type=input_type,
+                input_metadata=metadata,
+                status="pending"
+            )
+            for key, value in promote_columns(updates or {}).items():
+                setattr(record, key, value)
+            session.add(record)
+            session.add_all(action_type_rows(process_id, (updates or {}).get("actions_triggered")))
+            session.add_all(with_rows or [])
+            await session.commit()
+            self.state.remember_ids({process_id: record.id})
+            return record
+
+    async def create_records(
+        self,
+        records: List[Dict[str, Any]],
+        batch_id: Optional[str] = None,
+        with_rows: Optional[List[Any]] = None
+    ) -> int:
+        """
+        Create many processing records in one transaction
+
+        Args:
+            records: Dicts with process_id, input_type, metadata and optional updates
+            batch_id: Batch the records belong to
+            with_rows: Other ORM rows (e.g. the records' jobs) to insert in the same transaction
+
+        Returns:
+            int: Number of records created
+        """
+        async with self.Session() as session:
+            created = []
+            for item in records:
+                record = ProcessingRecord(
+                    process_id=item["process_id"],
+                    input_type=item["input_type"],
+                    input_metadata=item["metadata"],
+                    status="pending",
+                    batch_id=batch_id
+                )
+                for key, value in promote_columns(item.get("updates") or {}).items():
+                    setattr(record, key, value)
+                session.add(record)
+                session.add_all(action_type_rows(
+                    item["process_id"], (item.get("updates") or {}).get("actions_triggered")
+                ))
+                created.append(record)
+            session.add_all(with_rows or [])
+            await session.commit()
+            self.state.remember_ids({record.process_id: record.id for record in created})
+            return len(records)
+
+    async def update_record(self, process_id: str, updates: Dict[str, Any]) -> bool:
+        """
+        Update an existing processing record by primary key, applying any staged updates first
+
+        Returns:
+            bool: Whether the record exists
+        """
+        async with self._loop_write_lock():
+            updates = promote_columns({**self.state.take(process_id), **updates})
+            async with self.Session() as session:
+                ids = await self._resolve_ids(session, [process_id])
+                if process_id not in ids:
+                    return False
+                await session.execute(
+                    update(ProcessingRecord),
+                    [{**updates, "id": ids[process_id], "updated_at": datetime.utcnow()}]
+                )
+                if "actions_triggered" in updates:
+                    await session.execute(delete(RecordAction).where(RecordAction.process_id == process_id))
+                    session.add_all(action_type_rows(process_id, updates["actions_triggered"]))
+                await session.commit()
+        self.state.forget_id(process_id)
+        status_cache.invalidate(process_id)
+        status_broadcaster.publish(process_id, updates.get("status"))
+        return True
+
+    def stage_update(self, process_id: str, updates: Dict[str, Any]) -> None:
+        """Record an intermediate state transition for the next grouped commit"""
+        self.state.stage(process_id, promote_columns(updates))
+        status_cache.invalidate(process_id)
+        status_broadcaster.publish(process_id, updates.get("status"))
+
+    async def flush_state(self) -> int:
+        """
+        Write all staged updates in one transaction using primary-key updates
+
+        Returns:
+            int: Number of records written
+        """
+        async with self._loop_write_lock():
+            pending = self.state.begin_flush()
+            if not pending:
+                self.state.end_flush(pending)
+                return 0
+            try:
+                async with self.Session() as session:
+                    ids = await self._resolve_ids(session, list(pending))
+                    groups = JobStateBuffer.group_rows(pending, ids)
+                    for rows in groups:
+                        await session.execute(update(ProcessingRecord), rows)
+                    await session.commit()
+            except BaseException:
+                self.state.end_flush(pending, failed=True)
+                raise
+            self.state.end_flush(pending)
+        # Cached payloads already showed these updates, but carry the version from before the flush
+        for process_id in pending:
+            status_cache.invalidate(process_id)
+        return sum(len(rows) for rows in groups)
+
+    def start_state_flusher(self) -> None:
+        """Flush staged updates every STATE_FLUSH_INTERVAL_MS on the running event loop"""
+        self._flusher = asyncio.create_task(self._flush_state_periodically())
+
+    async def stop_state_flusher(self) -> None:
+        """Stop the periodic flush and write whatever is still staged"""
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush_state()
+
+    async def _flush_state_periodically(self):
+        while True:
+            await asyncio.sleep(self.state_flush_interval)
+            try:
+                await self.flush_state()
+            except Exception as e:
+                logger.error(f"Error flushing job state: {str(e)}")
+
+    async def _resolve_ids(self, session, process_ids: List[str]) -> Dict[str, int]:
+        """Primary keys for process ids, selecting only those not created by this process"""
+        ids = self.state.known_ids(process_ids)
+        missing = [pid for pid in process_ids if pid not in ids]
+        if missing:
+            result = await session.execute(
+                select(ProcessingRecord.process_id, ProcessingRecord.id).where(
+                    ProcessingRecord.process_id.in_(missing)
+                )
+            )
+            found = dict(result.all())
+            self.state.remember_ids(found)
+            ids.update(found)
+        return ids
+
+    async def complete_with_outbox(
+        self,
+        process_id: str,
+        updates: Dict[str, Any],
+        actions: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Apply the final record update and write its actions to the outbox in one transaction
+
+        Args:
+            process_id: The record to complete
+            updates: Fields to set on the record
+            actions: (action_type, payload) pairs to deliver
+
+        Returns:
+            list: Summary of the queued actions, also stored as actions_triggered
+        """
+        queued = [
+            {
+                "action_type": action_type,
+                "idempotency_key": f"{process_id}:{index}:{action_type}",
+                "status": "pending"
+            }
+            for index, (action_type, _) in enumerate(actions)
+        ]
+        async with self._loop_write_lock():
+            updates = promote_columns({**self.state.take(process_id), **updates, "actions_triggered": queued})
+            async with self.Session() as session:
+                ids = await self._resolve_ids(session, [process_id])
+                if process_id not in ids:
+                    return []
+                await session.execute(
+                    update(ProcessingRecord),
+                    [{**updates, "id": ids[process_id], "updated_at": datetime.utcnow()}]
+                )
+                for summary, (action_type, payload) in zip(queued, actions):
+                    session.add(OutboxMessage(
+                        process_id=process_id,
+                        action_type=action_type,
+                        payload=payload,
+                        idempotency_key=summary["idempotency_key"],
+                        status="pending"
+                    ))
+                session.add_all(action_type_rows(process_id, queued))
+                await session.commit()
+        self.state.forget_id(process_id)
+        status_cache.invalidate(process_id)
+        status_broadcaster.publish(process_id, updates.get("status"))
+        return queued
+
+    async def get_record(self, process_id: str) -> Optional[ProcessingRecord]:
+        """Retrieve a processing record by ID, with staged updates overlaid"""
+        async with self.Session() as session:
+            result = await session.execute(
+                select(ProcessingRecord).where(ProcessingRecord.process_id == process_id)
+            )
+            record = result.scalars().first()
+            if record:
+                session.expunge(record)
+        staged = self.state.overlay(process_id)
+        if record and staged:
+            for key, value in staged.items():
+                setattr(record, key, value)
+        return record
+
+    async def get_status(
+        self,
+        process_id: str,
+        serialize: Callable[[ProcessingRecord], Dict[str, Any]]
+    ) -> Optional[StatusEntry]:
+        """
+        Serialized status payload of a record, read through the status cache
+
+        Writes made through this manager drop the entry of the record they
+        touch, so an entry is served without a query for STATUS_CACHE_REVALIDATE_MS.
+        An older entry is checked against the row version, a single-column
+        primary-index read that also notices records changed or removed by
+        other processes, and rebuilt only if it moved.
+
+        Args:
+            process_id: The record to read
+            serialize: Builds the status payload of a record
+
+        Returns:
+            StatusEntry: The payload with its ETag, or None if the record does not exist
+        """
+        entry = status_cache.get(process_id)
+        if entry is not None and not status_cache.is_fresh(entry):
+            async with self.Session() as session:
+                version = await session.scalar(
+                    select(ProcessingRecord.version).where(ProcessingRecord.process_id == process_id)
+                )
+            if version is not None and version == entry.version:
+                status_cache.revalidated(entry)
+            else:
+                entry = None
+        status_cache.record(hit=entry is not None)
+        if entry is not None:
+            return entry
+
+        record = await self.get_record(process_id)
+        if record is None:
+            status_cache.invalidate(process_id)
+            return None
+        entry = StatusEntry(record.version, json.dumps(serialize(record)).encode("utf-8"))
+        status_cache.put(process_id, entry)
+        return entry
+
+    async def get_history(self, limit: int = 100, cursor: Optional[str] = None, **filters) -> Dict[str, Any]:
+        """Retrieve a page of processing history, newest first (see history_query)"""
+        query, fields, limit = history_query(limit, cursor, **filters)
+        async with self.Session() as session:
+            rows = (await session.execute(query)).all()
+        return history_page(rows, fields, limit)
+
+    async def get_batch_progress(self, batch_id: str) -> Dict[str, int]:
+        """Count the records of a batch per status"""
+        async with self.Session() as session:
+            result = await session.execute(
+                select(ProcessingRecord.status, func.count(ProcessingRecord.id)).where(
+                    ProcessingRecord.batch_id == batch_id
+                ).group_by(ProcessingRecord.status)
+            )
+            return {status: count for status, count in result.all()}
+
+    async def get_cached_result(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached processing result by upload fingerprint"""
+        return (await self.get_cached_results([fingerprint])).get(fingerprint)
+
+    async def get_cached_results(self, fingerprints: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up cached processing results for several uploads in one query
+
+        Args:
+            fingerprints: SHA-256 hex digests of the uploads
+
+        Returns:
+            dict: Cached results keyed by fingerprint; misses and expired entries are absent
+        """
+        async with self.Session() as session:
+            now = datetime.utcnow()
+            result = await session.execute(
+                select(ResultCacheEntry).where(
+                    ResultCacheEntry.fingerprint.in_(set(fingerprints)),
+                    ResultCacheEntry.created_at >= now - self.result_cache_ttl
+                )
+            )
+            results = {}
+            for entry in result.scalars().all():
+                entry.hit_count = (entry.hit_count or 0) + 1
+                entry.last_accessed_at = now
+                results[entry.fingerprint] = {
+                    "classification": entry.classification,
+                    "agent_output": entry.agent_output,
+                    "actions_triggered": entry.actions_triggered
+                }
+            if results:
+                await session.commit()
+            return results
+
+    async def store_cached_result(
+        self,
+        fingerprint: str,
+        classification: Dict[str, Any],
+        agent_output: Dict[str, Any],
+        actions_triggered: list
+    ) -> None:
+        """Store a processing result and evict expired and least recently used entries"""
+        async with self.Session() as session:
+            now = datetime.utcnow()
+            await session.merge(ResultCacheEntry(
+                fingerprint=fingerprint,
+                classification=classification,
+                agent_output=agent_output,
+                actions_triggered=actions_triggered,
+                hit_count=0,
+                created_at=now,
+                last_accessed_at=now
+            ))
+            await session.execute(
+                delete(ResultCacheEntry).where(ResultCacheEntry.created_at < now - self.result_cache_ttl)
+            )
+            count = await session.scalar(select(func.count()).select_from(ResultCacheEntry))
+            overflow = count - self.result_cache_max_entries
+            if overflow > 0:
+                oldest = select(ResultCacheEntry.fingerprint).order_by(
+                    ResultCacheEntry.last_accessed_at
+                ).limit(overflow)
+                await session.execute(
+                    delete(ResultCacheEntry).where(ResultCacheEntry.fingerprint.in_(oldest.scalar_subquery()))
+                )
+            await session.commit()
+
+# Initialize async memory manager
+async_memory_manager = AsyncMemoryManager()
@@ -0,0 +1,87 @@
+from typing import List, Tuple
+import io
+import os
+import zipfile
+
+from .spool import SpooledUpload, DocumentHandle, spool_stream
+
+MAX_BATCH_UPLOAD_SIZE = int(os.getenv("MAX_BATCH_UPLOAD_SIZE", "104857600"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+class BatchTooLarge(Exception):
+    """Raised when a batch holds more than BATCH_MAX_ITEMS documents"""
+
+def is_archive(filename: str, head: bytes) -> bool:
+    """ZIP archives are recognised by extension or by the magic bytes at the start of head"""
+    return (filename or "").lower().endswith(".zip") or head[:4] == b"PK\x03\x04"
+
+def is_ndjson(filename: str, content_type: str) -> bool:
+    """NDJSON streams are recognised by extension or content type"""
+    return (filename or "").lower().endswith((".ndjson", ".jsonl")) or content_type in (
+        "application/x-ndjson", "application/jsonl"
+    )
+
+def expand_upload(filename: str, content_type: str, upload: SpooledUpload) -> List[Tuple[str, SpooledUpload]]:
+    """
+    Split a spooled batch upload into individually spooled documents
+
+    ZIP members and NDJSON lines each become their own spool file; any other
+    upload is passed through as a single document. The source spool file is
+    deleted once it has been expanded, or when expanding it fails.
+
+    Args:
+        filename: Name of the uploaded file
+        content_type: Content type of the uploaded file
+        upload: The spooled upload
+
+    Returns:
+        list: (document name, spooled document) pairs
+
+    Raises:
+        BatchTooLarge: If the upload holds more than BATCH_MAX_ITEMS documents
+    """
+    archive = is_archive(filename, upload.handle().head(4))
+    if not archive and not is_ndjson(filename, content_type):
+        return [(filename, upload)]
+    try:
+        return _expand_zip(upload) if archive else _expand_ndjson(filename, upload)
+    finally:
+        upload.handle().discard()
+
+def _expand_zip(upload: SpooledUpload) -> List[Tuple[str, SpooledUpload]]:
+    items = []
+    try:
+        with zipfile.ZipFile(upload.path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or os.path.basename(info.filename).startswith("."):
+                    continue
+                if len(items) >= BATCH_MAX_ITEMS:
+                    raise BatchTooLarge(f"Batch exceeds {BATCH_MAX_ITEMS} documents")
+                # Member size limits are enforced while decompressing, not from the header
+                with archive.open(info) as member:
+                    items.append((info.filename, spool_stream(member)))
+    except BaseException:
+        _discard(items)
+        raise
+    return items
+
+def _expand_ndjson(filename: str, upload: SpooledUpload) -> List[Tuple[str, SpooledUpload]]:
+    items = []
+    base = os.path.splitext(filename or "batch")[0]
+    try:
+        with open(upload.path, "rb") as source:
+            for line_number, line in enumerate(source, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                if len(items) >= BATCH_MAX_ITEMS:
+                    raise BatchTooLarge(f"Batch exceeds {BATCH_MAX_ITEMS} documents")
+                items.append((f"{base}-{line_number}.json", spool_stream(io.BytesIO(line))))
+    except BaseException:
+        _discard(items)
+        raise
+    return items
+
+def _discard(items: List[Tuple[str, SpooledUpload]]) -> None:
+    for _, item in items:
+        DocumentHandle(path=item.path).discard()
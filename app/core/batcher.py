@@ -0,0 +1,113 @@
+from typing import Dict, Any, List, Tuple, Callable, Awaitable, Optional
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class BatchItemFailed(Exception):
+    """Raised for an item the batch endpoint reported as failed"""
+
+class ActionBatcher:
+    """
+    Coalesces actions for one endpoint into array payloads
+
+    Items are buffered until max_items are waiting or max_wait_ms has passed
+    since the first one arrived, then sent as a single request of
+    [{"idempotency_key": ..., "payload": ...}, ...]. A response of the form
+    {"results": [...]} with one entry per item is fanned back item by item;
+    any other successful response (such as the nginx mock's) applies to
+    every item.
+    """
+
+    def __init__(
+        self,
+        action_type: str,
+        send: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+        max_items: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        self.action_type = action_type
+        self.send = send
+        self.max_items = max_items or int(os.getenv("ACTION_BATCH_MAX_ITEMS", "50"))
+        self.max_wait = (max_wait_ms or float(os.getenv("ACTION_BATCH_MAX_WAIT_MS", "50"))) / 1000
+        self._buffer: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._in_flight = set()
+        self.counters = {"batches": 0, "items": 0, "failed_batches": 0}
+
+    async def submit(self, payload: Dict[str, Any], idempotency_key: str) -> Dict[str, Any]:
+        """
+        Queue an action for the next batch and wait for its own result
+
+        Args:
+            payload: Data to send with the action
+            idempotency_key: Stable key receivers can use to drop redeliveries
+
+        Returns:
+            dict: This item's result from the batch response
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append(({"idempotency_key": idempotency_key, "payload": payload}, future))
+        if len(self._buffer) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_wait())
+        return await future
+
+    async def _flush_after_wait(self):
+        await asyncio.sleep(self.max_wait)
+        self._timer = None
+        self._flush()
+
+    def _flush(self) -> None:
+        """Hand the buffered items to a send task"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._buffer = self._buffer, []
+        if batch:
+            task = asyncio.create_task(self._send_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send_batch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        futures = [future for _, future in batch]
+        try:
+            response = await self.send(items)
+        except BaseException as e:
+            self.counters["failed_batches"] += 1
+            logger.warning(f"Batch of {len(items)} {self.action_type} actions failed: {str(e)}")
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                else:
+                    future.cancel()
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        self.counters["batches"] += 1
+        self.counters["items"] += len(items)
+        results = response.get("results") if isinstance(response, dict) else None
+        if not isinstance(results, list) or len(results) != len(items):
+            results = [response] * len(items)
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, dict) and result.get("status") == "error":
+                future.set_exception(BatchItemFailed(str(result.get("error", result))))
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch settings, buffered item count and counters"""
+        return {
+            "max_items": self.max_items,
+            "max_wait_ms": self.max_wait * 1000,
+            "buffered": len(self._buffer),
+            **self.counters
+        }
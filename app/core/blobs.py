@@ -0,0 +1,273 @@
+from typing import Dict, Any, Optional, Set, Tuple
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zlib
+
+from .memory import ProcessingRecord, ResultCacheEntry, memory_manager
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = os.getenv("BLOB_DIR", "./blobs")
+BLOB_MIN_SIZE = int(os.getenv("BLOB_MIN_SIZE", "4096"))
+BLOB_CHUNK_SIZE = int(os.getenv("BLOB_CHUNK_SIZE", "500"))
+# Unreferenced blobs younger than this are kept: their record may not be committed yet
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+
+# Agent output fields that carry the document itself and are stored out of line
+BLOB_FIELDS = ("raw_text", "raw_content", "parsed_data")
+
+# Marker key of a blob reference left in place of an offloaded value
+BLOB_REF = "$blob"
+
+def is_blob_ref(value: Any) -> bool:
+    """Whether value is a reference written by BlobStore.offload"""
+    return isinstance(value, dict) and BLOB_REF in value
+
+class BlobStore:
+    """
+    Content-addressed, compressed blob store on local disk
+
+    Blobs are named by the SHA-256 of their uncompressed bytes, so identical
+    documents are stored once and a blob is never rewritten. They are
+    compressed with zstd when the zstandard package is installed, otherwise
+    with zlib; the codec is recorded in each reference so both can be read
+    side by side.
+    """
+
+    def __init__(self, root: str = BLOB_DIR, min_size: int = BLOB_MIN_SIZE):
+        self.root = root
+        self.min_size = min_size
+        self.codec = "zstd" if zstandard else "zlib"
+
+    def _path(self, digest: str, codec: str) -> str:
+        extension = "zst" if codec == "zstd" else "zz"
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.{extension}")
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(data: bytes, codec: str) -> bytes:
+        if codec == "zlib":
+            return zlib.decompress(data)
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Blob is zstd-compressed but the zstandard package is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        raise ValueError(f"Unknown blob codec: {codec}")
+
+    def put(self, data: bytes) -> Tuple[str, str]:
+        """
+        Store bytes unless a blob with the same content already exists
+
+        Args:
+            data: Uncompressed content
+
+        Returns:
+            tuple: (SHA-256 hex digest, codec)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        for codec in (self.codec, "zlib" if self.codec == "zstd" else "zstd"):
+            try:
+                # A reused blob counts as new for sweep, so it outlives the grace period again
+                os.utime(self._path(digest, codec))
+                return digest, codec
+            except FileNotFoundError:
+                continue
+        path = self._path(digest, self.codec)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename, so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(self._compress(data))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return digest, self.codec
+
+    def get(self, digest: str, codec: str) -> bytes:
+        """
+        Read and decompress a blob
+
+        Raises:
+            FileNotFoundError: If the blob does not exist
+        """
+        with open(self._path(digest, codec), "rb") as f:
+            return self._decompress(f.read(), codec)
+
+    def offload(self, agent_output: Any) -> Any:
+        """
+        Move large BLOB_FIELDS of an agent output into the store
+
+        Strings are stored as UTF-8 and other values as JSON. Fields smaller
+        than min_size stay inline.
+
+        Args:
+            agent_output: Agent output as produced by the agents
+
+        Returns:
+            A shallow copy with blob references in place of the large fields,
+            or agent_output itself if nothing was moved
+        """
+        if not isinstance(agent_output, dict):
+            return agent_output
+        stored = None
+        for field in BLOB_FIELDS:
+            value = agent_output.get(field)
+            if value is None or is_blob_ref(value):
+                continue
+            if isinstance(value, str):
+                kind, data = "text", value.encode("utf-8")
+            else:
+                kind, data = "json", json.dumps(value, default=str).encode("utf-8")
+            if len(data) < self.min_size:
+                continue
+            digest, codec = self.put(data)
+            if stored is None:
+                stored = dict(agent_output)
+            stored[field] = {BLOB_REF: digest, "codec": codec, "type": kind, "size": len(data)}
+        return agent_output if stored is None else stored
+
+    def load(self, value: Any) -> Any:
+        """Resolve a blob reference to its value; other values are returned unchanged"""
+        if not is_blob_ref(value):
+            return value
+        data = self.get(value[BLOB_REF], value["codec"])
+        if value.get("type") == "text":
+            return data.decode("utf-8")
+        return json.loads(data)
+
+    def offload_stored_outputs(self, chunk_size: int = BLOB_CHUNK_SIZE) -> Dict[str, int]:
+        """
+        Offload the large fields of records and cached results written before the store existed
+
+        Rows are read in primary-key order, a chunk per transaction, and only
+        rows that changed are written back.
+
+        Returns:
+            dict: Number of rows rewritten per table
+        """
+        rewritten = {}
+        for model, key in ((ProcessingRecord, ProcessingRecord.id), (ResultCacheEntry, ResultCacheEntry.fingerprint)):
+            count = 0
+            last = None
+            while True:
+                session = memory_manager.Session()
+                try:
+                    query = session.query(key, model.agent_output).filter(model.agent_output.isnot(None))
+                    if last is not None:
+                        query = query.filter(key > last)
+                    rows = query.order_by(key).limit(chunk_size).all()
+                    if not rows:
+                        break
+                    last = rows[-1][0]
+                    for row_key, agent_output in rows:
+                        stored = self.offload(agent_output)
+                        if stored is not agent_output:
+                            session.query(model).filter(key == row_key).update(
+                                {"agent_output": stored}, synchronize_session=False
+                            )
+                            count += 1
+                    session.commit()
+                finally:
+                    session.close()
+            rewritten[model.__tablename__] = count
+            logger.info(f"Offloaded blobs for {count} rows of {model.__tablename__}")
+        return rewritten
+
+    def referenced(self, chunk_size: int = BLOB_CHUNK_SIZE) -> Set[str]:
+        """Digests referenced by the agent outputs of records and cached results"""
+        digests = set()
+        for model, key in ((ProcessingRecord, ProcessingRecord.id), (ResultCacheEntry, ResultCacheEntry.fingerprint)):
+            last = None
+            while True:
+                session = memory_manager.Session()
+                try:
+                    query = session.query(key, model.agent_output).filter(model.agent_output.isnot(None))
+                    if last is not None:
+                        query = query.filter(key > last)
+                    rows = query.order_by(key).limit(chunk_size).all()
+                finally:
+                    session.close()
+                if not rows:
+                    break
+                last = rows[-1][0]
+                for _, agent_output in rows:
+                    if isinstance(agent_output, dict):
+                        digests.update(
+                            agent_output[field][BLOB_REF] for field in BLOB_FIELDS if is_blob_ref(agent_output.get(field))
+                        )
+        return digests
+
+    def sweep(self, grace_seconds: Optional[int] = None) -> Dict[str, int]:
+        """
+        Delete blobs no record or cached result refers to any more
+
+        Blobs written or reused within the grace period are kept, since the
+        row referring to them may still be in flight; the same applies to
+        leftover temporary files. Empty directories are removed.
+
+        Args:
+            grace_seconds: Minimum age of a deleted blob, defaults to BLOB_GC_GRACE_SECONDS
+
+        Returns:
+            dict: Blobs deleted, bytes freed and unreferenced blobs kept for now
+        """
+        grace_seconds = BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        # Cut off before marking, so a blob referenced only after the scan is young enough to be kept
+        cutoff = time.time() - grace_seconds
+        live = self.referenced()
+        deleted = freed = recent = 0
+        for directory, _, files in os.walk(self.root, topdown=False):
+            for name in files:
+                digest, _, extension = name.partition(".")
+                if extension not in ("zst", "zz", "tmp") or digest in live:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime >= cutoff:
+                        recent += 1
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                deleted += 1
+                freed += stat.st_size
+            if directory != self.root:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+        if deleted:
+            logger.info(f"Swept {deleted} unreferenced blobs ({freed} bytes)")
+        return {"deleted": deleted, "bytes_freed": freed, "recent_unreferenced": recent}
+
+    def stats(self) -> Dict[str, Any]:
+        """Count blobs and their compressed size on disk"""
+        count = size = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith((".zst", ".zz")):
+                    count += 1
+                    size += os.path.getsize(os.path.join(directory, name))
+        return {"root": self.root, "codec": self.codec, "blobs": count, "bytes": size}
+
+# Initialize blob store
+blob_store = BlobStore()
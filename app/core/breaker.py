@@ -0,0 +1,130 @@
+from collections import deque
+from typing import Dict, Any, Optional
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an endpoint whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker with a failure-rate window and adaptive timeouts
+
+    Closed: calls pass; the breaker opens when the failure rate over the last
+    window_size calls reaches failure_rate (after at least min_calls).
+    Open: calls fail fast with CircuitOpen for open_seconds.
+    Half-open: up to half_open_calls probes pass; all succeeding closes the
+    circuit, any failing reopens it.
+
+    The request timeout follows the observed latency percentile times a
+    multiplier, clamped between min_timeout and max_timeout.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.window_size = int(os.getenv("BREAKER_WINDOW_SIZE", "20"))
+        self.min_calls = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+        self.failure_rate = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+        self.open_seconds = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+        self.half_open_calls = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "2"))
+        self.timeout_percentile = float(os.getenv("ACTION_TIMEOUT_PERCENTILE", "0.99"))
+        self.timeout_multiplier = float(os.getenv("ACTION_TIMEOUT_MULTIPLIER", "3"))
+        self.min_timeout = float(os.getenv("ACTION_MIN_TIMEOUT_SECONDS", "1"))
+        self.max_timeout = float(os.getenv("ACTION_MAX_TIMEOUT_SECONDS", "30"))
+        self.latency_samples = int(os.getenv("ACTION_LATENCY_SAMPLES", "200"))
+
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.outcomes = deque(maxlen=self.window_size)  # True for success
+        self.latencies = deque(maxlen=self.latency_samples)
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.counters = {"calls": 0, "successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def before_call(self) -> None:
+        """
+        Admit a call or fail fast
+
+        Raises:
+            CircuitOpen: If the circuit is open, or half-open with all probes in flight
+        """
+        if self.state == "open":
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.counters["rejected"] += 1
+                raise CircuitOpen(self.name, remaining)
+            self._transition("half_open")
+        if self.state == "half_open":
+            if self.probes_in_flight + self.probe_successes >= self.half_open_calls:
+                self.counters["rejected"] += 1
+                raise CircuitOpen(self.name, self.min_timeout)
+            self.probes_in_flight += 1
+        self.counters["calls"] += 1
+
+    def record_success(self, latency: float) -> None:
+        """Record a successful call and its latency"""
+        self.counters["successes"] += 1
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        if self.state == "half_open":
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            self.probe_successes += 1
+            if self.probe_successes >= self.half_open_calls:
+                self._transition("closed")
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit if the failure rate is too high"""
+        self.counters["failures"] += 1
+        self.outcomes.append(False)
+        if self.state == "half_open":
+            self._transition("open")
+        elif self.state == "closed" and len(self.outcomes) >= self.min_calls:
+            if self.outcomes.count(False) / len(self.outcomes) >= self.failure_rate:
+                self._transition("open")
+
+    def release(self) -> None:
+        """Give back a half-open probe slot for a call that was cancelled before finishing"""
+        if self.state == "half_open":
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def timeout(self) -> float:
+        """Request timeout derived from the observed latency percentile"""
+        if len(self.latencies) < self.min_calls:
+            return self.max_timeout
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, math.ceil(self.timeout_percentile * len(ordered)) - 1)
+        return min(self.max_timeout, max(self.min_timeout, ordered[index] * self.timeout_multiplier))
+
+    def _transition(self, state: str) -> None:
+        logger.warning(f"Circuit for {self.name}: {self.state} -> {state}")
+        self.state = state
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        if state == "open":
+            self.opened_at = time.monotonic()
+            self.counters["opened"] += 1
+        elif state == "closed":
+            self.outcomes.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state, window failure rate, timeout and counters"""
+        retry_after: Optional[float] = None
+        if self.state == "open":
+            retry_after = round(max(0.0, self.opened_at + self.open_seconds - time.monotonic()), 3)
+        return {
+            "state": self.state,
+            "retry_after": retry_after,
+            "window_calls": len(self.outcomes),
+            "window_failure_rate": round(self.outcomes.count(False) / len(self.outcomes), 3) if self.outcomes else 0.0,
+            "timeout": round(self.timeout(), 3),
+            **self.counters
+        }
@@ -0,0 +1,55 @@
+from typing import Dict, List, Tuple, Optional, Any
+import asyncio
+import threading
+
+class StatusBroadcaster:
+    """In-process pub/sub of processing record state changes"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, process_id: str) -> asyncio.Queue:
+        """
+        Register for state changes of a record; must be called from the event loop
+
+        Args:
+            process_id: The record to watch
+
+        Returns:
+            asyncio.Queue: Receives one event per state change
+        """
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(process_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, process_id: str, queue: asyncio.Queue) -> None:
+        """Stop receiving state changes"""
+        with self._lock:
+            subscribers = [s for s in self._subscribers.get(process_id, []) if s[1] is not queue]
+            if subscribers:
+                self._subscribers[process_id] = subscribers
+            else:
+                self._subscribers.pop(process_id, None)
+
+    def publish(self, process_id: str, status: Optional[str], **details: Any) -> None:
+        """
+        Notify watchers of a record; safe to call from any thread
+
+        Args:
+            process_id: The record that changed
+            status: Its new status, if it changed
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(process_id, []))
+        event = {"process_id": process_id, "status": status, **details}
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's loop has closed
+                self.unsubscribe(process_id, queue)
+
+# Initialize status broadcaster
+status_broadcaster = StatusBroadcaster()
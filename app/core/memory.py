@@ -1,20 +1,128 @@
-from sqlalchemy import create_engine, Column, Integer, String, JSON, DateTime, Text
+from sqlalchemy import create_engine, event, inspect, text, update, select, tuple_, Column, Integer, Float, String, JSON, DateTime, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import OperationalError
 from datetime import datetime
+import base64
+import logging
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
 
 # Initialize SQLAlchemy
 Base = declarative_base()
 
+def database_pool_settings() -> Dict[str, Any]:
+    """Connection pool settings shared by the sync and async engines"""
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    }
+
+def uses_sqlite_profile(db_url: str) -> bool:
+    """Whether db_url is a file-backed SQLite database that gets the tuned profile"""
+    if not db_url.startswith("sqlite"):
+        return False
+    if ":memory:" in db_url or db_url.rstrip("/").endswith(":"):
+        return False
+    return os.getenv("SQLITE_TUNING", "true").lower() == "true"
+
+def sqlite_busy_timeout() -> float:
+    """Seconds a SQLite connection waits for a lock before failing"""
+    return int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000")) / 1000
+
+def install_sqlite_pragmas(engine) -> None:
+    """Apply the SQLite profile to every new DBAPI connection of a (sync) engine"""
+    pragmas = {
+        # Only takes effect while the file is still empty, so it must come first;
+        # lets the retention manager release freed pages incrementally
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(sqlite_busy_timeout() * 1000),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", "268435456")),
+        # Negative values are KiB rather than pages
+        "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")),
+        "temp_store": "MEMORY"
+    }
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def create_database_engine(db_url: str):
+    """
+    Create the engine for db_url with settings suited to several concurrent writers
+    
+    File-backed SQLite databases get WAL journaling, synchronous=NORMAL, a
+    busy timeout, memory-mapped I/O and a larger page cache on every new
+    connection, so readers never block the writer and writers from other
+    worker processes wait for the lock instead of failing. Set
+    SQLITE_TUNING=false to use SQLite's defaults.
+    
+    Args:
+        db_url: SQLAlchemy database URL
+        
+    Returns:
+        Engine: The configured engine
+    """
+    if not db_url.startswith("sqlite"):
+        return create_engine(db_url, pool_pre_ping=True, **database_pool_settings())
+    if not uses_sqlite_profile(db_url):
+        return create_engine(db_url)
+    engine = create_engine(
+        db_url,
+        connect_args={"timeout": sqlite_busy_timeout(), "check_same_thread": False},
+        **database_pool_settings()
+    )
+    install_sqlite_pragmas(engine)
+    return engine
+
+def create_schema(engine, tables: List[Any], attempts: int = 5) -> None:
+    """
+    Create tables and add missing columns, tolerating other workers doing the same
+    
+    Several worker processes starting together can race on the same DDL;
+    a statement that fails because another worker got there first is
+    retried against the updated schema.
+    """
+    for attempt in range(attempts):
+        try:
+            Base.metadata.create_all(engine, tables=tables)
+            for table in tables:
+                add_missing_columns(engine, table)
+            return
+        except OperationalError as e:
+            if attempt == attempts - 1:
+                raise
+            logger.warning(f"Schema setup raced with another worker, retrying: {str(e.orig)}")
+
+def add_missing_columns(engine, table) -> None:
+    """Add columns and indexes declared on a model but missing from its existing table"""
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+# Statuses after which a record no longer changes
+TERMINAL_STATUSES = ("completed", "error")
+
 class ProcessingRecord(Base):
     """Model for storing processing records"""
     __tablename__ = "processing_records"
 
     id = Column(Integer, primary_key=True)
     process_id = Column(String(36), unique=True, index=True)
-    input_type = Column(String(50))  # email, json, pdf
+    input_type = Column(String(50))  # email, json, pdf; the classified type once known
     input_metadata = Column(JSON)
     classification = Column(JSON)
     agent_output = Column(JSON)
@@ -23,64 +131,367 @@ class ProcessingRecord(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     error = Column(Text, nullable=True)
+    batch_id = Column(String(36), nullable=True, index=True)
+    # Bumped by every UPDATE; identifies the cached status payload of the row
+    version = Column(Integer, default=1, onupdate=text("coalesce(version, 0) + 1"))
+    # Promoted from the JSON columns (see PROMOTED_COLUMNS) so they can be filtered on
+    business_intent = Column(String(50), nullable=True)
+    urgency = Column(String(20), nullable=True)
+    confidence = Column(Float, nullable=True)
+    document_type = Column(String(50), nullable=True)
+
+    # Records are read newest first in (created_at, id) order, optionally filtered
+    __table_args__ = (
+        Index("ix_processing_records_history", "created_at", "id"),
+        Index("ix_processing_records_status_history", "status", "created_at", "id"),
+        Index("ix_processing_records_input_type_history", "input_type", "created_at", "id"),
+        Index("ix_processing_records_intent_history", "business_intent", "created_at", "id"),
+        Index("ix_processing_records_intent_urgency_history", "business_intent", "urgency", "created_at", "id"),
+        Index("ix_processing_records_urgency_history", "urgency", "created_at", "id"),
+        Index("ix_processing_records_document_type_history", "document_type", "created_at", "id"),
+        Index("ix_processing_records_confidence", "confidence"),
+    )
+
+class RecordAction(Base):
+    """Action types routed for a record, one row each, promoted from actions_triggered"""
+    __tablename__ = "record_actions"
+
+    id = Column(Integer, primary_key=True)
+    process_id = Column(String(36), index=True)
+    action_type = Column(String(50))
+
+    __table_args__ = (
+        Index("ix_record_actions_type", "action_type", "process_id"),
+    )
+
+# Promoted column -> JSON paths it is read from, first match wins. A path is
+# only consulted when its top-level column is part of the write.
+PROMOTED_COLUMNS = {
+    "input_type": [("classification", "input_type")],
+    "business_intent": [("classification", "business_intent")],
+    "confidence": [("classification", "confidence")],
+    "urgency": [
+        ("agent_output", "analysis", "urgency"),
+        ("classification", "metadata", "urgency")
+    ],
+    "document_type": [
+        ("agent_output", "analysis", "document_type"),
+        ("classification", "metadata", "document_type")
+    ]
+}
+
+def _promoted_value(column: str, value: Any) -> Any:
+    if column == "confidence":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return value if isinstance(value, str) and value else None
+
+def promote_columns(updates: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the indexed columns derived from the JSON columns being written"""
+    promoted = None
+    for column, paths in PROMOTED_COLUMNS.items():
+        for path in paths:
+            if path[0] not in updates:
+                continue
+            value = updates[path[0]]
+            for key in path[1:]:
+                value = value.get(key) if isinstance(value, dict) else None
+            value = _promoted_value(column, value)
+            if value is not None:
+                if promoted is None:
+                    promoted = dict(updates)
+                promoted[column] = value
+                break
+    return updates if promoted is None else promoted
+
+def action_type_rows(process_id: str, actions_triggered: Any) -> List[RecordAction]:
+    """RecordAction rows for the distinct action types in an actions_triggered list"""
+    types = sorted({
+        item["action_type"]
+        for item in actions_triggered or []
+        if isinstance(item, dict) and isinstance(item.get("action_type"), str)
+    })
+    return [RecordAction(process_id=process_id, action_type=action_type) for action_type in types]
+
+# Columns /history may project; the large JSON columns are never loaded
+HISTORY_FIELDS = {
+    "process_id": ProcessingRecord.process_id,
+    "input_type": ProcessingRecord.input_type,
+    "business_intent": ProcessingRecord.business_intent,
+    "urgency": ProcessingRecord.urgency,
+    "confidence": ProcessingRecord.confidence,
+    "document_type": ProcessingRecord.document_type,
+    "status": ProcessingRecord.status,
+    "batch_id": ProcessingRecord.batch_id,
+    "error": ProcessingRecord.error,
+    "created_at": ProcessingRecord.created_at,
+    "updated_at": ProcessingRecord.updated_at
+}
+HISTORY_DEFAULT_FIELDS = ["process_id", "input_type", "status", "created_at", "updated_at"]
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "500"))
+
+def encode_history_cursor(created_at: datetime, record_id: int) -> str:
+    """Opaque cursor pointing just past a history row"""
+    raw = f"{created_at.isoformat()}|{record_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Position encoded by encode_history_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, record_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
+
+def history_query(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    input_type: Optional[str] = None,
+    intent: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    urgency: Optional[str] = None,
+    document_type: Optional[str] = None,
+    action_type: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """
+    Build the keyset-paginated record query shared by /history and /records/search
+
+    Rows come newest first in (created_at, id) order. A page continues
+    strictly after the cursor row instead of using OFFSET, and the filters
+    are backed by (column, created_at, id) indexes, so a page costs the
+    same however many records are kept. One extra row is fetched to tell
+    whether another page follows.
+
+    Args:
+        limit: Page size, capped at HISTORY_MAX_LIMIT
+        cursor: next_cursor of the previous page
+        status: Only records in this status
+        input_type: Only records of this input type
+        intent: Only records with this business intent
+        fields: Columns to return, from HISTORY_FIELDS
+        urgency: Only records with this urgency
+        document_type: Only records of this document type
+        action_type: Only records that routed an action of this type
+        min_confidence: Only records classified with at least this confidence
+        since: Only records created at or after this time
+        until: Only records created before this time
+
+    Returns:
+        tuple: (select statement, returned field names, page size)
+
+    Raises:
+        ValueError: If a field, the limit or the cursor is invalid
+    """
+    fields = fields or HISTORY_DEFAULT_FIELDS
+    unknown = [field for field in fields if field not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown history fields: {', '.join(unknown)}")
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    limit = min(limit, HISTORY_MAX_LIMIT)
+
+    query = select(
+        *[HISTORY_FIELDS[field] for field in fields],
+        ProcessingRecord.created_at.label("_cursor_created_at"),
+        ProcessingRecord.id.label("_cursor_id")
+    )
+    if status:
+        query = query.where(ProcessingRecord.status == status)
+    if input_type:
+        query = query.where(ProcessingRecord.input_type == input_type)
+    if intent:
+        query = query.where(ProcessingRecord.business_intent == intent)
+    if urgency:
+        query = query.where(ProcessingRecord.urgency == urgency)
+    if document_type:
+        query = query.where(ProcessingRecord.document_type == document_type)
+    if min_confidence is not None:
+        query = query.where(ProcessingRecord.confidence >= min_confidence)
+    if action_type:
+        query = query.where(ProcessingRecord.process_id.in_(
+            select(RecordAction.process_id).where(RecordAction.action_type == action_type)
+        ))
+    if since:
+        query = query.where(ProcessingRecord.created_at >= since)
+    if until:
+        query = query.where(ProcessingRecord.created_at < until)
+    if cursor:
+        created_at, record_id = decode_history_cursor(cursor)
+        query = query.where(
+            tuple_(ProcessingRecord.created_at, ProcessingRecord.id) < tuple_(created_at, record_id)
+        )
+    query = query.order_by(
+        ProcessingRecord.created_at.desc(),
+        ProcessingRecord.id.desc()
+    ).limit(limit + 1)
+    return query, fields, limit
+
+def history_page(rows: List[Any], fields: List[str], limit: int) -> Dict[str, Any]:
+    """Shape the rows of a history_query as a page with its next cursor"""
+    items = []
+    for row in rows[:limit]:
+        item = {}
+        for field in fields:
+            value = getattr(row, field)
+            item[field] = value.isoformat() if isinstance(value, datetime) else value
+        items.append(item)
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_history_cursor(last._cursor_created_at, last._cursor_id)
+    return {"history": items, "next_cursor": next_cursor}
+
+class ResultCacheEntry(Base):
+    """Model for cached processing results keyed by content fingerprint"""
+    __tablename__ = "result_cache"
+
+    fingerprint = Column(String(64), primary_key=True)  # SHA-256 of the upload
+    classification = Column(JSON)
+    agent_output = Column(JSON)
+    actions_triggered = Column(JSON)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class OutboxMessage(Base):
+    """Model for downstream actions awaiting delivery"""
+    __tablename__ = "action_outbox"
+
+    id = Column(Integer, primary_key=True)
+    process_id = Column(String(36), index=True)
+    action_type = Column(String(50))
+    payload = Column(JSON)
+    idempotency_key = Column(String(120), unique=True)
+    status = Column(String(20), default="pending")  # pending, delivering, delivered, dead
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    response = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    delivered_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_action_outbox_due", "status", "next_attempt_at"),
+    )
 
 class MemoryManager:
-    """Manages shared memory operations"""
+    """
+    Owns the database schema and the sync engine
+
+    Record reads and writes from the app go through async_memory_manager;
+    this engine serves background jobs and the command-line tools.
+    """
     
     def __init__(self):
         # Use SQLite for development, can be changed to PostgreSQL for production
         db_url = os.getenv("DATABASE_URL", "sqlite:///./flowbit.db")
-        self.engine = create_engine(db_url)
-        Base.metadata.create_all(self.engine)
+        self.engine = create_database_engine(db_url)
+        create_schema(self.engine, [
+            ProcessingRecord.__table__,
+            ResultCacheEntry.__table__,
+            OutboxMessage.__table__,
+            RecordAction.__table__
+        ])
         self.Session = sessionmaker(bind=self.engine)
 
-    def create_record(self, process_id: str, input_type: str, metadata: Dict[str, Any]) -> ProcessingRecord:
-        """Create a new processing record"""
+    def queue_outbox_messages(self, messages: List[Dict[str, Any]]) -> int:
+        """
+        Add outbox messages, skipping idempotency keys that are already queued
+        
+        Args:
+            messages: Dicts with process_id, action_type, payload and idempotency_key
+            
+        Returns:
+            int: Number of messages added
+        """
+        if not messages:
+            return 0
         session = self.Session()
         try:
-            record = ProcessingRecord(
-                process_id=process_id,
-                input_type=input_type,
-                input_metadata=metadata,
-                status="pending"
-            )
-            session.add(record)
+            existing = {
+                row[0] for row in session.query(OutboxMessage.idempotency_key).filter(
+                    OutboxMessage.idempotency_key.in_([m["idempotency_key"] for m in messages])
+                )
+            }
+            added = 0
+            for message in messages:
+                if message["idempotency_key"] in existing:
+                    continue
+                existing.add(message["idempotency_key"])
+                session.add(OutboxMessage(status="pending", **message))
+                added += 1
             session.commit()
-            return record
+            return added
         finally:
             session.close()
 
-    def update_record(self, process_id: str, updates: Dict[str, Any]) -> Optional[ProcessingRecord]:
-        """Update an existing processing record"""
-        session = self.Session()
-        try:
-            record = session.query(ProcessingRecord).filter_by(process_id=process_id).first()
-            if record:
-                for key, value in updates.items():
-                    setattr(record, key, value)
-                session.commit()
-                return record
-            return None
-        finally:
-            session.close()
+    def backfill_promoted_columns(self, chunk_size: int = 1000) -> int:
+        """
+        Derive the promoted columns and action type rows of existing records
 
-    def get_record(self, process_id: str) -> Optional[ProcessingRecord]:
-        """Retrieve a processing record by ID"""
-        session = self.Session()
-        try:
-            return session.query(ProcessingRecord).filter_by(process_id=process_id).first()
-        finally:
-            session.close()
+        Records are read in primary-key order, a chunk per transaction, loading
+        only the JSON columns the promoted values come from. Safe to re-run.
 
-    def get_history(self, limit: int = 100) -> list:
-        """Retrieve processing history"""
-        session = self.Session()
-        try:
-            return session.query(ProcessingRecord).order_by(
-                ProcessingRecord.created_at.desc()
-            ).limit(limit).all()
-        finally:
-            session.close()
+        Args:
+            chunk_size: Records per transaction
+
+        Returns:
+            int: Number of records backfilled
+        """
+        count = 0
+        last_id = 0
+        while True:
+            session = self.Session()
+            try:
+                rows = session.query(
+                    ProcessingRecord.id,
+                    ProcessingRecord.process_id,
+                    ProcessingRecord.input_type,
+                    ProcessingRecord.classification,
+                    ProcessingRecord.agent_output,
+                    ProcessingRecord.actions_triggered,
+                    ProcessingRecord.updated_at
+                ).filter(ProcessingRecord.id > last_id).order_by(ProcessingRecord.id).limit(chunk_size).all()
+                if not rows:
+                    return count
+                last_id = rows[-1].id
+                updates = []
+                actions = []
+                for row in rows:
+                    promoted = promote_columns({
+                        "classification": row.classification,
+                        "agent_output": row.agent_output
+                    })
+                    # Every row carries every column so the chunk is one executemany
+                    values = {column: promoted.get(column) for column in PROMOTED_COLUMNS}
+                    values["input_type"] = values["input_type"] or row.input_type
+                    # Keep updated_at: a backfill is not a change of the record
+                    updates.append({"id": row.id, "updated_at": row.updated_at, **values})
+                    actions.extend(action_type_rows(row.process_id, row.actions_triggered))
+                session.execute(update(ProcessingRecord), updates)
+                session.query(RecordAction).filter(
+                    RecordAction.process_id.in_([row.process_id for row in rows])
+                ).delete(synchronize_session=False)
+                session.add_all(actions)
+                session.commit()
+            finally:
+                session.close()
+            count += len(rows)
+            logger.info(f"Backfilled promoted columns for {count} records")
 
 # Initialize memory manager
 memory_manager = MemoryManager() 
\ No newline at end of file
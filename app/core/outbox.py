@@ -0,0 +1,238 @@
+from sqlalchemy import update, func, or_, and_
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+import os
+import random
+import socket
+
+from .memory import OutboxMessage, memory_manager
+from .router import DeliveryRejected, action_router
+from .breaker import CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+class OutboxDispatcher:
+    """
+    Delivers outbox messages with persistent exponential backoff and dead-lettering
+
+    Messages an endpoint rejects with a client error (4xx other than 408
+    and 429) are dead-lettered at once, since resending them cannot succeed.
+    """
+
+    def __init__(self):
+        self.Session = memory_manager.Session
+        self.batch_size = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+        self.poll_interval = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+        self.max_poll_interval = float(os.getenv("OUTBOX_MAX_POLL_INTERVAL", "30"))
+        self.lease_seconds = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+        self.max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+        self.base_delay = float(os.getenv("OUTBOX_BASE_DELAY_SECONDS", "2"))
+        self.max_delay = float(os.getenv("OUTBOX_MAX_DELAY_SECONDS", "600"))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:outbox"
+        self._task: Optional[asyncio.Task] = None
+        # Wakes the idle delivery loop as soon as messages are queued in this process
+        self.message_available = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        """Start the delivery loop on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # An event is tied to the loop that first waits on it
+            self.message_available = asyncio.Event()
+        self._loop = loop
+        self._task = asyncio.create_task(self._run())
+
+    def notify_queued(self) -> None:
+        """Wake the delivery loop after new messages were committed"""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is None or running is self._loop:
+            self.message_available.set()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.message_available.set)
+
+    async def stop(self):
+        """Stop the delivery loop; leased messages are retried after their lease expires"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        idle_wait = self.poll_interval
+        while True:
+            # Cleared before claiming, so a message queued during the claim still wakes the loop
+            self.message_available.clear()
+            try:
+                messages = await asyncio.to_thread(self.claim)
+                if messages:
+                    await self.deliver(messages)
+                    idle_wait = self.poll_interval
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox delivery loop error: {str(e)}")
+            # Messages queued in this process wake the loop; polling only finds retries coming
+            # due and messages queued by other processes, so it backs off while idle
+            try:
+                await asyncio.wait_for(self.message_available.wait(), idle_wait)
+                idle_wait = self.poll_interval
+            except asyncio.TimeoutError:
+                idle_wait = min(idle_wait * 2, self.max_poll_interval)
+
+    def _claimable(self, now: datetime):
+        """Pending messages that are due, or deliveries whose lease has expired"""
+        return or_(
+            and_(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now),
+            and_(OutboxMessage.status == "delivering", OutboxMessage.lease_expires_at < now)
+        )
+
+    def claim(self) -> List[Dict[str, Any]]:
+        """
+        Lease a batch of due messages
+
+        Returns:
+            list: The leased messages as plain dicts
+        """
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            ids = [row[0] for row in session.query(OutboxMessage.id).filter(
+                self._claimable(now)
+            ).order_by(OutboxMessage.next_attempt_at).limit(self.batch_size)]
+            if not ids:
+                return []
+            session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_(ids), self._claimable(now))
+                .values(
+                    status="delivering",
+                    lease_owner=self.owner,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds)
+                )
+            )
+            session.commit()
+            # Other processes may have won some of the candidates
+            return [
+                {
+                    "id": message.id,
+                    "action_type": message.action_type,
+                    "payload": message.payload,
+                    "idempotency_key": message.idempotency_key,
+                    "attempts": message.attempts
+                }
+                for message in session.query(OutboxMessage).filter(
+                    OutboxMessage.id.in_(ids),
+                    OutboxMessage.lease_owner == self.owner,
+                    OutboxMessage.status == "delivering"
+                )
+            ]
+        finally:
+            session.close()
+
+    async def deliver(self, messages: List[Dict[str, Any]]) -> None:
+        """Deliver a batch concurrently and record every outcome in one transaction"""
+        results = await asyncio.gather(
+            *(action_router.deliver(m["action_type"], m["payload"], m["idempotency_key"]) for m in messages),
+            return_exceptions=True
+        )
+        await asyncio.to_thread(self.record_outcomes, messages, results)
+
+    def backoff(self, attempts: int) -> float:
+        """Exponential backoff with jitter for the given number of failed attempts"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.5)
+
+    def record_outcomes(self, messages: List[Dict[str, Any]], results: List[Any]) -> None:
+        """Mark deliveries, schedule retries and dead-letter exhausted messages"""
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            for message, result in zip(messages, results):
+                query = update(OutboxMessage).where(
+                    OutboxMessage.id == message["id"],
+                    OutboxMessage.lease_owner == self.owner
+                )
+                if not isinstance(result, BaseException):
+                    session.execute(query.values(
+                        status="delivered",
+                        attempts=message["attempts"] + 1,
+                        response=result,
+                        delivered_at=now,
+                        lease_owner=None,
+                        lease_expires_at=None
+                    ))
+                    continue
+
+                if isinstance(result, CircuitOpen):
+                    # The endpoint was never called; wait for the circuit without spending an attempt
+                    session.execute(query.values(
+                        status="pending",
+                        next_attempt_at=now + timedelta(seconds=result.retry_after),
+                        lease_owner=None,
+                        lease_expires_at=None
+                    ))
+                    continue
+
+                attempts = message["attempts"] + 1
+                error = f"{type(result).__name__}: {str(result)}"
+                if isinstance(result, DeliveryRejected):
+                    logger.error(f"Dead-lettering {message['idempotency_key']}, rejected by the endpoint: {error}")
+                    values = {"status": "dead"}
+                elif attempts >= self.max_attempts:
+                    logger.error(f"Dead-lettering {message['idempotency_key']} after {attempts} attempts: {error}")
+                    values = {"status": "dead"}
+                else:
+                    delay = self.backoff(attempts)
+                    logger.warning(f"Delivery of {message['idempotency_key']} failed, retrying in {delay:.1f}s: {error}")
+                    values = {"status": "pending", "next_attempt_at": now + timedelta(seconds=delay)}
+                session.execute(query.values(
+                    attempts=attempts,
+                    last_error=error,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    **values
+                ))
+            session.commit()
+        finally:
+            session.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Count outbox messages per status"""
+        session = self.Session()
+        try:
+            rows = session.query(OutboxMessage.status, func.count(OutboxMessage.id)).group_by(OutboxMessage.status).all()
+            return {status: count for status, count in rows}
+        finally:
+            session.close()
+
+    def get_actions(self, process_id: str) -> List[Dict[str, Any]]:
+        """Delivery state of every action of a processing record"""
+        session = self.Session()
+        try:
+            return [
+                {
+                    "action_type": message.action_type,
+                    "idempotency_key": message.idempotency_key,
+                    "status": message.status,
+                    "attempts": message.attempts,
+                    "next_attempt_at": message.next_attempt_at.isoformat() if message.status == "pending" else None,
+                    "last_error": message.last_error,
+                    "response": message.response,
+                    "delivered_at": message.delivered_at.isoformat() if message.delivered_at else None
+                }
+                for message in session.query(OutboxMessage).filter(
+                    OutboxMessage.process_id == process_id
+                ).order_by(OutboxMessage.id)
+            ]
+        finally:
+            session.close()
+
+# Initialize outbox dispatcher
+outbox_dispatcher = OutboxDispatcher()
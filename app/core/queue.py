@@ -0,0 +1,284 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, LargeBinary, Index, update, func, or_, and_
+from datetime import datetime, timedelta
+from typing import Optional, Callable, Awaitable, List
+import asyncio
+import logging
+import os
+import socket
+
+from .memory import Base, memory_manager, create_schema
+from .async_memory import async_memory_manager
+
+logger = logging.getLogger(__name__)
+
+class Job(Base):
+    """Model for queued processing jobs"""
+    __tablename__ = "job_queue"
+
+    id = Column(Integer, primary_key=True)
+    process_id = Column(String(36), index=True)
+    priority = Column(Integer, default=0)
+    status = Column(String(20), default="queued")  # queued, running, done, failed
+    file_name = Column(String(255))
+    process_type = Column(String(50), nullable=True)
+    payload = Column(LargeBinary, nullable=True)  # only for jobs queued before uploads were spooled
+    payload_path = Column(String(500), nullable=True)
+    fingerprint = Column(String(64), nullable=True)  # SHA-256 of the payload
+    attempts = Column(Integer, default=0)
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_job_queue_claim", "status", "priority", "id"),
+    )
+
+class JobQueue:
+    """Durable job queue stored next to the processing records"""
+
+    def __init__(self):
+        self.engine = memory_manager.engine
+        create_schema(self.engine, [Job.__table__])
+        self.Session = memory_manager.Session
+        self.lease_seconds = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+        self.max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        # Wakes idle in-process workers as soon as a job is enqueued
+        self.job_available = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Remember the loop the workers wait on, so enqueues from other threads can wake them"""
+        if loop is not self._loop:
+            # An event is tied to the loop that first waits on it
+            self.job_available = asyncio.Event()
+        self._loop = loop
+
+    def _notify(self) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is None or running is self._loop:
+            self.job_available.set()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.job_available.set)
+
+    def new_job(self, **job) -> Job:
+        """
+        Build a queued job row to insert in the caller's transaction
+
+        Takes the Job columns (process_id, file_name, payload_path, process_type,
+        priority, fingerprint). Handlers insert the job together with its
+        processing record through the async memory manager, then call
+        notify_enqueued once it is committed.
+        """
+        return Job(status="queued", **job)
+
+    def notify_enqueued(self) -> None:
+        """Wake idle workers after new jobs were committed"""
+        self._notify()
+
+    def _claimable(self, now: datetime):
+        """Jobs that are queued, or running under a lease that has expired"""
+        return or_(
+            Job.status == "queued",
+            and_(Job.status == "running", Job.lease_expires_at < now)
+        )
+
+    def claim(self, owner: str) -> Optional[Job]:
+        """
+        Lease the highest-priority claimable job
+
+        Args:
+            owner: Identifier of the claiming worker
+
+        Returns:
+            Job: The leased job, or None if the queue is empty
+        """
+        session = self.Session()
+        try:
+            # Another worker (or process) may win the race for a candidate,
+            # so retry a few times before reporting an empty queue
+            for _ in range(5):
+                now = datetime.utcnow()
+                candidate = session.query(Job.id).filter(
+                    self._claimable(now)
+                ).order_by(Job.priority.desc(), Job.id).limit(1).scalar()
+                if candidate is None:
+                    return None
+
+                result = session.execute(
+                    update(Job)
+                    .where(Job.id == candidate, self._claimable(now))
+                    .values(
+                        status="running",
+                        lease_owner=owner,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                        attempts=Job.attempts + 1,
+                        updated_at=now
+                    )
+                )
+                session.commit()
+                if result.rowcount == 1:
+                    job = session.get(Job, candidate)
+                    session.expunge(job)
+                    return job
+            return None
+        finally:
+            session.close()
+
+    def heartbeat(self, job_id: int, owner: str) -> bool:
+        """Extend the lease of a running job; returns False if the lease was lost"""
+        return self._finish(
+            job_id, owner,
+            lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        )
+
+    def complete(self, job_id: int, owner: str) -> bool:
+        """Mark a job as done and drop its payload"""
+        if not self._finish(job_id, owner, status="done", payload=None, lease_expires_at=None):
+            return False
+        self._discard_payload(job_id)
+        return True
+
+    def fail(self, job_id: int, owner: str, error: str) -> bool:
+        """Mark a job as permanently failed"""
+        if not self._finish(job_id, owner, status="failed", payload=None, lease_expires_at=None, error=error):
+            return False
+        self._discard_payload(job_id)
+        return True
+
+    def _discard_payload(self, job_id: int) -> None:
+        """Delete the spooled upload of a finished job"""
+        session = self.Session()
+        try:
+            path = session.query(Job.payload_path).filter(Job.id == job_id).scalar()
+        finally:
+            session.close()
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def release(self, job_id: int, owner: str) -> bool:
+        """Return a running job to the queue without counting the attempt"""
+        return self._finish(
+            job_id, owner,
+            status="queued", lease_owner=None, lease_expires_at=None,
+            attempts=Job.attempts - 1
+        )
+
+    def _finish(self, job_id: int, owner: str, **values) -> bool:
+        """Update a job only while the caller still holds its lease"""
+        session = self.Session()
+        try:
+            result = session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.lease_owner == owner, Job.status == "running")
+                .values(updated_at=datetime.utcnow(), **values)
+            )
+            session.commit()
+            return result.rowcount == 1
+        finally:
+            session.close()
+
+    def stats(self) -> dict:
+        """Count jobs per status"""
+        session = self.Session()
+        try:
+            rows = session.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+            return {status: count for status, count in rows}
+        finally:
+            session.close()
+
+class JobWorkerPool:
+    """Pool of async workers draining the job queue"""
+
+    def __init__(self, queue: JobQueue, handler: Callable[[Job], Awaitable[None]], workers: Optional[int] = None):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.poll_interval = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+        self.max_poll_interval = float(os.getenv("JOB_MAX_POLL_INTERVAL", "30"))
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self.queue.bind_loop(asyncio.get_running_loop())
+        for n in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._run(f"{prefix}:{n}")))
+        logger.info(f"Started {self.workers} job workers")
+
+    async def stop(self):
+        """Cancel the workers; jobs in flight are released back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, owner: str):
+        idle_wait = self.poll_interval
+        while True:
+            # Cleared before claiming, so a job enqueued during the claim still wakes this worker
+            self.queue.job_available.clear()
+            job = await asyncio.to_thread(self.queue.claim, owner)
+            if job is None:
+                # Enqueues in this process wake the workers; polling only finds jobs queued by
+                # other processes or left behind by a lost lease, so it backs off while idle
+                try:
+                    await asyncio.wait_for(self.queue.job_available.wait(), idle_wait)
+                    idle_wait = self.poll_interval
+                except asyncio.TimeoutError:
+                    idle_wait = min(idle_wait * 2, self.max_poll_interval)
+                continue
+            idle_wait = self.poll_interval
+            # There may be more; pass the wake-up on to the other idle workers
+            self.queue.job_available.set()
+            await self._execute(job, owner)
+
+    async def _execute(self, job: Job, owner: str):
+        if job.attempts > self.queue.max_attempts:
+            error = f"Job abandoned after {job.attempts - 1} attempts"
+            logger.error(f"{error} for {job.process_id}")
+            await asyncio.to_thread(self.queue.fail, job.id, owner, error)
+            await async_memory_manager.update_record(job.process_id, {
+                "status": "error",
+                "error": error
+            })
+            return
+
+        work = asyncio.create_task(self.handler(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, owner, work))
+        try:
+            await work
+        except asyncio.CancelledError:
+            if heartbeat.done() and not heartbeat.cancelled() and heartbeat.result():
+                # Another worker owns the job now and runs it again
+                logger.warning(f"Abandoned job {job.id} ({job.process_id}) after losing its lease")
+                return
+            await asyncio.shield(asyncio.to_thread(self.queue.release, job.id, owner))
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            await asyncio.to_thread(self.queue.fail, job.id, owner, str(e))
+        else:
+            await asyncio.to_thread(self.queue.complete, job.id, owner)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: Job, owner: str, work: asyncio.Task) -> bool:
+        """Extend the lease while the job runs; cancels the job and returns True if the lease is lost"""
+        interval = max(self.queue.lease_seconds / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            if not await asyncio.to_thread(self.queue.heartbeat, job.id, owner):
+                logger.warning(f"Lost lease on job {job.id} ({job.process_id})")
+                work.cancel()
+                return True
+
+# Initialize job queue
+job_queue = JobQueue()
@@ -0,0 +1,206 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+import hashlib
+import json
+import logging
+import os
+import time
+
+from .blobs import BLOB_FIELDS, blob_store
+from .memory import ProcessingRecord, memory_manager
+from .rules import CompiledRules
+from .router import action_router
+
+logger = logging.getLogger(__name__)
+
+REPLAY_CHUNK_SIZE = int(os.getenv("REPLAY_CHUNK_SIZE", "1000"))
+REPLAY_SAMPLE_SIZE = int(os.getenv("REPLAY_SAMPLE_SIZE", "100"))
+
+def _action_key(action: Tuple[str, Dict[str, Any]]) -> str:
+    """Canonical form of an (action_type, payload) pair for comparing rule outcomes"""
+    return json.dumps([action[0], action[1]], sort_keys=True, default=str)
+
+class ReplayEngine:
+    """
+    Backtests routing rules against stored agent outputs
+
+    Records are streamed from the database in id-ordered chunks, each chunk
+    read in its own short transaction. Both the active rules and the
+    candidate rules are evaluated on every agent_output, and the report
+    lists which actions would be added or removed. No agent or LLM work is
+    repeated. Offloaded fields that a rule reads are loaded back from the
+    blob store first, so they are evaluated as they were when routed live.
+    In deliver mode the added actions are queued in the outbox
+    under replay-specific idempotency keys, so re-running a replay does not
+    send them twice.
+    """
+
+    def __init__(self, chunk_size: int = REPLAY_CHUNK_SIZE, sample_size: int = REPLAY_SAMPLE_SIZE):
+        self.Session = memory_manager.Session
+        self.chunk_size = chunk_size
+        self.sample_size = sample_size
+
+    def stream_outputs(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        input_type: Optional[str] = None,
+        status: Optional[str] = "completed",
+        limit: Optional[int] = None
+    ) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        Yield chunks of (process_id, agent_output) in id order
+
+        Only the two needed columns are loaded, and each chunk continues
+        after the last id seen instead of using OFFSET.
+        """
+        last_id = 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+            session = self.Session()
+            try:
+                query = session.query(
+                    ProcessingRecord.id,
+                    ProcessingRecord.process_id,
+                    ProcessingRecord.agent_output
+                ).filter(
+                    ProcessingRecord.id > last_id,
+                    ProcessingRecord.agent_output.isnot(None)
+                )
+                if status:
+                    query = query.filter(ProcessingRecord.status == status)
+                if input_type:
+                    query = query.filter(ProcessingRecord.input_type == input_type)
+                if since:
+                    query = query.filter(ProcessingRecord.created_at >= since)
+                if until:
+                    query = query.filter(ProcessingRecord.created_at < until)
+                rows = query.order_by(ProcessingRecord.id).limit(size).all()
+            finally:
+                session.close()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+            yield [(process_id, agent_output) for _, process_id, agent_output in rows]
+
+    @staticmethod
+    def _load_blobs(process_id: str, agent_output: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+        """Resolve the given offloaded fields of an agent output; a missing blob is kept as its reference"""
+        loaded = dict(agent_output)
+        for field in fields:
+            try:
+                loaded[field] = blob_store.load(loaded.get(field))
+            except FileNotFoundError:
+                logger.warning(f"Blob of {field} missing for record {process_id}, replaying its reference")
+        return loaded
+
+    def run(
+        self,
+        rules_document: Optional[Dict[str, Any]] = None,
+        mode: str = "dry_run",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        input_type: Optional[str] = None,
+        status: Optional[str] = "completed",
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Replay stored agent outputs through candidate routing rules
+
+        Args:
+            rules_document: Candidate rules; defaults to the active rules
+            mode: "dry_run" to only report, "deliver" to queue added actions in the outbox
+            since: Only records created at or after this time
+            until: Only records created before this time
+            input_type: Only records of this input type
+            status: Only records in this status (None for any)
+            limit: Maximum number of records to replay
+
+        Returns:
+            dict: Counts of scanned and changed records, per-action-type
+                additions and removals, rule match counts and sample changes
+
+        Raises:
+            ValueError: If the mode is unknown or the rules do not compile
+        """
+        if mode not in ("dry_run", "deliver"):
+            raise ValueError(f"Unknown replay mode: {mode}")
+        baseline = action_router.rules.compiled
+        candidate = CompiledRules(rules_document, source="replay") if rules_document else baseline
+        revision = hashlib.sha256(
+            json.dumps(rules_document or {}, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+        # Only the offloaded fields some rule reads are worth loading
+        referenced = {path.split(".")[0] for path in baseline.paths + candidate.paths}
+        blob_fields = [field for field in BLOB_FIELDS if field in referenced]
+
+        started = time.monotonic()
+        scanned = changed = queued = 0
+        added = Counter()
+        removed = Counter()
+        matched = Counter()
+        samples = []
+
+        for chunk in self.stream_outputs(since, until, input_type, status, limit):
+            outbox = []
+            for process_id, agent_output in chunk:
+                scanned += 1
+                if not isinstance(agent_output, dict):
+                    continue
+                if blob_fields:
+                    agent_output = self._load_blobs(process_id, agent_output, blob_fields)
+                before = baseline.evaluate(agent_output)
+                after = candidate.evaluate(agent_output)
+                for action_type, _ in after:
+                    matched[action_type] += 1
+
+                before_keys = Counter(_action_key(action) for action in before)
+                after_keys = Counter(_action_key(action) for action in after)
+                if before_keys == after_keys:
+                    continue
+                changed += 1
+                new_keys = after_keys - before_keys
+                gone_keys = before_keys - after_keys
+                new_actions = [a for a in after if new_keys[_action_key(a)] > 0]
+                gone_actions = [a for a in before if gone_keys[_action_key(a)] > 0]
+                added.update(action_type for action_type, _ in new_actions)
+                removed.update(action_type for action_type, _ in gone_actions)
+                if len(samples) < self.sample_size:
+                    samples.append({
+                        "process_id": process_id,
+                        "added": [action_type for action_type, _ in new_actions],
+                        "removed": [action_type for action_type, _ in gone_actions]
+                    })
+                if mode == "deliver":
+                    outbox.extend(
+                        {
+                            "process_id": process_id,
+                            "action_type": action_type,
+                            "payload": payload,
+                            "idempotency_key": f"{process_id}:replay-{revision}:{index}:{action_type}"
+                        }
+                        for index, (action_type, payload) in enumerate(new_actions)
+                    )
+            if outbox:
+                queued += memory_manager.queue_outbox_messages(outbox)
+            logger.info(f"Replayed {scanned} records, {changed} changed")
+
+        return {
+            "mode": mode,
+            "rules_revision": revision,
+            "scanned": scanned,
+            "changed": changed,
+            "actions_added": dict(added),
+            "actions_removed": dict(removed),
+            "candidate_matches": dict(matched),
+            "queued": queued,
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+            "samples": samples
+        }
+
+# Initialize replay engine
+replay_engine = ReplayEngine()
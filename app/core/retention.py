@@ -0,0 +1,392 @@
+from sqlalchemy import Column, DateTime, String, bindparam, delete, func, or_, tuple_, text, update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import gzip
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+
+from .memory import TERMINAL_STATUSES, Base, ProcessingRecord, RecordAction, OutboxMessage, create_schema, memory_manager
+from .async_memory import async_memory_manager
+from .queue import Job
+from .blobs import BLOB_FIELDS, blob_store
+from .search import FTS_TABLE, document_index
+from .status_cache import status_cache
+
+logger = logging.getLogger(__name__)
+
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "false").lower() == "true"
+RETENTION_MODE = os.getenv("RETENTION_MODE", "archive")  # archive, purge
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "90"))
+RETENTION_MAX_ROWS = int(os.getenv("RETENTION_MAX_ROWS", "0"))  # 0 = no cap
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "./archive")
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_BATCH_PAUSE_MS = int(os.getenv("RETENTION_BATCH_PAUSE_MS", "50"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))
+RETENTION_LEASE_SECONDS = int(os.getenv("RETENTION_LEASE_SECONDS", "300"))
+
+# Outbox and job rows that no longer drive any work and can go with their record
+FINISHED_OUTBOX_STATUSES = ("delivered", "dead")
+FINISHED_JOB_STATUSES = ("done", "failed")
+
+class MaintenanceLease(Base):
+    """Lease on a periodic task that only one process may run at a time"""
+    __tablename__ = "maintenance_leases"
+
+    name = Column(String(50), primary_key=True)
+    owner = Column(String(100))
+    expires_at = Column(DateTime)
+
+def archive_row(record: ProcessingRecord) -> Dict[str, Any]:
+    """
+    Self-contained archive form of a record
+
+    Blob references are resolved so the archive does not depend on the
+    blob store; a blob that is already gone is kept as its reference.
+    """
+    row = {}
+    for column in ProcessingRecord.__table__.columns:
+        value = getattr(record, column.name)
+        row[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    agent_output = row.get("agent_output")
+    if isinstance(agent_output, dict):
+        agent_output = dict(agent_output)
+        for field in BLOB_FIELDS:
+            try:
+                agent_output[field] = blob_store.load(agent_output.get(field))
+            except FileNotFoundError:
+                logger.warning(f"Blob of {field} missing for record {record.process_id}, archiving its reference")
+        row["agent_output"] = agent_output
+    return row
+
+class RetentionManager:
+    """
+    Keeps processing_records bounded by archiving or purging old records
+
+    Finished records older than RETENTION_MAX_AGE_DAYS, and the oldest ones
+    beyond RETENTION_MAX_ROWS, are removed oldest first in batches of
+    RETENTION_BATCH_SIZE, each in its own short transaction, so the write
+    lock is never held for long. In archive mode every batch is first
+    written as gzipped NDJSON under RETENTION_ARCHIVE_DIR, partitioned by
+    the day the records were created. Archive files are written before the
+    rows are deleted, so an interrupted run can archive a batch twice but
+    never loses one. Freed pages are returned to the file system with
+    incremental vacuum, and blobs no remaining row refers to are swept.
+
+    Every worker process runs the schedule, but a pass needs the lease row
+    in maintenance_leases, claimed like a job and renewed per batch. The
+    process that ran a pass keeps the lease until the next one is due, so
+    the others skip that interval.
+    """
+
+    def __init__(self):
+        if RETENTION_MODE not in ("archive", "purge"):
+            raise ValueError(f"RETENTION_MODE must be archive or purge, not {RETENTION_MODE}")
+        self.engine = memory_manager.engine
+        create_schema(self.engine, [MaintenanceLease.__table__])
+        self.Session = memory_manager.Session
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:retention"
+        self.lease_seconds = RETENTION_LEASE_SECONDS
+        self.enabled = RETENTION_ENABLED
+        self.mode = RETENTION_MODE
+        self.max_age = timedelta(days=RETENTION_MAX_AGE_DAYS)
+        self.max_rows = RETENTION_MAX_ROWS
+        self.archive_dir = RETENTION_ARCHIVE_DIR
+        self.batch_size = RETENTION_BATCH_SIZE
+        self.batch_pause = RETENTION_BATCH_PAUSE_MS / 1000
+        self.interval = RETENTION_INTERVAL_SECONDS
+        self.vacuum_pages = RETENTION_VACUUM_PAGES
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Run retention every RETENTION_INTERVAL_SECONDS on the running event loop"""
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the retention loop; a batch in progress finishes in its thread"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if await asyncio.to_thread(self.run_once, lease=True) is not None:
+                    # Keep the lease until the next pass is due, so other workers skip this interval
+                    await asyncio.to_thread(self.claim_lease, self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Retention run failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def claim_lease(self, seconds: float) -> bool:
+        """
+        Take the retention lease, or extend it if this process holds it
+
+        Args:
+            seconds: How long the lease lasts from now
+
+        Returns:
+            bool: Whether this process holds the lease
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=seconds)
+        session = self.Session()
+        try:
+            result = session.execute(
+                update(MaintenanceLease)
+                .where(
+                    MaintenanceLease.name == "retention",
+                    or_(MaintenanceLease.owner == self.owner, MaintenanceLease.expires_at < now)
+                )
+                .values(owner=self.owner, expires_at=expires_at)
+            )
+            if result.rowcount == 0:
+                # No lease row yet, or another process holds it
+                session.add(MaintenanceLease(name="retention", owner=self.owner, expires_at=expires_at))
+            session.commit()
+            return True
+        except IntegrityError:
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    def boundary(self, now: Optional[datetime] = None) -> Tuple[datetime, int]:
+        """
+        (created_at, id) position before which records are removed
+
+        The later of the age cutoff and the position of the oldest record
+        that does not fit under max_rows.
+        """
+        now = now or datetime.utcnow()
+        boundary = (now - self.max_age, 0)
+        if self.max_rows > 0:
+            session = self.Session()
+            try:
+                overflow = session.query(ProcessingRecord.created_at, ProcessingRecord.id).order_by(
+                    ProcessingRecord.created_at.desc(), ProcessingRecord.id.desc()
+                ).offset(self.max_rows - 1).limit(1).first()
+            finally:
+                session.close()
+            if overflow and overflow.created_at and (overflow.created_at, overflow.id) > boundary:
+                boundary = (overflow.created_at, overflow.id)
+        return boundary
+
+    def run_once(self, now: Optional[datetime] = None, lease: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Archive or purge every expired record, then vacuum
+
+        Args:
+            now: Reference time for the age cutoff, defaults to the current time
+            lease: Only run while holding the retention lease, renewing it per batch
+
+        Returns:
+            dict: Records removed, archive files written and pages vacuumed,
+            or None if another process holds the lease
+        """
+        if lease and not self.claim_lease(self.lease_seconds):
+            logger.debug("Retention lease held by another process, skipping this pass")
+            return None
+        started = time.perf_counter()
+        boundary = self.boundary(now)
+        removed = 0
+        files: List[str] = []
+        while True:
+            batch = self._next_batch(boundary)
+            if not batch:
+                break
+            if self.mode == "archive":
+                files.extend(self._archive(batch))
+            self._delete(batch)
+            removed += len(batch)
+            if len(batch) < self.batch_size:
+                break
+            if lease and not self.claim_lease(self.lease_seconds):
+                logger.warning("Lost the retention lease, stopping this pass")
+                break
+            time.sleep(self.batch_pause)
+        vacuumed = self.vacuum() if removed else 0
+        swept = self._sweep_blobs() if removed else 0
+        self.last_run = {
+            "mode": self.mode,
+            "boundary": boundary[0].isoformat(),
+            "removed": removed,
+            "archive_files": len(files),
+            "vacuumed_pages": vacuumed,
+            "blobs_swept": swept,
+            "seconds": round(time.perf_counter() - started, 3),
+            "finished_at": datetime.utcnow().isoformat()
+        }
+        if removed:
+            logger.info(f"Retention {self.mode}d {removed} records into {len(files)} files, vacuumed {vacuumed} pages")
+        return self.last_run
+
+    def _next_batch(self, boundary: Tuple[datetime, int]) -> List[ProcessingRecord]:
+        """Oldest finished records before the boundary"""
+        session = self.Session()
+        try:
+            query = session.query(ProcessingRecord) if self.mode == "archive" else session.query(
+                ProcessingRecord.id, ProcessingRecord.process_id
+            )
+            return query.filter(
+                ProcessingRecord.status.in_(TERMINAL_STATUSES),
+                tuple_(ProcessingRecord.created_at, ProcessingRecord.id) < boundary
+            ).order_by(ProcessingRecord.created_at, ProcessingRecord.id).limit(self.batch_size).all()
+        finally:
+            session.close()
+
+    def _archive(self, batch: List[ProcessingRecord]) -> List[str]:
+        """Write a batch as one gzipped NDJSON file per creation day"""
+        days: Dict[str, List[Dict[str, Any]]] = {}
+        for record in batch:
+            days.setdefault(record.created_at.strftime("%Y-%m-%d"), []).append(archive_row(record))
+        paths = []
+        for day, rows in days.items():
+            directory = os.path.join(self.archive_dir, "processing_records", f"date={day}")
+            path = os.path.join(directory, f"part-{rows[0]['id']:012d}-{rows[-1]['id']:012d}.ndjson.gz")
+            os.makedirs(directory, exist_ok=True)
+            # Write to a temporary file and rename, so a crash never leaves a truncated archive
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as raw:
+                    with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as out:
+                        for row in rows:
+                            out.write(json.dumps(row, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+            paths.append(path)
+        return paths
+
+    def _delete(self, batch: List[Any]) -> None:
+        """Delete a batch of records with their index, action, outbox and job rows in one transaction"""
+        ids = [record.id for record in batch]
+        process_ids = [record.process_id for record in batch]
+        session = self.Session()
+        try:
+            if document_index.enabled:
+                session.execute(
+                    text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+                    {"ids": ids}
+                )
+            session.execute(delete(RecordAction).where(RecordAction.process_id.in_(process_ids)))
+            session.execute(delete(OutboxMessage).where(
+                OutboxMessage.process_id.in_(process_ids),
+                OutboxMessage.status.in_(FINISHED_OUTBOX_STATUSES)
+            ))
+            session.execute(delete(Job).where(Job.process_id.in_(process_ids), Job.status.in_(FINISHED_JOB_STATUSES)))
+            session.execute(delete(ProcessingRecord).where(ProcessingRecord.id.in_(ids)))
+            session.commit()
+        finally:
+            session.close()
+        # Other processes drop their cached entries at the next version check
+        for process_id in process_ids:
+            status_cache.invalidate(process_id)
+            async_memory_manager.state.forget_id(process_id)
+
+    def _sweep_blobs(self) -> int:
+        """Delete the blobs only the removed records referred to"""
+        try:
+            return blob_store.sweep()["deleted"]
+        except OSError as e:
+            logger.warning(f"Blob sweep after retention failed: {str(e)}")
+            return 0
+
+    def _auto_vacuum(self) -> Optional[int]:
+        """SQLite auto_vacuum mode (0 none, 1 full, 2 incremental), None for other databases"""
+        if self.engine.dialect.name != "sqlite":
+            return None
+        with self.engine.connect() as conn:
+            return conn.execute(text("PRAGMA auto_vacuum")).scalar()
+
+    def vacuum(self) -> int:
+        """
+        Release free pages with incremental vacuum, RETENTION_VACUUM_PAGES per transaction
+
+        Does nothing unless the database uses auto_vacuum=INCREMENTAL, which
+        new databases do; see enable_incremental_vacuum for older ones.
+
+        Returns:
+            int: Number of pages released
+        """
+        mode = self._auto_vacuum()
+        if mode != 2:
+            if mode == 0:
+                logger.info("auto_vacuum is off; run `python manage_retention.py vacuum --enable-incremental` once to release free pages")
+            return 0
+        released = 0
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            while True:
+                free = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free:
+                    break
+                cursor.execute("BEGIN IMMEDIATE")
+                # pysqlite steps a PRAGMA once, which releases a single page per execute
+                for _ in range(min(free, self.vacuum_pages)):
+                    cursor.execute("PRAGMA incremental_vacuum(1)")
+                # COMMIT on the same cursor, which first resets the last PRAGMA
+                cursor.execute("COMMIT")
+                released += min(free, self.vacuum_pages)
+                time.sleep(self.batch_pause)
+            cursor.close()
+        finally:
+            connection.close()
+        return released
+
+    def enable_incremental_vacuum(self) -> None:
+        """
+        Switch an existing SQLite database to auto_vacuum=INCREMENTAL
+
+        Rewrites the whole file with VACUUM, which locks the database for
+        its duration; run it during maintenance.
+        """
+        mode = self._auto_vacuum()
+        if mode is None:
+            raise ValueError("Incremental vacuum is only available for SQLite")
+        if mode == 2:
+            return
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+
+    def stats(self) -> Dict[str, Any]:
+        """Settings, hot table size and the result of the last run"""
+        session = self.Session()
+        try:
+            records, oldest = session.query(func.count(ProcessingRecord.id), func.min(ProcessingRecord.created_at)).one()
+            free_pages = session.execute(text("PRAGMA freelist_count")).scalar() if self.engine.dialect.name == "sqlite" else None
+        finally:
+            session.close()
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "max_age_days": self.max_age.total_seconds() / 86400,
+            "max_rows": self.max_rows or None,
+            "archive_dir": self.archive_dir if self.mode == "archive" else None,
+            "records": records,
+            "oldest_record": oldest.isoformat() if oldest else None,
+            "free_pages": free_pages,
+            "last_run": self.last_run
+        }
+
+# Initialize retention manager
+retention_manager = RetentionManager()
@@ -1,13 +1,22 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, Optional
 import httpx
-import json
 import os
 import asyncio
 import logging
-from datetime import datetime
+import time
+
+from .breaker import CircuitBreaker
+from .batcher import ActionBatcher
+from .rules import RuleEngine
 
 logger = logging.getLogger(__name__)
 
+# Client errors that mean "try again later" rather than "never send this again"
+RETRYABLE_STATUSES = (408, 429)
+
+class DeliveryRejected(httpx.HTTPStatusError):
+    """Raised when an endpoint refuses an action with a client error that retrying cannot fix"""
+
 class ActionRouter:
     """Routes actions based on agent outputs and triggers appropriate endpoints"""
     
@@ -19,175 +28,156 @@ class ActionRouter:
             "notification": os.getenv("NOTIFICATION_ENDPOINT", "http://localhost:8004/notify")
         }
         self.client = httpx.AsyncClient(timeout=30.0)
-        self.max_retries = 3
+        # Concurrent in-flight requests allowed per endpoint, e.g. CRM_MAX_CONCURRENCY
+        default_limit = os.getenv("ACTION_MAX_CONCURRENCY", "8")
+        self.slot_limits = {
+            action_type: int(os.getenv(f"{action_type.upper()}_MAX_CONCURRENCY", default_limit))
+            for action_type in self.endpoints
+        }
+        self._endpoint_slots: Dict[str, asyncio.Semaphore] = {}
+        self._endpoint_slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Fail fast on endpoints that keep failing; timeouts follow each endpoint's latency
+        self.breakers = {action_type: CircuitBreaker(action_type) for action_type in self.endpoints}
+        # Optional batch endpoints, e.g. CRM_BATCH_ENDPOINT; outbox deliveries to them are coalesced
+        self.batch_endpoints = {
+            action_type: os.getenv(f"{action_type.upper()}_BATCH_ENDPOINT")
+            for action_type in self.endpoints
+            if os.getenv(f"{action_type.upper()}_BATCH_ENDPOINT")
+        }
+        # Declarative routing rules, reloaded when ROUTING_RULES_PATH changes
+        self.rules = RuleEngine()
+        self.batchers = {
+            action_type: ActionBatcher(action_type, self._batch_sender(action_type))
+            for action_type in self.batch_endpoints
+        }
+
+    def _slots(self, action_type: str) -> asyncio.Semaphore:
+        """The endpoint's semaphore, created on first use in the running event loop"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._endpoint_slots_loop:
+            # A semaphore is tied to the loop that first waits on it
+            self._endpoint_slots = {}
+            self._endpoint_slots_loop = loop
+        if action_type not in self._endpoint_slots:
+            self._endpoint_slots[action_type] = asyncio.Semaphore(self.slot_limits[action_type])
+        return self._endpoint_slots[action_type]
+
+    async def _post(
+        self,
+        action_type: str,
+        data: Any,
+        headers: Dict[str, str],
+        url: Optional[str] = None
+    ) -> httpx.Response:
+        """
+        Send one request through the endpoint's circuit breaker
+        
+        Transport errors and 5xx responses count as failures; other responses
+        show the endpoint is up and count as successes. Any 2xx response is
+        returned.
+        
+        Raises:
+            CircuitOpen: If the endpoint's circuit is open
+            DeliveryRejected: If the endpoint answers with a 4xx other than 408 or 429
+            httpx.HTTPError: If the request fails or returns another non-2xx status
+        """
+        breaker = self.breakers[action_type]
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            response = await self.client.post(
+                url or self.endpoints[action_type],
+                json=data,
+                headers=headers,
+                timeout=breaker.timeout()
+            )
+        except httpx.TransportError:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success(time.monotonic() - started)
+        if 400 <= response.status_code < 500 and response.status_code not in RETRYABLE_STATUSES:
+            raise DeliveryRejected(
+                f"{action_type} endpoint rejected the request with {response.status_code}",
+                request=response.request,
+                response=response
+            )
+        response.raise_for_status()
+        return response
 
-    async def route_action(self, action_type: str, data: Dict[str, Any], retries: int = 0) -> Dict[str, Any]:
+    @staticmethod
+    def _body(response: httpx.Response) -> Any:
+        """Decoded JSON body, or the raw text when the endpoint did not answer with JSON"""
+        try:
+            return response.json()
+        except ValueError:
+            return response.text
+
+    async def deliver(self, action_type: str, data: Dict[str, Any], idempotency_key: str) -> Any:
         """
-        Route an action to the appropriate endpoint with retry logic
+        Send an action once, without retries
+        
+        Used by the outbox dispatcher, which owns retry scheduling. Failures
+        are raised so they are never mistaken for successful deliveries;
+        DeliveryRejected marks the ones that should not be retried.
         
         Args:
             action_type: Type of action to route (crm, risk_alert, etc.)
             data: Data to send with the action
-            retries: Current retry count
+            idempotency_key: Stable key receivers can use to drop redeliveries
             
         Returns:
-            dict: Response from the endpoint
+            Response body from the endpoint, as raw text if it is not JSON
         """
         if action_type not in self.endpoints:
             raise ValueError(f"Unknown action type: {action_type}")
+        if action_type in self.batchers:
+            return await self.batchers[action_type].submit(data, idempotency_key)
+            
+        async with self._slots(action_type):
+            response = await self._post(action_type, data, {
+                "Content-Type": "application/json",
+                "Idempotency-Key": idempotency_key
+            })
+        return self._body(response)
 
-        endpoint = self.endpoints[action_type]
-        
-        try:
-            response = await self.client.post(
-                endpoint,
-                json=data,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            return response.json()
-        except (httpx.HTTPError, httpx.ConnectError, httpx.TimeoutException) as e:
-            if retries < self.max_retries:
-                # Exponential backoff: wait 2^retries seconds
-                wait_time = 2 ** retries
-                logger.warning(f"Action {action_type} failed, retrying in {wait_time}s (attempt {retries + 1}/{self.max_retries})")
-                await asyncio.sleep(wait_time)
-                return await self.route_action(action_type, data, retries + 1)
-            else:
-                logger.warning(f"Action {action_type} failed after {self.max_retries} retries, using mock response")
-                # Return mock response when external service is unavailable
-                return self._get_mock_response(action_type, data)
-
-    def _get_mock_response(self, action_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate mock responses for when external services are unavailable"""
-        base_response = {
-            "status": "success",
-            "timestamp": datetime.utcnow().isoformat(),
-            "mock": True,
-            "message": f"Mock response for {action_type} service"
-        }
-        
-        if action_type == "notification":
-            return {
-                **base_response,
-                "notification_id": f"mock_notif_{datetime.utcnow().timestamp()}",
-                "priority": data.get("priority", "medium"),
-                "message": "Notification sent successfully (mock)"
-            }
-        elif action_type == "risk_alert":
-            return {
-                **base_response,
-                "alert_id": f"mock_alert_{datetime.utcnow().timestamp()}",
-                "risk_level": "assessed",
-                "message": "Risk alert processed successfully (mock)"
-            }
-        elif action_type == "compliance":
-            return {
-                **base_response,
-                "compliance_id": f"mock_comp_{datetime.utcnow().timestamp()}",
-                "review_status": "scheduled",
-                "message": "Compliance review initiated successfully (mock)"
-            }
-        elif action_type == "crm":
-            return {
-                **base_response,
-                "record_id": f"mock_crm_{datetime.utcnow().timestamp()}",
-                "action": data.get("action", "update"),
-                "message": "CRM update processed successfully (mock)"
-            }
-        else:
-            return {
-                **base_response,
-                "message": f"Mock response for unknown action type: {action_type}"
-            }
+    def _batch_sender(self, action_type: str):
+        """Build the coroutine an ActionBatcher uses to send one array payload"""
+        async def send(items: List[Dict[str, Any]]) -> Any:
+            async with self._slots(action_type):
+                response = await self._post(
+                    action_type,
+                    items,
+                    {"Content-Type": "application/json"},
+                    url=self.batch_endpoints[action_type]
+                )
+            return self._body(response)
+        return send
 
-    async def process_agent_output(self, agent_output: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def plan_actions(self, agent_output: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
         """
-        Process agent output and trigger appropriate actions
+        Decide which actions an agent output triggers, without sending them
         
         Args:
             agent_output: Output from any of the agents
             
         Returns:
-            list: Results of triggered actions
+            list: (action_type, payload) pairs in routing order
         """
-        actions = []
-        
-        try:
-            # Extract analysis data
-            analysis = agent_output.get("analysis", {})
-            metadata = agent_output.get("metadata", {})
-            
-            # Example routing logic based on agent output
-            if analysis.get("urgency") == "high":
-                actions.append(
-                    await self.route_action("notification", {
-                        "priority": "high",
-                        "message": analysis.get("message", "Urgent action required"),
-                        "source": "agent_analysis"
-                    })
-                )
-                
-            # Check for high-value transactions (>10K)
-            if "data" in agent_output and isinstance(agent_output["data"], dict):
-                amount = agent_output["data"].get("amount", 0)
-                if isinstance(amount, (int, float)) and amount > 10000:
-                    actions.append(
-                        await self.route_action("risk_alert", {
-                            "alert_type": "high_value_transaction",
-                            "amount": amount,
-                            "details": agent_output.get("details", {})
-                        })
-                    )
-            
-            # Check for risk scores
-            if "risk_score" in analysis and analysis["risk_score"] > 0.7:
-                actions.append(
-                    await self.route_action("risk_alert", {
-                        "risk_score": analysis["risk_score"],
-                        "details": analysis.get("details", {})
-                    })
-                )
-                
-            # Check for compliance issues
-            if "compliance_issues" in analysis or "compliance_check" in agent_output:
-                compliance_data = analysis.get("compliance_issues") or agent_output.get("compliance_check", {})
-                actions.append(
-                    await self.route_action("compliance", {
-                        "issues": compliance_data,
-                        "source": agent_output.get("source", "unknown")
-                    })
-                )
-                
-            # Check for GDPR mentions or high-risk compliance
-            compliance_check = agent_output.get("compliance_check", {})
-            if compliance_check.get("risk_level") == "high" or "GDPR" in str(compliance_check.get("keywords_found", {})):
-                actions.append(
-                    await self.route_action("compliance", {
-                        "alert_type": "gdpr_mention",
-                        "compliance_check": compliance_check,
-                        "source": "pdf_analysis"
-                    })
-                )
-                
-            # Check for customer data updates
-            if "customer_data" in analysis:
-                actions.append(
-                    await self.route_action("crm", {
-                        "action": "update",
-                        "data": analysis["customer_data"]
-                    })
-                )
-                
-        except Exception as e:
-            logger.error(f"Error processing agent output: {str(e)}")
-            actions.append({
-                "status": "error",
-                "error": f"Failed to process agent output: {str(e)}",
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-        return actions
+        return self.rules.evaluate(agent_output)
+
+    def breaker_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Circuit breaker state and counters per action type"""
+        return {action_type: breaker.snapshot() for action_type, breaker in self.breakers.items()}
+
+    def batch_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Batching settings and counters per batched action type"""
+        return {action_type: batcher.stats() for action_type, batcher in self.batchers.items()}
 
     async def close(self):
         """Close the HTTP client"""
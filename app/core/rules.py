@@ -0,0 +1,373 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.getenv(
+    "ROUTING_RULES_PATH",
+    os.path.join(os.path.dirname(__file__), "routing_rules.json")
+)
+
+# Marks a path that is absent from the agent output
+MISSING = object()
+
+OPERATORS = {"eq", "ne", "gt", "gte", "lt", "lte", "exists", "truthy", "contains", "in"}
+
+class RuleError(ValueError):
+    """Raised when a rules document cannot be compiled"""
+
+def resolve_path(document: Any, path: str) -> Any:
+    """Follow a dotted path through nested dicts, returning MISSING if any step is absent"""
+    value = document
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return MISSING
+        value = value[key]
+    return value
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _check(op: str, actual: Any, expected: Any) -> bool:
+    """Evaluate a non-indexed operator against a resolved value"""
+    if op == "exists":
+        return (actual is not MISSING) == bool(expected)
+    if actual is MISSING:
+        return op == "ne"
+    if op == "ne":
+        return actual != expected
+    if op == "truthy":
+        return bool(actual) == bool(expected)
+    if op == "contains":
+        # Dict keys, list items or substrings
+        if isinstance(actual, (dict, list, tuple, set)):
+            try:
+                return expected in actual
+            except TypeError:
+                return False
+        return isinstance(actual, str) and isinstance(expected, str) and expected in actual
+    if op == "in":
+        try:
+            return actual in expected
+        except TypeError:
+            return False
+    return False
+
+class CompiledRules:
+    """
+    Rules compiled into per-path predicate indexes
+
+    Every path referenced by any rule is resolved once per document.
+    Equality predicates are looked up in a hash index, range predicates by
+    bisecting thresholds sorted per path, and identical predicates shared
+    between rules are evaluated once. Rules are then matched by counting
+    satisfied predicates, so the work per document follows the number of
+    predicates that hold rather than the number of rules.
+    """
+
+    def __init__(self, document: Dict[str, Any], source: str = "<memory>"):
+        self.source = source
+        self.version = document.get("version")
+        self.rules: List[Dict[str, Any]] = []
+        self.paths: List[str] = []
+        self._predicate_ids: Dict[Tuple[str, str, str], int] = {}
+        self._predicate_rules: Dict[int, List[int]] = defaultdict(list)
+        self._eq_index: Dict[str, Dict[Any, List[int]]] = defaultdict(dict)
+        # path -> (thresholds, predicate ids) with thresholds ascending
+        self._range_index: Dict[str, Dict[str, Tuple[List[float], List[int]]]] = defaultdict(dict)
+        self._direct: Dict[str, List[Tuple[int, str, Any]]] = defaultdict(list)
+        self._always: List[int] = []
+
+        rules = document.get("rules")
+        if not isinstance(rules, list):
+            raise RuleError("Rules document needs a 'rules' list")
+        ordered = sorted(enumerate(rules), key=lambda item: (-item[1].get("priority", 0), item[0]))
+        for _, rule in ordered:
+            self._compile_rule(rule)
+        self._freeze_ranges()
+        self._path_tree = self._build_path_tree()
+        self._all_missing = {path: MISSING for path in self.paths}
+
+    def _compile_rule(self, rule: Dict[str, Any]) -> None:
+        name = rule.get("name") or f"rule_{len(self.rules)}"
+        target = rule.get("target")
+        if not target:
+            raise RuleError(f"Rule {name} has no target")
+        when = rule.get("when", {})
+        if "any" in when:
+            mode, predicates = "any", when["any"]
+        else:
+            mode, predicates = "all", when.get("all", [])
+        if not isinstance(predicates, list):
+            raise RuleError(f"Rule {name}: 'when' must hold a list of predicates")
+
+        rule_id = len(self.rules)
+        predicate_ids = {self._compile_predicate(name, predicate) for predicate in predicates}
+        for predicate_id in predicate_ids:
+            self._predicate_rules[predicate_id].append(rule_id)
+        if not predicate_ids:
+            self._always.append(rule_id)
+        self.rules.append({
+            "name": name,
+            "target": target,
+            "group": rule.get("group", target),
+            "mode": mode,
+            "needed": len(predicate_ids) if mode == "all" else 1,
+            "payload": rule.get("payload", {})
+        })
+        self._collect_payload_paths(rule.get("payload", {}))
+
+    def _compile_predicate(self, rule_name: str, predicate: Dict[str, Any]) -> int:
+        path = predicate.get("path")
+        op = predicate.get("op", "eq")
+        if not path or op not in OPERATORS:
+            raise RuleError(f"Rule {rule_name}: invalid predicate {predicate}")
+        expected = predicate.get("value", True if op in ("exists", "truthy") else None)
+        if op in ("gt", "gte", "lt", "lte") and not _is_number(expected):
+            raise RuleError(f"Rule {rule_name}: {op} needs a numeric value")
+
+        key = (path, op, json.dumps(expected, sort_keys=True))
+        if key in self._predicate_ids:
+            return self._predicate_ids[key]
+        predicate_id = len(self._predicate_ids)
+        self._predicate_ids[key] = predicate_id
+        if path not in self.paths:
+            self.paths.append(path)
+
+        if op == "eq" and (expected is None or isinstance(expected, (str, int, float, bool))):
+            self._eq_index[path].setdefault((type(expected) is bool, expected), []).append(predicate_id)
+        elif op in ("gt", "gte", "lt", "lte"):
+            self._range_index[path].setdefault(op, ([], []))
+            self._range_index[path][op][0].append(float(expected))
+            self._range_index[path][op][1].append(predicate_id)
+        else:
+            self._direct[path].append((predicate_id, op, expected))
+        return predicate_id
+
+    def _freeze_ranges(self) -> None:
+        for ops in self._range_index.values():
+            for op, (thresholds, ids) in list(ops.items()):
+                pairs = sorted(zip(thresholds, ids))
+                ops[op] = ([t for t, _ in pairs], [i for _, i in pairs])
+
+    def _build_path_tree(self) -> Dict[str, Any]:
+        """Nest the dotted paths by segment so shared prefixes are walked once"""
+        tree: Dict[str, Any] = {}
+        for path in self.paths:
+            node = tree
+            keys = path.split(".")
+            for key in keys[:-1]:
+                node = node.setdefault(key, [None, {}])[1]
+            node.setdefault(keys[-1], [None, {}])[0] = path
+        return tree
+
+    def resolve(self, document: Any) -> Dict[str, Any]:
+        """Resolve every referenced path in one walk over the document"""
+        values = dict(self._all_missing)
+        stack = [(document, self._path_tree)]
+        while stack:
+            value, tree = stack.pop()
+            for key, (path, children) in tree.items():
+                if key not in value:
+                    continue
+                child = value[key]
+                if path is not None:
+                    values[path] = child
+                if children and isinstance(child, dict):
+                    stack.append((child, children))
+        return values
+
+    def _collect_payload_paths(self, template: Any) -> None:
+        if isinstance(template, dict):
+            if "$path" in template:
+                paths = template["$path"] if isinstance(template["$path"], list) else [template["$path"]]
+                for path in paths:
+                    if path not in self.paths:
+                        self.paths.append(path)
+                return
+            for value in template.values():
+                self._collect_payload_paths(value)
+        elif isinstance(template, list):
+            for value in template:
+                self._collect_payload_paths(value)
+
+    def satisfied_predicates(self, values: Dict[str, Any]) -> set:
+        """Ids of the predicates that hold for already resolved path values"""
+        satisfied = set()
+        for path, index in self._eq_index.items():
+            value = values[path]
+            if value is MISSING:
+                continue
+            try:
+                satisfied.update(index.get((type(value) is bool, value), ()))
+            except TypeError:
+                pass
+        for path, ops in self._range_index.items():
+            value = values[path]
+            if not _is_number(value):
+                continue
+            for op, (thresholds, ids) in ops.items():
+                if op == "gt":
+                    satisfied.update(ids[:bisect_left(thresholds, value)])
+                elif op == "gte":
+                    satisfied.update(ids[:bisect_right(thresholds, value)])
+                elif op == "lt":
+                    satisfied.update(ids[bisect_right(thresholds, value):])
+                else:
+                    satisfied.update(ids[bisect_left(thresholds, value):])
+        for path, predicates in self._direct.items():
+            value = values[path]
+            for predicate_id, op, expected in predicates:
+                if _check(op, value, expected):
+                    satisfied.add(predicate_id)
+        return satisfied
+
+    def matching_rules(self, satisfied: set) -> List[int]:
+        """Ids of matching rules in priority order, keeping only the first rule per group"""
+        counts = defaultdict(int)
+        for predicate_id in satisfied:
+            for rule_id in self._predicate_rules[predicate_id]:
+                counts[rule_id] += 1
+        matched = sorted(
+            [rule_id for rule_id, count in counts.items() if count >= self.rules[rule_id]["needed"]]
+            + self._always
+        )
+        groups = set()
+        selected = []
+        for rule_id in matched:
+            group = self.rules[rule_id]["group"]
+            if group not in groups:
+                groups.add(group)
+                selected.append(rule_id)
+        return selected
+
+    def render(self, template: Any, values: Dict[str, Any]) -> Any:
+        """
+        Fill a payload template
+
+        {"$path": "a.b", "default": ...} takes the value at the path; with a list
+        of paths it takes the first truthy one. Missing values use the default.
+        """
+        if isinstance(template, dict):
+            if "$path" in template:
+                paths = template["$path"] if isinstance(template["$path"], list) else [template["$path"]]
+                if len(paths) == 1:
+                    value = values[paths[0]]
+                    return template.get("default") if value is MISSING else value
+                for path in paths:
+                    if values[path] is not MISSING and values[path]:
+                        return values[path]
+                return template.get("default")
+            return {key: self.render(value, values) for key, value in template.items()}
+        if isinstance(template, list):
+            return [self.render(value, values) for value in template]
+        return template
+
+    def evaluate(self, agent_output: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Decide which actions an agent output triggers
+
+        Args:
+            agent_output: Output from any of the agents
+
+        Returns:
+            list: (action_type, payload) pairs, one per rule group, in priority order
+        """
+        if not isinstance(agent_output, dict):
+            return []
+        values = self.resolve(agent_output)
+        return [
+            (self.rules[rule_id]["target"], self.render(self.rules[rule_id]["payload"], values))
+            for rule_id in self.matching_rules(self.satisfied_predicates(values))
+        ]
+
+def load_rules_document(path: str) -> Dict[str, Any]:
+    """Read a rules document from JSON, or YAML when PyYAML is installed"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuleError("PyYAML is required for YAML routing rules")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+class RuleEngine:
+    """Holds the compiled routing rules and swaps in new ones when the rules file changes"""
+
+    def __init__(self, path: str = RULES_PATH):
+        self.path = path
+        self.check_interval = float(os.getenv("ROUTING_RULES_CHECK_SECONDS", "5"))
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        # Modification time of a version of the file that failed to compile
+        self._failed_mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self.compiled = self._compile()
+
+    def _compile(self) -> CompiledRules:
+        mtime = os.path.getmtime(self.path)
+        compiled = CompiledRules(load_rules_document(self.path), source=self.path)
+        self._mtime = mtime
+        logger.info(f"Loaded {len(compiled.rules)} routing rules from {self.path}")
+        return compiled
+
+    def reload(self) -> CompiledRules:
+        """
+        Recompile the rules file; the current rules stay active if it is invalid
+
+        Raises:
+            RuleError: If the new rules cannot be compiled
+        """
+        with self._lock:
+            try:
+                self.compiled = self._compile()
+            except (OSError, ValueError) as e:
+                logger.error(f"Keeping previous routing rules, reload failed: {str(e)}")
+                raise RuleError(str(e))
+            return self.compiled
+
+    def reload_if_changed(self) -> None:
+        """
+        Reload when the rules file was modified, checking at most every check_interval seconds
+
+        A version that fails to compile is not retried until the file changes again.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime in (self._mtime, self._failed_mtime):
+            return
+        try:
+            self.reload()
+        except RuleError:
+            self._failed_mtime = mtime
+
+    def evaluate(self, agent_output: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Evaluate the current rules, picking up edits to the rules file"""
+        self.reload_if_changed()
+        return self.compiled.evaluate(agent_output)
+
+    def describe(self) -> Dict[str, Any]:
+        """Source, version and names of the active rules"""
+        compiled = self.compiled
+        return {
+            "source": compiled.source,
+            "version": compiled.version,
+            "paths": len(compiled.paths),
+            "rules": [
+                {"name": rule["name"], "target": rule["target"], "group": rule["group"]}
+                for rule in compiled.rules
+            ]
+        }
@@ -0,0 +1,278 @@
+from sqlalchemy import text, bindparam, Integer, JSON, DateTime
+from sqlalchemy.exc import OperationalError
+from datetime import datetime
+from typing import Dict, Any, Optional
+import json
+import logging
+import os
+
+from .memory import memory_manager
+from .async_memory import async_memory_manager
+from .blobs import BLOB_FIELDS, blob_store
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true"
+SEARCH_MAX_DOCUMENT_CHARS = int(os.getenv("SEARCH_MAX_DOCUMENT_CHARS", "2000000"))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "100"))
+SEARCH_CHUNK_SIZE = int(os.getenv("SEARCH_CHUNK_SIZE", "500"))
+
+FTS_TABLE = "document_fts"
+
+# Messages of errors SQLite raises for a malformed MATCH expression
+FTS_QUERY_ERRORS = ("fts5", "syntax error", "unterminated string", "no such column", "unknown special query")
+
+# Filter name -> metadata column it is matched against
+SEARCH_FILTERS = {
+    "status": "status",
+    "input_type": "input_type",
+    "intent": "business_intent",
+    "urgency": "urgency",
+    "document_type": "document_type",
+    "batch_id": "batch_id"
+}
+
+class SearchUnavailable(Exception):
+    """Raised when full-text search is disabled or the database has no FTS5"""
+
+def document_text(agent_output: Any) -> str:
+    """
+    Searchable text of an agent output
+
+    PDF text, email bodies and JSON payloads are read from the output,
+    or from the blob store when they were offloaded.
+    """
+    if not isinstance(agent_output, dict):
+        return ""
+    parts = []
+    for field in BLOB_FIELDS:
+        if agent_output.get(field) is None:
+            continue
+        value = blob_store.load(agent_output[field])
+        parts.append(value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str))
+    return "\n".join(parts)[:SEARCH_MAX_DOCUMENT_CHARS]
+
+def document_title(file_name: Optional[str], agent_output: Any) -> str:
+    """File name, plus the subject for emails"""
+    parts = [file_name or ""]
+    metadata = agent_output.get("metadata") if isinstance(agent_output, dict) else None
+    if isinstance(metadata, dict) and isinstance(metadata.get("subject"), str):
+        parts.append(metadata["subject"])
+    return " ".join(part for part in parts if part)
+
+class DocumentIndex:
+    """
+    SQLite FTS5 index of processed documents
+
+    One row per completed record, keyed by the record's primary key, so
+    searches join straight onto processing_records and combine the match
+    with the metadata columns. Titles weigh more than bodies in the BM25
+    rank. Documents are added as jobs complete; catch_up indexes anything
+    that was missed, for example records processed before the index existed.
+    """
+
+    def __init__(self):
+        self.enabled = SEARCH_INDEX_ENABLED and memory_manager.engine.dialect.name == "sqlite"
+        if self.enabled:
+            try:
+                self._create_table()
+            except OperationalError as e:
+                # SQLite built without FTS5
+                logger.warning(f"Full-text search disabled: {str(e.orig)}")
+                self.enabled = False
+
+    def _create_table(self) -> None:
+        with memory_manager.engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": FTS_TABLE}
+            ).first()
+            if exists:
+                return
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                "USING fts5(title, body, tokenize = 'porter unicode61 remove_diacritics 2')"
+            ))
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(5.0, 1.0)')"))
+
+    async def index_document(self, process_id: str, title: str, body: str) -> bool:
+        """
+        Add or replace the document of a record
+
+        Args:
+            process_id: The record the document belongs to
+            title: File name and subject
+            body: Extracted text
+
+        Returns:
+            bool: Whether the record exists and was indexed
+        """
+        if not self.enabled:
+            return False
+        async with async_memory_manager.Session() as session:
+            await session.execute(
+                text(f"DELETE FROM {FTS_TABLE} WHERE rowid = (SELECT id FROM processing_records WHERE process_id = :pid)"),
+                {"pid": process_id}
+            )
+            result = await session.execute(
+                text(f"INSERT INTO {FTS_TABLE}(rowid, title, body) SELECT id, :title, :body FROM processing_records WHERE process_id = :pid"),
+                {"pid": process_id, "title": title, "body": body[:SEARCH_MAX_DOCUMENT_CHARS]}
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    def catch_up(self, chunk_size: int = SEARCH_CHUNK_SIZE) -> int:
+        """
+        Index completed records that have no document yet
+
+        Records are read in primary-key order, a chunk per transaction.
+
+        Returns:
+            int: Number of documents indexed
+        """
+        if not self.enabled:
+            raise SearchUnavailable("Full-text search is disabled")
+        count = 0
+        last_id = 0
+        while True:
+            session = memory_manager.Session()
+            try:
+                rows = session.execute(text(
+                    "SELECT r.id, r.input_metadata, r.agent_output FROM processing_records r "
+                    "WHERE r.id > :last AND r.status = 'completed' "
+                    f"AND NOT EXISTS (SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE}.rowid = r.id) "
+                    "ORDER BY r.id LIMIT :limit"
+                ).columns(id=Integer, input_metadata=JSON, agent_output=JSON),
+                    {"last": last_id, "limit": chunk_size}
+                ).all()
+                if not rows:
+                    return count
+                last_id = rows[-1].id
+                documents = []
+                for row in rows:
+                    metadata = row.input_metadata if isinstance(row.input_metadata, dict) else {}
+                    try:
+                        body = document_text(row.agent_output)
+                    except FileNotFoundError:
+                        logger.warning(f"Blob missing for record {row.id}, indexing without its text")
+                        body = ""
+                    documents.append({
+                        "id": row.id,
+                        "title": document_title(metadata.get("filename"), row.agent_output),
+                        "body": body
+                    })
+                session.execute(text(f"INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (:id, :title, :body)"), documents)
+                session.commit()
+            finally:
+                session.close()
+            count += len(rows)
+            logger.info(f"Indexed {count} documents")
+
+    def rebuild(self) -> int:
+        """Drop all documents and index every completed record again"""
+        if not self.enabled:
+            raise SearchUnavailable("Full-text search is disabled")
+        with memory_manager.engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        return self.catch_up()
+
+    def optimize(self) -> None:
+        """Merge the index b-trees; worth running after a large catch-up"""
+        if not self.enabled:
+            raise SearchUnavailable("Full-text search is disabled")
+        with memory_manager.engine.begin() as conn:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+
+    async def search(
+        self,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        **filters: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Rank documents matching a full-text query
+
+        Args:
+            query: FTS5 query: terms, "phrases", AND/OR/NOT, NEAR(), prefix*
+            limit: Number of results, capped at SEARCH_MAX_LIMIT
+            offset: Results to skip
+            since: Only records created at or after this time
+            until: Only records created before this time
+            **filters: Exact matches on the SEARCH_FILTERS metadata columns
+
+        Returns:
+            dict: Results with BM25 score and highlighted snippet, best first
+
+        Raises:
+            SearchUnavailable: If full-text search is disabled
+            ValueError: If the query or a filter is invalid
+        """
+        if not self.enabled:
+            raise SearchUnavailable("Full-text search is disabled")
+        if not query.strip():
+            raise ValueError("Search query is empty")
+        unknown = [name for name in filters if name not in SEARCH_FILTERS]
+        if unknown:
+            raise ValueError(f"Unknown search filters: {', '.join(unknown)}")
+        if limit < 1 or offset < 0:
+            raise ValueError("limit must be at least 1 and offset not negative")
+
+        conditions = [f"{FTS_TABLE} MATCH :query"]
+        params: Dict[str, Any] = {"query": query, "limit": min(limit, SEARCH_MAX_LIMIT), "offset": offset}
+        for name, value in filters.items():
+            if value is not None:
+                conditions.append(f"r.{SEARCH_FILTERS[name]} = :{name}")
+                params[name] = value
+        if since:
+            conditions.append("r.created_at >= :since")
+            params["since"] = since
+        if until:
+            conditions.append("r.created_at < :until")
+            params["until"] = until
+
+        statement = text(
+            "SELECT r.process_id, r.input_type, r.business_intent, r.document_type, r.status, r.created_at, "
+            f"{FTS_TABLE}.rank AS score, "
+            f"highlight({FTS_TABLE}, 0, '<mark>', '</mark>') AS title, "
+            f"snippet({FTS_TABLE}, 1, '<mark>', '</mark>', '...', 24) AS snippet "
+            f"FROM {FTS_TABLE} JOIN processing_records r ON r.id = {FTS_TABLE}.rowid "
+            f"WHERE {' AND '.join(conditions)} "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"
+        ).columns(created_at=DateTime).bindparams(
+            *[bindparam(name, type_=DateTime) for name in ("since", "until") if name in params]
+        )
+        try:
+            async with async_memory_manager.Session() as session:
+                rows = (await session.execute(statement, params)).mappings().all()
+        except OperationalError as e:
+            if any(marker in str(e.orig) for marker in FTS_QUERY_ERRORS):
+                raise ValueError(f"Invalid search query: {str(e.orig)}")
+            raise
+        return {
+            "query": query,
+            "results": [
+                {
+                    **row,
+                    "score": round(-row["score"], 4),
+                    "created_at": row["created_at"].isoformat()
+                }
+                for row in rows
+            ]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Document count of the index"""
+        if not self.enabled:
+            return {"enabled": False}
+        session = memory_manager.Session()
+        try:
+            documents = session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+        finally:
+            session.close()
+        return {"enabled": True, "documents": documents}
+
+# Initialize document index
+document_index = DocumentIndex()
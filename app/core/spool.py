@@ -0,0 +1,143 @@
+from fastapi import UploadFile
+from typing import Optional, BinaryIO
+import aiofiles
+import hashlib
+import os
+import uuid
+
+SPOOL_DIR = os.getenv("SPOOL_DIR", "./spool")
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", "10485760"))
+CHUNK_SIZE = 1024 * 1024
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_SIZE while it is being spooled"""
+
+class DocumentHandle:
+    """File-backed (or, for legacy jobs, in-memory) document shared by all pipeline stages"""
+
+    def __init__(self, path: Optional[str] = None, data: Optional[bytes] = None):
+        self.path = path
+        self._data = data
+        self._text: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path) if self.path else len(self._data or b"")
+
+    def head(self, n: int) -> bytes:
+        """Read the first n bytes"""
+        if self.path:
+            with open(self.path, "rb") as f:
+                return f.read(n)
+        return (self._data or b"")[:n]
+
+    def read_bytes(self) -> bytes:
+        """Read the whole document"""
+        if self.path:
+            with open(self.path, "rb") as f:
+                return f.read()
+        return self._data or b""
+
+    def text(self) -> str:
+        """Decode the document once as UTF-8, falling back to latin-1"""
+        if self._text is None:
+            data = self.read_bytes()
+            try:
+                self._text = data.decode("utf-8")
+            except UnicodeDecodeError:
+                self._text = data.decode("latin-1", errors="ignore")
+        return self._text
+
+    def pdf_source(self):
+        """Source for pypdf: the spool path (cheap to hand to worker processes) or the raw bytes"""
+        return self.path if self.path else self.read_bytes()
+
+    def discard(self) -> None:
+        """Delete the spooled file"""
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+class SpooledUpload:
+    """Result of spooling an upload to disk"""
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def handle(self) -> DocumentHandle:
+        return DocumentHandle(path=self.path)
+
+async def spool_upload(file: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> SpooledUpload:
+    """
+    Stream an upload to the spool directory in chunks
+
+    The size limit is enforced and the SHA-256 fingerprint computed while
+    streaming, so the full upload is never held in memory.
+
+    Args:
+        file: The uploaded file
+        max_size: Maximum number of bytes accepted
+
+    Returns:
+        SpooledUpload: Path, size and fingerprint of the spooled file
+
+    Raises:
+        UploadTooLarge: If the upload exceeds max_size
+    """
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    path = os.path.join(SPOOL_DIR, f"{uuid.uuid4()}.upload")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(f"Upload exceeds the {max_size} byte limit")
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        DocumentHandle(path=path).discard()
+        raise
+    return SpooledUpload(path, size, digest.hexdigest())
+
+def spool_stream(stream: BinaryIO, max_size: int = MAX_UPLOAD_SIZE) -> SpooledUpload:
+    """
+    Blocking counterpart of spool_upload for file-like objects such as ZIP members
+
+    Args:
+        stream: Readable binary stream
+        max_size: Maximum number of bytes accepted
+
+    Returns:
+        SpooledUpload: Path, size and fingerprint of the spooled file
+
+    Raises:
+        UploadTooLarge: If the stream exceeds max_size
+    """
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    path = os.path.join(SPOOL_DIR, f"{uuid.uuid4()}.upload")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(f"Upload exceeds the {max_size} byte limit")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        DocumentHandle(path=path).discard()
+        raise
+    return SpooledUpload(path, size, digest.hexdigest())
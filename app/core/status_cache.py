@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import hashlib
+import os
+import threading
+import time
+
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "10000"))
+# How long an entry is served before its row version is checked again
+STATUS_CACHE_REVALIDATE_MS = int(os.getenv("STATUS_CACHE_REVALIDATE_MS", "1000"))
+
+class StatusEntry:
+    """Serialized status payload of one record version"""
+
+    __slots__ = ("version", "body", "etag", "checked_at")
+
+    def __init__(self, version: Optional[int], body: bytes):
+        self.version = version
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        # When the entry was last known to match the row
+        self.checked_at = time.monotonic()
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header names this entry"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+class StatusCache:
+    """
+    LRU cache of serialized /status payloads keyed by process_id
+
+    Each entry remembers the row version it was built from. Writes made
+    through this process drop the entry of the record they touch, so an
+    entry is served as is until it is older than the revalidation window.
+    After that the reader compares its version with the row once, which
+    catches writes and deletions made by other worker processes.
+    """
+
+    def __init__(self, max_entries: int = STATUS_CACHE_SIZE, revalidate_ms: int = STATUS_CACHE_REVALIDATE_MS):
+        self.max_entries = max_entries
+        self.revalidate_after = revalidate_ms / 1000
+        self._entries: "OrderedDict[str, StatusEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, process_id: str) -> Optional[StatusEntry]:
+        with self._lock:
+            entry = self._entries.get(process_id)
+            if entry is not None:
+                self._entries.move_to_end(process_id)
+            return entry
+
+    def put(self, process_id: str, entry: StatusEntry) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[process_id] = entry
+            self._entries.move_to_end(process_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_fresh(self, entry: StatusEntry) -> bool:
+        """Whether an entry can be served without checking the row version"""
+        return time.monotonic() - entry.checked_at < self.revalidate_after
+
+    def revalidated(self, entry: StatusEntry) -> None:
+        """Mark an entry as checked against the row just now"""
+        entry.checked_at = time.monotonic()
+
+    def invalidate(self, process_id: str) -> None:
+        """Drop the cached payload of a record; safe to call from any thread"""
+        with self._lock:
+            self._entries.pop(process_id, None)
+
+    def record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count and hit/miss counters"""
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "revalidate_ms": int(self.revalidate_after * 1000),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+# Initialize status cache
+status_cache = StatusCache()
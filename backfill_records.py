@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Fill the promoted, indexed columns of records stored before they existed
+"""
+import argparse
+
+from app.core.memory import memory_manager
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill intent, urgency, confidence, document type and action types from the JSON columns")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"Backfilled {memory_manager.backfill_promoted_columns(args.chunk_size)} records")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent job-state writes against the SQLite database from several worker processes
+
+Each worker process imports the real async memory manager (so it uses the
+same engine profile and write path as the app) and runs the write pattern
+of one document per task: create the record, stage two intermediate states,
+and complete it with its outbox messages, with the periodic state flusher
+running as it does in the app. Run it once with the default profile and
+once with SQLITE_TUNING=false to compare.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+
+def run_worker(db_url: str, documents: int, concurrency: int, ready, start, results) -> None:
+    os.environ["DATABASE_URL"] = db_url
+    from app.core.async_memory import async_memory_manager
+    ready.put(os.getpid())
+    start.wait()
+
+    async def process_document(slots: asyncio.Semaphore):
+        process_id = str(uuid.uuid4())
+        async with slots:
+            try:
+                await async_memory_manager.create_record(process_id, "json", {"filename": "benchmark.json"})
+                async_memory_manager.stage_update(process_id, {"status": "classified", "classification": {"input_type": "json"}})
+                async_memory_manager.stage_update(process_id, {"status": "processed", "agent_output": {"data": {"amount": 1}}})
+                await async_memory_manager.complete_with_outbox(process_id, {"status": "completed"}, [("crm", {"action": "update"})])
+                return None
+            except Exception as e:
+                return type(e).__name__ + ": " + str(e).splitlines()[0]
+
+    async def run():
+        slots = asyncio.Semaphore(concurrency)
+        async_memory_manager.start_state_flusher()
+        try:
+            outcomes = await asyncio.gather(*(process_document(slots) for _ in range(documents)))
+        finally:
+            await async_memory_manager.stop_state_flusher()
+            await async_memory_manager.engine.dispose()
+        return [error for error in outcomes if error]
+
+    started = time.monotonic()
+    errors = asyncio.run(run())
+    results.put({"documents": documents, "errors": errors, "seconds": time.monotonic() - started})
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent SQLite writes across worker processes")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes, like uvicorn --workers")
+    parser.add_argument("--concurrency", type=int, default=8, help="Documents in flight per worker")
+    parser.add_argument("--documents", type=int, default=500, help="Documents per worker")
+    parser.add_argument("--database", help="SQLite file to use (default: a temporary file)")
+    args = parser.parse_args()
+
+    path = args.database or os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    db_url = f"sqlite:///{path}"
+    # Create the schema once so workers do not all race on it
+    os.environ["DATABASE_URL"] = db_url
+    from app.core.memory import memory_manager
+    memory_manager.engine.dispose()
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    start = context.Event()
+    results = context.Queue()
+    workers = [
+        context.Process(target=run_worker, args=(db_url, args.documents, args.concurrency, ready, start, results))
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    # Time only the writes, not interpreter start-up and imports
+    for _ in workers:
+        ready.get()
+    started = time.monotonic()
+    start.set()
+    reports = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    errors = [error for report in reports for error in report["errors"]]
+    completed = sum(report["documents"] for report in reports) - len(errors)
+    print(json.dumps({
+        "database": path,
+        "sqlite_tuning": os.getenv("SQLITE_TUNING", "true"),
+        "workers": args.workers,
+        "concurrency_per_worker": args.concurrency,
+        "documents_completed": completed,
+        "errors": len(errors),
+        "first_errors": sorted(set(errors))[:5],
+        "elapsed_seconds": round(elapsed, 2),
+        "documents_per_second": round(completed / elapsed, 1)
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
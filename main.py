@@ -1,18 +1,29 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import uvicorn
+import asyncio
 import os
 import uuid
+import json
+import hashlib
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
 
 # Import our modules
-from app.agents import classifier_agent, email_agent, json_agent, pdf_agent
-from app.core import memory_manager, action_router
+from app.agents import classifier_agent, email_agent, json_agent, pdf_agent, llm_cache
+from app.agents.executor import shutdown_process_pool
+from app.core import async_memory_manager, action_router, job_queue, JobWorkerPool, status_broadcaster, outbox_dispatcher, blob_store, status_cache
+from app.core.blobs import BLOB_FIELDS
+from app.core.spool import DocumentHandle, UploadTooLarge, MAX_UPLOAD_SIZE, spool_upload
+from app.core.rules import RuleError
+from app.core.replay import replay_engine
+from app.core.search import SearchUnavailable, document_index, document_text, document_title
+from app.core.retention import retention_manager
+from app.core.batch import BatchTooLarge, MAX_BATCH_UPLOAD_SIZE, BATCH_MAX_ITEMS, expand_upload, is_archive, is_ndjson
 from app.schemas import EmailDocument, WebhookData, PDFDocument
 
 # Configure logging
@@ -44,34 +55,61 @@ app.add_middleware(
 # Mount static files for UI
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+async def index_record(process_id: str, file_name: Optional[str], agent_output: Dict[str, Any]) -> None:
+    """Add a completed record to the full-text index; catch_up indexes it later if this fails"""
+    try:
+        await document_index.index_document(
+            process_id,
+            document_title(file_name, agent_output),
+            await asyncio.to_thread(document_text, agent_output)
+        )
+    except Exception as e:
+        logger.warning(f"Could not index {process_id} for search: {str(e)}")
+
+def cache_hit_updates(cached: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Record fields for an upload served from the result cache
+    
+    The cached actions belong to the record that was processed; they are
+    listed as skipped so the duplicate neither delivers them again nor
+    shows the original's idempotency keys and delivery status.
+    """
+    skipped = [
+        {"action_type": action["action_type"], "status": "skipped", "reason": "cache hit"}
+        for action in cached.get("actions_triggered") or []
+        if isinstance(action, dict) and action.get("action_type")
+    ]
+    return {**cached, "actions_triggered": skipped, "status": "completed"}
+
 async def process_file_async(
-    file_content: bytes,
+    document: DocumentHandle,
     file_name: str,
     process_id: str,
-    process_type: Optional[str] = None
+    process_type: Optional[str] = None,
+    fingerprint: Optional[str] = None
 ):
     """Background task for processing files"""
     try:
         # Step 1: Classify the input
         logger.info(f"Starting classification for {process_id}")
         
-        # Handle different file types for classification
-        if file_name.endswith('.pdf'):
-            # For PDF files, pass the raw bytes
-            classification = classifier_agent.classify(file_content.decode('utf-8', errors='ignore'))
+        # Unambiguous inputs are classified locally. PDFs are recognised from
+        # their magic bytes and never decoded, and their intent is classified
+        # once the agent has extracted the text; anything else is decoded once
+        # and the text is shared by the classifier and the agents.
+        head = await asyncio.to_thread(document.head, 1024)
+        if head.startswith(b'%PDF'):
+            content_str = None
+            classification = await classifier_agent.classify_async(head)
         else:
-            # For text files (JSON, EML), decode properly
-            try:
-                content_str = file_content.decode('utf-8')
-            except UnicodeDecodeError:
-                content_str = file_content.decode('latin-1', errors='ignore')
-            classification = classifier_agent.classify(content_str)
+            content_str = await asyncio.to_thread(document.text)
+            classification = await classifier_agent.classify_async(content_str)
         
         if classification["status"] == "error":
             raise Exception(f"Classification failed: {classification['error']}")
             
-        # Store classification in memory
-        memory_manager.update_record(process_id, {
+        # Store classification in memory; intermediate states are written behind
+        async_memory_manager.stage_update(process_id, {
             "classification": classification["classification"],
             "status": "classified"
         })
@@ -80,45 +118,106 @@ async def process_file_async(
         input_type = classification["classification"]["input_type"]
         agent_output = None
         
+        if input_type in ("email", "json") and content_str is None:
+            content_str = await asyncio.to_thread(document.text)
+        
         if input_type == "email":
-            content_str = file_content.decode('utf-8', errors='ignore')
-            agent_output = email_agent.process_email(content_str)
+            agent_output = await email_agent.process_email_async(content_str)
         elif input_type == "json":
-            content_str = file_content.decode('utf-8', errors='ignore')
-            agent_output = json_agent.process_json(content_str)
+            agent_output = await json_agent.process_json_async(content_str)
         elif input_type == "pdf":
-            agent_output = await pdf_agent.process_pdf(file_content)
+            agent_output = await pdf_agent.process_pdf(document.pdf_source())
         else:
             raise ValueError(f"Unsupported input type: {input_type}")
             
         if agent_output["status"] == "error":
             raise Exception(f"Agent processing failed: {agent_output['error']}")
+        
+        processed = {"status": "processed"}
+        if classification["classification"].get("method") == "magic_bytes" and (agent_output.get("raw_text") or "").strip():
+            # The magic bytes only gave the format; classify the intent from the extracted text
+            extracted = await classifier_agent.classify_extracted_async(agent_output["raw_text"], input_type)
+            if extracted["status"] == "success":
+                classification = extracted
+                processed["classification"] = classification["classification"]
             
-        # Store agent output in memory
-        memory_manager.update_record(process_id, {
-            "agent_output": agent_output,
-            "status": "processed"
+        # Store agent output in memory; the document text and parsed data go
+        # to the blob store so the record only holds references to them
+        stored_output = await asyncio.to_thread(blob_store.offload, agent_output)
+        async_memory_manager.stage_update(process_id, {
+            "agent_output": stored_output,
+            **processed
         })
         
-        # Step 3: Route actions
+        # Step 3: Plan actions and commit them to the outbox together with completion;
+        # the outbox dispatcher delivers them without holding up the pipeline
         logger.info(f"Routing actions for {process_id}")
-        actions = await action_router.process_agent_output(agent_output)
+        planned = action_router.plan_actions(agent_output)
+        actions = await async_memory_manager.complete_with_outbox(
+            process_id,
+            {"status": "completed"},
+            planned
+        )
+        if actions:
+            outbox_dispatcher.notify_queued()
         
-        # Store actions in memory
-        memory_manager.update_record(process_id, {
-            "actions_triggered": actions,
-            "status": "completed"
-        })
+        # Add the document to the full-text index
+        await index_record(process_id, file_name, agent_output)
+        
+        # Cache the result so duplicate uploads skip the pipeline
+        if fingerprint:
+            await async_memory_manager.store_cached_result(
+                fingerprint,
+                classification["classification"],
+                stored_output,
+                actions
+            )
         
         logger.info(f"Processing completed for {process_id}")
         
     except Exception as e:
         logger.error(f"Error processing {process_id}: {str(e)}")
-        memory_manager.update_record(process_id, {
+        await async_memory_manager.update_record(process_id, {
             "status": "error",
             "error": str(e)
         })
 
+async def process_job(job):
+    """Job queue handler that runs the processing pipeline for one upload"""
+    if job.payload_path:
+        document = DocumentHandle(path=job.payload_path)
+    else:
+        document = DocumentHandle(data=job.payload)
+    await process_file_async(
+        document,
+        job.file_name,
+        job.process_id,
+        job.process_type,
+        job.fingerprint
+    )
+
+# Worker pool draining the persistent job queue
+worker_pool = JobWorkerPool(job_queue, process_job)
+
+@app.on_event("startup")
+async def start_workers():
+    """Start the job workers, outbox dispatcher and retention; work left behind by a crash is reclaimed once its lease expires"""
+    async_memory_manager.start_state_flusher()
+    worker_pool.start()
+    outbox_dispatcher.start()
+    retention_manager.start()
+
+@app.on_event("shutdown")
+async def stop_workers():
+    """Stop the job workers and release their in-flight jobs"""
+    await worker_pool.stop()
+    await outbox_dispatcher.stop()
+    await retention_manager.stop()
+    await async_memory_manager.stop_state_flusher()
+    await async_memory_manager.engine.dispose()
+    await action_router.close()
+    shutdown_process_pool()
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     """Serve the upload UI"""
@@ -149,9 +248,10 @@ async def root():
 
 @app.post("/process")
 async def process_file(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    process_type: Optional[str] = None
+    process_type: Optional[str] = None,
+    priority: int = 0,
+    no_cache: bool = False
 ):
     """
     Process uploaded files using the appropriate agent
@@ -159,6 +259,8 @@ async def process_file(
     Args:
         file: The file to process (Email, JSON, or PDF)
         process_type: Optional override for the processing type
+        priority: Queue priority, higher values are processed first
+        no_cache: Skip the result cache and reprocess the file
     
     Returns:
         dict: Processing results and status
@@ -167,28 +269,54 @@ async def process_file(
         # Generate process ID
         process_id = str(uuid.uuid4())
         
-        # Read file content
-        content = await file.read()
+        # Stream the upload to the spool directory, enforcing the size limit
+        # and fingerprinting it on the way
+        try:
+            upload = await spool_upload(file)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
         
-        # Create initial record
-        memory_manager.create_record(
-            process_id=process_id,
-            input_type=process_type or "unknown",
-            metadata={
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "size": len(content)
+        fingerprint = upload.sha256
+        metadata = {
+            "filename": file.filename,
+            "content_type": file.content_type,
+            "size": upload.size,
+            "sha256": fingerprint
+        }
+        
+        # Identical uploads reuse the cached result instead of the pipeline
+        cached = None if no_cache else await async_memory_manager.get_cached_result(fingerprint)
+        if cached:
+            upload.handle().discard()
+            await async_memory_manager.create_record(
+                process_id=process_id,
+                input_type=process_type or "unknown",
+                metadata={**metadata, "cache_hit": True},
+                updates=cache_hit_updates(cached)
+            )
+            await index_record(process_id, file.filename, cached["agent_output"])
+            return {
+                "status": "completed",
+                "process_id": process_id,
+                "message": "Result served from cache"
             }
-        )
         
-        # Start background processing
-        background_tasks.add_task(
-            process_file_async,
-            content,
-            file.filename,
-            process_id,
-            process_type
+        # Create the initial record and queue the file for the worker pool
+        # in one transaction
+        await async_memory_manager.create_record(
+            process_id=process_id,
+            input_type=process_type or "unknown",
+            metadata=metadata,
+            with_rows=[job_queue.new_job(
+                process_id=process_id,
+                file_name=file.filename,
+                payload_path=upload.path,
+                process_type=process_type,
+                priority=priority,
+                fingerprint=fingerprint
+            )]
         )
+        job_queue.notify_enqueued()
         
         return {
             "status": "processing",
@@ -196,36 +324,225 @@ async def process_file(
             "message": "File processing started"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error starting processing: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/process/batch")
+async def process_batch(
+    files: List[UploadFile] = File(...),
+    priority: int = -1,
+    no_cache: bool = False
+):
+    """
+    Process many documents submitted as multiple files, ZIP archives or NDJSON streams
+    
+    Args:
+        files: Documents, ZIP archives of documents, or NDJSON files with one JSON document per line
+        priority: Queue priority; defaults below single uploads so batches do not starve them
+        no_cache: Skip the result cache and reprocess every document
+    
+    Returns:
+        dict: Batch ID and the process ID of every document
+    """
+    items = []
+    try:
+        batch_id = str(uuid.uuid4())
+        
+        # Spool and expand every upload before creating any records
+        for file in files:
+            filename = file.filename or ""
+            # Sniff the magic bytes, so archives without a .zip name get the batch limit too
+            head = await file.read(4)
+            await file.seek(0)
+            bundle = is_archive(filename, head) or is_ndjson(filename, file.content_type)
+            upload = await spool_upload(file, max_size=MAX_BATCH_UPLOAD_SIZE if bundle else MAX_UPLOAD_SIZE)
+            # expand_upload removes the spooled file itself if the archive or stream is bad
+            expanded = await asyncio.to_thread(expand_upload, filename, file.content_type, upload)
+            if len(expanded) == 1 and expanded[0][1] is upload:
+                items.append((filename, file.content_type, upload))
+            else:
+                items.extend((name, None, item) for name, item in expanded)
+            if len(items) > BATCH_MAX_ITEMS:
+                raise BatchTooLarge(f"Batch exceeds {BATCH_MAX_ITEMS} documents")
+        
+        cached = {} if no_cache else await async_memory_manager.get_cached_results([item.sha256 for _, _, item in items])
+        
+        records, jobs = [], []
+        for index, (name, content_type, item) in enumerate(items):
+            process_id = str(uuid.uuid4())
+            metadata = {
+                "filename": name,
+                "content_type": content_type,
+                "size": item.size,
+                "sha256": item.sha256,
+                "batch_index": index
+            }
+            if item.sha256 in cached:
+                item.handle().discard()
+                records.append({
+                    "process_id": process_id,
+                    "input_type": "unknown",
+                    "metadata": {**metadata, "cache_hit": True},
+                    "updates": cache_hit_updates(cached[item.sha256])
+                })
+                continue
+            records.append({
+                "process_id": process_id,
+                "input_type": "unknown",
+                "metadata": metadata
+            })
+            jobs.append(job_queue.new_job(
+                process_id=process_id,
+                file_name=name,
+                payload_path=item.path,
+                priority=priority,
+                fingerprint=item.sha256
+            ))
+        
+        # All records and their jobs in one transaction; the worker pool
+        # bounds how many run at once
+        await async_memory_manager.create_records(records, batch_id=batch_id, with_rows=jobs)
+        if jobs:
+            job_queue.notify_enqueued()
+        for record in records:
+            if "updates" in record:
+                await index_record(record["process_id"], record["metadata"]["filename"], record["updates"]["agent_output"])
+        
+        return {
+            "status": "processing",
+            "batch_id": batch_id,
+            "total": len(records),
+            "cached": len(records) - len(jobs),
+            "process_ids": [record["process_id"] for record in records]
+        }
+        
+    except (UploadTooLarge, BatchTooLarge) as e:
+        for _, _, item in items:
+            item.handle().discard()
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        for _, _, item in items:
+            item.handle().discard()
+        logger.error(f"Error starting batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/process/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    """
+    Get aggregate progress of a batch
+    
+    Args:
+        batch_id: The ID returned by POST /process/batch
+    
+    Returns:
+        dict: Record counts per status and whether the batch has finished
+    """
+    counts = await async_memory_manager.get_batch_progress(batch_id)
+    if not counts:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    total = sum(counts.values())
+    finished = counts.get("completed", 0) + counts.get("error", 0)
+    return {
+        "batch_id": batch_id,
+        "total": total,
+        "finished": finished,
+        "progress": round(finished / total, 3),
+        "done": finished == total,
+        "counts": counts
+    }
+
+# Seconds a status stream waits for an in-process event before re-reading the
+# record, which catches updates made by other worker processes
+STATUS_STREAM_FALLBACK_SECONDS = float(os.getenv("STATUS_STREAM_FALLBACK_SECONDS", "15"))
+
+def serialize_status(record) -> Dict[str, Any]:
+    """Build the status payload for a processing record"""
+    return {
+        "process_id": record.process_id,
+        "status": record.status,
+        "classification": record.classification,
+        "agent_output": record.agent_output,
+        "actions_triggered": record.actions_triggered,
+        "error": record.error,
+        "created_at": record.created_at.isoformat(),
+        "updated_at": record.updated_at.isoformat()
+    }
+
+@app.get("/status/{process_id}/stream")
+async def stream_status(process_id: str, request: Request):
+    """
+    Stream status changes of a processing job as Server-Sent Events
+    
+    The record is read once on connect and once per state change instead of
+    on every client poll. The stream ends after the completed or error state.
+    
+    Args:
+        process_id: The ID of the processing job
+    
+    Returns:
+        StreamingResponse: text/event-stream of status payloads
+    """
+    # Subscribe before the first read so no transition is missed
+    events = status_broadcaster.subscribe(process_id)
+    record = await async_memory_manager.get_record(process_id)
+    if not record:
+        status_broadcaster.unsubscribe(process_id, events)
+        raise HTTPException(status_code=404, detail="Process not found")
+    
+    async def event_stream():
+        nonlocal record
+        last_sent = None
+        try:
+            while True:
+                if record.updated_at != last_sent:
+                    last_sent = record.updated_at
+                    yield f"data: {json.dumps(serialize_status(record))}\n\n"
+                if record.status in ("completed", "error"):
+                    return
+                try:
+                    await asyncio.wait_for(events.get(), STATUS_STREAM_FALLBACK_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                record = await async_memory_manager.get_record(process_id)
+                if not record:
+                    return
+        finally:
+            status_broadcaster.unsubscribe(process_id, events)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/status/{process_id}")
-async def get_status(process_id: str):
+async def get_status(process_id: str, request: Request):
     """
     Get the status of a processing job
     
+    Payloads are served from the status cache and carry an ETag; a request
+    whose If-None-Match names the current version gets 304 Not Modified.
+    
     Args:
         process_id: The ID of the processing job
     
     Returns:
-        dict: Current status and results if available
+        Response: Current status and results if available
     """
     try:
-        record = memory_manager.get_record(process_id)
-        if not record:
+        entry = await async_memory_manager.get_status(process_id, serialize_status)
+        if not entry:
             raise HTTPException(status_code=404, detail="Process not found")
-            
-        return {
-            "process_id": process_id,
-            "status": record.status,
-            "classification": record.classification,
-            "agent_output": record.agent_output,
-            "actions_triggered": record.actions_triggered,
-            "error": record.error,
-            "created_at": record.created_at.isoformat(),
-            "updated_at": record.updated_at.isoformat()
-        }
+        
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if entry.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
         
     except HTTPException:
         raise
@@ -233,31 +550,328 @@ async def get_status(process_id: str):
         logger.error(f"Error getting status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/status/{process_id}/output/{field}")
+async def get_output_field(process_id: str, field: str):
+    """
+    Get a large agent output field that is kept in the blob store
+    
+    Args:
+        process_id: The ID of the processing job
+        field: One of raw_text, raw_content or parsed_data
+    
+    Returns:
+        dict: The field value, read and decompressed on request
+    """
+    if field not in BLOB_FIELDS:
+        raise HTTPException(status_code=404, detail=f"Unknown output field: {field}")
+    record = await async_memory_manager.get_record(process_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Process not found")
+    if not isinstance(record.agent_output, dict) or field not in record.agent_output:
+        raise HTTPException(status_code=404, detail=f"No {field} for this process")
+    try:
+        value = await asyncio.to_thread(blob_store.load, record.agent_output[field])
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail=f"Blob for {field} is no longer available")
+    return {
+        "process_id": process_id,
+        "field": field,
+        "value": value
+    }
+
+@app.get("/queue")
+async def get_queue():
+    """
+    Get job queue statistics
+    
+    Returns:
+        dict: Job counts per status and worker pool size
+    """
+    return {
+        "jobs": await asyncio.to_thread(job_queue.stats),
+        "workers": worker_pool.workers
+    }
+
+@app.get("/outbox")
+async def get_outbox():
+    """
+    Get action outbox statistics
+    
+    Returns:
+        dict: Outbox message counts per status and batching counters
+    """
+    return {
+        "messages": await asyncio.to_thread(outbox_dispatcher.stats),
+        "batching": action_router.batch_stats()
+    }
+
+@app.get("/retention")
+async def get_retention():
+    """
+    Get retention settings and the size of the records table
+    
+    Returns:
+        dict: Mode, age and row limits, record count, free pages and the last run
+    """
+    return await asyncio.to_thread(retention_manager.stats)
+
+@app.get("/actions/breakers")
+async def get_breakers():
+    """
+    Get circuit breaker state per action endpoint
+    
+    Returns:
+        dict: State, window failure rate, current timeout and counters per action type
+    """
+    return {"breakers": action_router.breaker_stats()}
+
+@app.get("/routing/rules")
+async def get_routing_rules():
+    """
+    Get the active routing rules
+    
+    Returns:
+        dict: Rules source, version and rule names
+    """
+    return action_router.rules.describe()
+
+@app.post("/routing/rules/reload")
+async def reload_routing_rules():
+    """
+    Recompile the routing rules file; the previous rules stay active if it is invalid
+    
+    Returns:
+        dict: The newly active rules
+    """
+    try:
+        await asyncio.to_thread(action_router.rules.reload)
+    except RuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return action_router.rules.describe()
+
+@app.post("/routing/replay")
+async def replay_routing(request: Request):
+    """
+    Backtest routing rules against stored agent outputs
+    
+    The JSON body may hold "rules" (a candidate rules document; defaults to
+    the active rules), "mode" ("dry_run" or "deliver"), "since", "until",
+    "input_type" and "limit". Large backtests are better run with
+    replay_rules.py.
+    
+    Returns:
+        dict: Replay report with the actions that would change
+    """
+    body = await request.json() if await request.body() else {}
+    try:
+        report = await asyncio.to_thread(
+            replay_engine.run,
+            body.get("rules"),
+            mode=body.get("mode", "dry_run"),
+            since=datetime.fromisoformat(body["since"]) if body.get("since") else None,
+            until=datetime.fromisoformat(body["until"]) if body.get("until") else None,
+            input_type=body.get("input_type"),
+            limit=body.get("limit")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report["queued"]:
+        outbox_dispatcher.notify_queued()
+    return report
+
+@app.get("/status/{process_id}/actions")
+async def get_action_deliveries(process_id: str):
+    """
+    Get the delivery state of a record's actions
+    
+    Args:
+        process_id: The process ID to check
+        
+    Returns:
+        dict: Outbox entries with attempts, errors and endpoint responses
+    """
+    record = await async_memory_manager.get_record(process_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Process not found")
+    return {
+        "process_id": process_id,
+        "actions": await asyncio.to_thread(outbox_dispatcher.get_actions, process_id)
+    }
+
+@app.get("/cache/llm")
+async def get_llm_cache_stats():
+    """
+    Get LLM response cache statistics
+    
+    Returns:
+        dict: Entry count and hit/miss counters
+    """
+    return await asyncio.to_thread(llm_cache.stats)
+
+@app.get("/cache/status")
+async def get_status_cache_stats():
+    """
+    Get status payload cache statistics
+    
+    Returns:
+        dict: Entry count and hit/miss counters
+    """
+    return status_cache.stats()
+
 @app.get("/history")
-async def get_history():
+async def get_history(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    input_type: Optional[str] = None,
+    intent: Optional[str] = None,
+    fields: Optional[str] = None
+):
     """
-    Get processing history
+    Get processing history, newest first
+    
+    Args:
+        limit: Page size (at most HISTORY_MAX_LIMIT)
+        cursor: next_cursor returned with the previous page
+        status: Only records in this status
+        input_type: Only records of this input type
+        intent: Only records with this business intent
+        fields: Comma-separated columns to return (process_id, input_type,
+            business_intent, status, batch_id, error, created_at, updated_at)
     
     Returns:
-        list: List of processed items
+        dict: The page of records and the cursor of the next page
     """
     try:
-        records = memory_manager.get_history()
-        return {
-            "history": [
-                {
-                    "process_id": record.process_id,
-                    "input_type": record.input_type,
-                    "status": record.status,
-                    "created_at": record.created_at.isoformat(),
-                    "updated_at": record.updated_at.isoformat()
-                }
-                for record in records
-            ]
-        }
+        return await async_memory_manager.get_history(
+            limit,
+            cursor,
+            status=status,
+            input_type=input_type,
+            intent=intent,
+            fields=[field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting history: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/search")
+async def search_documents(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    input_type: Optional[str] = None,
+    intent: Optional[str] = None,
+    urgency: Optional[str] = None,
+    document_type: Optional[str] = None,
+    batch_id: Optional[str] = None
+):
+    """
+    Full-text search over processed documents, best BM25 matches first
+    
+    For example "every contract mentioning HIPAA last month" is
+    ?q=HIPAA&document_type=contract&since=<first of last month>&until=<first of this month>.
+    
+    Args:
+        q: FTS5 query: terms, "phrases", AND/OR/NOT, NEAR(), prefix*
+        limit: Number of results (at most SEARCH_MAX_LIMIT)
+        offset: Results to skip
+        since: Created at or after this time
+        until: Created before this time
+        status, input_type, intent, urgency, document_type, batch_id: Metadata filters
+    
+    Returns:
+        dict: Matching records with score, highlighted title and text snippet
+    """
+    try:
+        return await document_index.search(
+            q,
+            limit=limit,
+            offset=offset,
+            since=since,
+            until=until,
+            status=status,
+            input_type=input_type,
+            intent=intent,
+            urgency=urgency,
+            document_type=document_type,
+            batch_id=batch_id
+        )
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error searching documents: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/records/search")
+async def search_records(
+    intent: Optional[str] = None,
+    urgency: Optional[str] = None,
+    document_type: Optional[str] = None,
+    action_type: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    status: Optional[str] = None,
+    input_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """
+    Search processing records by their promoted, indexed columns
+    
+    For example "all high-urgency Invoices today" is
+    ?intent=Invoice&urgency=high&since=<midnight>.
+    
+    Args:
+        intent: Business intent from the classification
+        urgency: Urgency from the agent analysis or the classification
+        document_type: Document type from the agent analysis or the classification
+        action_type: Routed action type (crm, notification, risk_alert, compliance)
+        min_confidence: Minimum classification confidence
+        status: Processing status
+        input_type: Classified input type
+        since: Created at or after this time
+        until: Created before this time
+        limit: Page size (at most HISTORY_MAX_LIMIT)
+        cursor: next_cursor returned with the previous page
+        fields: Comma-separated columns to return
+    
+    Returns:
+        dict: The page of matching records under "records" and the cursor of the next page
+    """
+    try:
+        page = await async_memory_manager.get_history(
+            limit,
+            cursor,
+            status=status,
+            input_type=input_type,
+            intent=intent,
+            urgency=urgency,
+            document_type=document_type,
+            action_type=action_type,
+            min_confidence=min_confidence,
+            since=since,
+            until=until,
+            fields=[field.strip() for field in fields.split(",") if field.strip()] if fields else [
+                "process_id", "input_type", "business_intent", "urgency", "confidence",
+                "document_type", "status", "created_at"
+            ]
+        )
+        return {"records": page["history"], "next_cursor": page["next_cursor"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error searching records: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
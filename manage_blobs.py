@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Move large agent output fields into the blob store, sweep unreferenced blobs, or inspect it
+"""
+import argparse
+import json
+
+from app.core.blobs import blob_store
+
+def main():
+    parser = argparse.ArgumentParser(description="Offload stored agent outputs to the blob store, sweep it or show its size")
+    parser.add_argument("command", choices=["offload", "sweep", "stats"])
+    parser.add_argument("--grace-seconds", type=int, help="With sweep: keep unreferenced blobs younger than this")
+    args = parser.parse_args()
+
+    if args.command == "offload":
+        print(json.dumps(blob_store.offload_stored_outputs(), indent=2))
+    elif args.command == "sweep":
+        print(json.dumps(blob_store.sweep(args.grace_seconds), indent=2))
+    else:
+        print(json.dumps(blob_store.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Export, import or inspect the LLM response cache
+"""
+import argparse
+import json
+
+from app.agents.llm import llm_cache
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import the LLM response cache")
+    parser.add_argument("command", choices=["export", "import", "stats"])
+    parser.add_argument("path", nargs="?", default="llm_cache.ndjson")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(f"Exported {llm_cache.export_entries(args.path)} entries to {args.path}")
+    elif args.command == "import":
+        print(f"Imported {llm_cache.import_entries(args.path)} entries from {args.path}")
+    else:
+        print(json.dumps(llm_cache.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
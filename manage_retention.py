@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Archive or purge old processing records and reclaim their space
+"""
+import argparse
+import json
+
+from app.core.retention import retention_manager
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the retention policy now, vacuum the database or show retention stats")
+    parser.add_argument("command", choices=["run", "vacuum", "stats"])
+    parser.add_argument("--enable-incremental", action="store_true",
+                        help="With vacuum: switch an existing SQLite database to incremental vacuum (rewrites the file)")
+    parser.add_argument("--force", action="store_true",
+                        help="With run: run even while a worker process holds the retention lease")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = retention_manager.run_once(lease=not args.force)
+        if report is None:
+            print("A worker process holds the retention lease; retry later or use --force")
+        else:
+            print(json.dumps(report, indent=2))
+    elif args.command == "vacuum":
+        if args.enable_incremental:
+            retention_manager.enable_incremental_vacuum()
+            print("Incremental vacuum enabled")
+        print(f"Released {retention_manager.vacuum()} pages")
+    else:
+        print(json.dumps(retention_manager.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
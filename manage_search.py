@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Maintain the full-text search index
+"""
+import argparse
+import json
+
+from app.core.search import document_index
+
+def main():
+    parser = argparse.ArgumentParser(description="Index missed documents, rebuild or optimize the full-text index")
+    parser.add_argument("command", choices=["catch-up", "rebuild", "optimize", "stats"])
+    args = parser.parse_args()
+
+    if args.command == "catch-up":
+        print(f"Indexed {document_index.catch_up()} documents")
+    elif args.command == "rebuild":
+        print(f"Indexed {document_index.rebuild()} documents")
+    elif args.command == "optimize":
+        document_index.optimize()
+        print("Index optimized")
+    else:
+        print(json.dumps(document_index.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Backtest routing rules against stored agent outputs
+"""
+import argparse
+import json
+from datetime import datetime
+
+from app.core.rules import load_rules_document
+from app.core.replay import replay_engine
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored agent outputs through candidate routing rules")
+    parser.add_argument("rules", nargs="?", help="Candidate rules file (JSON, or YAML with PyYAML); defaults to the active rules")
+    parser.add_argument("--mode", choices=["dry_run", "deliver"], default="dry_run")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--input-type")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    report = replay_engine.run(
+        load_rules_document(args.rules) if args.rules else None,
+        mode=args.mode,
+        since=args.since,
+        until=args.until,
+        input_type=args.input_type,
+        limit=args.limit
+    )
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
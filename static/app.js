@@ -3,6 +3,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const statusDiv = document.getElementById('status');
     const traceDiv = document.getElementById('trace');
     let pollInterval = null;
+    let statusStream = null;
 
     uploadForm.addEventListener('submit', async (e) => {
         e.preventDefault();
@@ -34,13 +35,43 @@ document.addEventListener('DOMContentLoaded', () => {
             
             if (data.status === 'processing') {
                 statusDiv.innerHTML = `<span class="processing">Processing started. Process ID: ${data.process_id}</span>`;
-                startPolling(data.process_id);
+                watchStatus(data.process_id);
+            } else if (data.status === 'completed') {
+                // Duplicate upload served from the result cache
+                watchStatus(data.process_id);
             }
         } catch (error) {
             showError(error.message);
         }
     });
 
+    function watchStatus(processId) {
+        if (statusStream) {
+            statusStream.close();
+        }
+        if (!window.EventSource) {
+            startPolling(processId);
+            return;
+        }
+
+        // The server pushes one event per state change
+        statusStream = new EventSource(`/status/${processId}/stream`);
+        statusStream.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            updateTrace(data);
+
+            if (data.status === 'completed' || data.status === 'error') {
+                statusStream.close();
+                updateStatus(data.status);
+            }
+        };
+        statusStream.onerror = () => {
+            // Fall back to polling if the stream cannot be kept open
+            statusStream.close();
+            startPolling(processId);
+        };
+    }
+
     function startPolling(processId) {
         if (pollInterval) {
             clearInterval(pollInterval);
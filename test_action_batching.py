@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test coalescing outbox deliveries into batch requests
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+# Run against a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+import httpx
+
+from app.core.batcher import ActionBatcher, BatchItemFailed
+from app.core.router import ActionRouter
+
+def test_items_are_sent_in_batches_and_fanned_back():
+    """A full buffer is sent at once; the rest goes after max_wait; results map back per item"""
+    sent = []
+
+    async def send(items):
+        sent.append([item["idempotency_key"] for item in items])
+        return {"results": [
+            {"status": "error", "error": "rejected"} if item["payload"].get("bad") else {"id": item["idempotency_key"]}
+            for item in items
+        ]}
+
+    async def run():
+        batcher = ActionBatcher("crm", send, max_items=3, max_wait_ms=30)
+        return await asyncio.gather(
+            *(batcher.submit({"bad": n == 4}, f"k{n}") for n in range(5)),
+            return_exceptions=True
+        ), batcher.stats()
+
+    results, stats = asyncio.run(run())
+    print(f"Requests: {sent}, stats: {stats}")
+    assert sent == [["k0", "k1", "k2"], ["k3", "k4"]]
+    assert results[:4] == [{"id": f"k{n}"} for n in range(4)]
+    assert isinstance(results[4], BatchItemFailed)
+    assert stats["batches"] == 2 and stats["items"] == 5 and stats["buffered"] == 0
+
+def test_failed_batch_fails_every_item():
+    async def send(items):
+        raise httpx.ConnectError("down")
+
+    async def run():
+        batcher = ActionBatcher("crm", send, max_items=10, max_wait_ms=10)
+        return await asyncio.gather(*(batcher.submit({}, f"k{n}") for n in range(3)), return_exceptions=True), batcher
+
+    results, batcher = asyncio.run(run())
+    assert all(isinstance(result, httpx.ConnectError) for result in results)
+    assert batcher.counters["failed_batches"] == 1
+
+def test_router_uses_the_batch_endpoint():
+    """With a batch endpoint configured, deliveries go out as one array request"""
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((str(request.url), json.loads(request.content)))
+        return httpx.Response(200, json={"status": "ok"})
+
+    async def run():
+        os.environ["CRM_BATCH_ENDPOINT"] = "http://crm.test/batch"
+        try:
+            router = ActionRouter()
+        finally:
+            del os.environ["CRM_BATCH_ENDPOINT"]
+        router.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        results = await asyncio.gather(*(router.deliver("crm", {"n": n}, f"p:{n}:crm") for n in range(4)))
+        await router.close()
+        return results
+
+    results = asyncio.run(run())
+    print(f"Requests: {[(url, len(body)) for url, body in requests]}")
+    assert len(requests) == 1 and requests[0][0] == "http://crm.test/batch"
+    assert [item["idempotency_key"] for item in requests[0][1]] == [f"p:{n}:crm" for n in range(4)]
+    # A response without per-item results applies to every item
+    assert results == [{"status": "ok"}] * 4
+
+if __name__ == "__main__":
+    test_items_are_sent_in_batches_and_fanned_back()
+    test_failed_batch_fails_every_item()
+    test_router_uses_the_batch_endpoint()
+    print("All action batching tests passed")
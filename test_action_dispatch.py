@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test concurrent action delivery under per-endpoint limits
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+# Run against a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+import httpx
+
+from app.core.router import ActionRouter
+
+def mock_router(handler) -> ActionRouter:
+    """A router whose endpoints are answered by handler instead of the network"""
+    router = ActionRouter()
+    router.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return router
+
+def test_actions_are_sent_concurrently_within_endpoint_limits():
+    """Different endpoints overlap; each endpoint stays under its own concurrency limit"""
+    in_flight, peak, keys = {}, {}, []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.port
+        in_flight[host] = in_flight.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), in_flight[host])
+        keys.append(request.headers["Idempotency-Key"])
+        await asyncio.sleep(0.2)
+        in_flight[host] -= 1
+        return httpx.Response(200, json={"ok": True})
+
+    async def run():
+        router = mock_router(handler)
+        router.slot_limits["crm"] = 2
+        deliveries = [("crm", n) for n in range(6)] + [("notification", n) for n in range(2)]
+        started = time.monotonic()
+        results = await asyncio.gather(*(
+            router.deliver(action_type, {"n": n}, f"p:{n}:{action_type}") for action_type, n in deliveries
+        ))
+        elapsed = time.monotonic() - started
+        await router.close()
+        return router, results, elapsed
+
+    router, results, elapsed = asyncio.run(run())
+    crm_port, notification_port = (httpx.URL(router.endpoints[t]).port for t in ("crm", "notification"))
+    print(f"8 deliveries of 0.2s took {elapsed:.2f}s, peak in flight: {peak}")
+    assert all(result == {"ok": True} for result in results)
+    assert peak[crm_port] == 2 and peak[notification_port] == 2
+    # Three rounds of CRM calls, with the notifications alongside the first
+    assert 0.55 < elapsed < 1.2
+    assert sorted(keys) == sorted([f"p:{n}:crm" for n in range(6)] + [f"p:{n}:notification" for n in range(2)])
+
+def test_endpoint_limits_survive_a_new_event_loop():
+    """The global router keeps its limits when used from a second event loop"""
+    router = ActionRouter()
+    router.slot_limits["crm"] = 1
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"ok": True})
+
+    async def run(round_number: int):
+        # The HTTP client is tied to its loop too, so each run gets its own
+        router.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        started = time.monotonic()
+        try:
+            # One slot, so every delivery after the first waits on the semaphore
+            results = await asyncio.gather(*(
+                router.deliver("crm", {"n": n}, f"loop{round_number}:{n}:crm") for n in range(3)
+            ))
+        finally:
+            await router.client.aclose()
+        return results, time.monotonic() - started
+
+    # Like an app restart or a second TestClient in the same process
+    rounds = [asyncio.run(run(round_number)) for round_number in range(2)]
+    print(f"Three deliveries through one slot took {[f'{elapsed:.2f}s' for _, elapsed in rounds]}")
+    assert all(result == {"ok": True} for results, _ in rounds for result in results)
+    assert all(elapsed >= 0.15 for _, elapsed in rounds)
+
+def test_failures_are_raised_not_mocked():
+    """A failing endpoint raises instead of returning a made-up success"""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(503)
+
+    async def run():
+        router = mock_router(handler)
+        try:
+            return await asyncio.gather(
+                router.deliver("crm", {}, "p:0:crm"),
+                router.deliver("unknown", {}, "p:1:unknown"),
+                return_exceptions=True
+            )
+        finally:
+            await router.close()
+
+    outcomes = asyncio.run(run())
+    print(f"Outcomes: {[type(outcome).__name__ for outcome in outcomes]}")
+    assert isinstance(outcomes[0], httpx.HTTPStatusError)
+    assert isinstance(outcomes[1], ValueError)
+
+if __name__ == "__main__":
+    test_actions_are_sent_concurrently_within_endpoint_limits()
+    test_endpoint_limits_survive_a_new_event_loop()
+    test_failures_are_raised_not_mocked()
+    print("All action dispatch tests passed")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test that agents run LLM calls concurrently and parsing off the event loop
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+# Keep the LLM response cache out of the working tree
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+
+from app.agents import llm as llm_module
+from app.agents.executor import run_blocking
+from app.agents.json_agent import json_agent
+
+class SlowModel:
+    """Stands in for Gemini: answers after a fixed delay without blocking the loop"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(text='{"business_context": {"type": "order", "priority": "low"}}')
+
+def test_llm_calls_overlap():
+    """Several documents wait on the model at the same time instead of one after another"""
+    model = SlowModel(0.3)
+    original_model, original_cache = json_agent.llm.model, json_agent.llm.cache.enabled
+    json_agent.llm.model = model
+    json_agent.llm.cache.enabled = False
+
+    async def run():
+        documents = [json.dumps({"event_type": "order", "timestamp": "t", "data": {"n": n}}) for n in range(8)]
+        started = time.monotonic()
+        results = await asyncio.gather(*(json_agent.process_json_async(d) for d in documents))
+        return results, time.monotonic() - started
+
+    try:
+        results, elapsed = asyncio.run(run())
+    finally:
+        json_agent.llm.model, json_agent.llm.cache.enabled = original_model, original_cache
+    print(f"{model.calls} model calls of 0.3s took {elapsed:.2f}s")
+    assert all(result["status"] == "success" for result in results)
+    assert model.calls == 8
+    assert elapsed < 1.2
+
+def test_llm_limit_survives_a_new_event_loop():
+    """The concurrency limit works on every loop, not only the first one that waited on it"""
+    model = SlowModel(0.05)
+    saved = (json_agent.llm.model, json_agent.llm.cache.enabled, llm_module.LLM_MAX_CONCURRENCY)
+    json_agent.llm.model = model
+    json_agent.llm.cache.enabled = False
+    # One slot, so every call after the first waits on the semaphore
+    llm_module.LLM_MAX_CONCURRENCY = 1
+
+    async def run():
+        started = time.monotonic()
+        await asyncio.gather(*(json_agent.llm.generate_async(f"prompt {n}") for n in range(3)))
+        return time.monotonic() - started
+
+    try:
+        # Like an app restart or a second TestClient in the same process
+        elapsed = [asyncio.run(run()) for _ in range(2)]
+    finally:
+        json_agent.llm.model, json_agent.llm.cache.enabled, llm_module.LLM_MAX_CONCURRENCY = saved
+    print(f"Three calls through one slot took {elapsed[0]:.2f}s then {elapsed[1]:.2f}s")
+    assert model.calls == 6
+    assert all(seconds >= 0.15 for seconds in elapsed)
+
+def test_blocking_work_runs_on_parse_pool():
+    """run_blocking hands work to the parse threads and keeps the loop free"""
+    async def run():
+        loop_thread = threading.current_thread().name
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        worker_thread = await run_blocking(lambda: (time.sleep(0.3), threading.current_thread().name)[1])
+        ticking.cancel()
+        return loop_thread, worker_thread, ticks
+
+    loop_thread, worker_thread, ticks = asyncio.run(run())
+    print(f"Loop on {loop_thread}, blocking call on {worker_thread}, {ticks} loop ticks meanwhile")
+    assert worker_thread.startswith("parse")
+    assert ticks >= 10
+
+if __name__ == "__main__":
+    test_llm_calls_overlap()
+    test_llm_limit_survives_a_new_event_loop()
+    test_blocking_work_runs_on_parse_pool()
+    print("All async agent tests passed")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test batch uploads: ZIP and NDJSON expansion and spool cleanup
+"""
+import asyncio
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from starlette.datastructures import UploadFile
+
+from app.core import batch
+from app.core.batch import BatchTooLarge, expand_upload
+from app.core.spool import SPOOL_DIR, spool_stream
+import main
+
+def spooled_files() -> set:
+    return set(os.listdir(SPOOL_DIR)) if os.path.isdir(SPOOL_DIR) else set()
+
+def zip_bytes(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+def test_archives_and_streams_are_expanded():
+    """ZIP members and NDJSON lines become separate documents; the source is removed"""
+    before = spooled_files()
+    archive = spool_stream(io.BytesIO(zip_bytes({"a.json": "{}", "b.eml": "Subject: hi", "dir/.hidden": "x"})))
+    zipped = expand_upload("docs.zip", "application/zip", archive)
+    stream = spool_stream(io.BytesIO(b'{"n": 1}\n\n{"n": 2}\n'))
+    lines = expand_upload("events.ndjson", None, stream)
+    single = spool_stream(io.BytesIO(b"{}"))
+    passed = expand_upload("one.json", "application/json", single)
+
+    print(f"ZIP: {[name for name, _ in zipped]}, NDJSON: {[name for name, _ in lines]}")
+    assert [name for name, _ in zipped] == ["a.json", "b.eml"]
+    assert [name for name, _ in lines] == ["events-1.json", "events-3.json"]
+    assert passed == [("one.json", single)]
+    assert not os.path.exists(archive.path) and not os.path.exists(stream.path)
+    for _, item in zipped + lines + passed:
+        item.handle().discard()
+    assert spooled_files() == before
+
+def test_failed_expansion_removes_every_spool_file():
+    """A bad archive or an oversized stream leaves nothing in the spool directory"""
+    before = spooled_files()
+    max_items = batch.BATCH_MAX_ITEMS
+    batch.BATCH_MAX_ITEMS = 2
+    try:
+        for filename, content, error in (
+            ("broken.zip", b"PK\x03\x04 not really a zip", zipfile.BadZipFile),
+            ("many.ndjson", b"{}\n{}\n{}\n", BatchTooLarge),
+        ):
+            try:
+                expand_upload(filename, None, spool_stream(io.BytesIO(content)))
+                raise AssertionError(f"{error.__name__} not raised")
+            except error as e:
+                print(f"{filename}: {type(e).__name__}")
+    finally:
+        batch.BATCH_MAX_ITEMS = max_items
+    assert spooled_files() == before
+
+def test_batch_endpoint_cleans_up_and_accepts_unnamed_files():
+    """A bad ZIP fails the batch without leaking spool files; uploads without a name are accepted"""
+    before = spooled_files()
+    with TestClient(main.app) as client:
+        response = client.post("/process/batch", files=[
+            ("files", ("ok.json", json.dumps({"event_type": "x"}), "application/json")),
+            ("files", ("broken.zip", b"PK\x03\x04 not really a zip", "application/zip")),
+        ])
+    print(f"Bad ZIP: {response.status_code}")
+    assert response.status_code >= 400
+    assert spooled_files() == before
+
+    unnamed = UploadFile(io.BytesIO(json.dumps({"event_type": "x", "n": 1}).encode()))
+    result = asyncio.run(main.process_batch(files=[unnamed], priority=-1, no_cache=True))
+    print(f"Unnamed upload: {result['status']}, {result['total']} document")
+    assert result["status"] == "processing" and result["total"] == 1
+
+def test_size_limit_follows_the_content():
+    """An archive without a .zip name gets the batch limit; a plain document over the single limit is refused"""
+    archive = zip_bytes({f"doc-{n}.json": json.dumps({"event_type": "x", "n": n, "pad": "x" * 100}) for n in range(3)})
+    max_upload_size = main.MAX_UPLOAD_SIZE
+    main.MAX_UPLOAD_SIZE = 200
+    try:
+        unnamed_zip = UploadFile(io.BytesIO(archive), filename="export", headers={"content-type": "application/octet-stream"})
+        result = asyncio.run(main.process_batch(files=[unnamed_zip], priority=-1, no_cache=True))
+        print(f"Extensionless ZIP of {len(archive)} bytes: {result['total']} documents")
+        assert result["total"] == 3
+
+        large = UploadFile(io.BytesIO(json.dumps({"pad": "x" * 300}).encode()), filename="large.json")
+        try:
+            asyncio.run(main.process_batch(files=[large], priority=-1, no_cache=True))
+            raise AssertionError("HTTPException not raised")
+        except HTTPException as e:
+            assert e.status_code == 413
+    finally:
+        main.MAX_UPLOAD_SIZE = max_upload_size
+
+if __name__ == "__main__":
+    test_archives_and_streams_are_expanded()
+    test_failed_expansion_removes_every_spool_file()
+    test_batch_endpoint_cleans_up_and_accepts_unnamed_files()
+    test_size_limit_follows_the_content()
+    print("All batch tests passed")
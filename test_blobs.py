@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test the blob store: offloading, deduplication and sweeping unreferenced blobs
+"""
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Run against a throwaway database and blob directory
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from app.core.blobs import BLOB_REF, BlobStore, blob_store
+from app.core.memory import ProcessingRecord, memory_manager
+from app.core.retention import RetentionManager
+
+def age(store: BlobStore, ref: dict, seconds: int) -> str:
+    """Backdate a blob file so it is past the sweep grace period"""
+    path = store._path(ref[BLOB_REF], ref["codec"])
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+    return path
+
+def add_record(agent_output: dict, created_at: datetime = None) -> str:
+    session = memory_manager.Session()
+    try:
+        process_id = str(uuid.uuid4())
+        session.add(ProcessingRecord(
+            process_id=process_id,
+            input_type="pdf",
+            status="completed",
+            agent_output=agent_output,
+            created_at=created_at or datetime.utcnow()
+        ))
+        session.commit()
+        return process_id
+    finally:
+        session.close()
+
+def test_large_fields_are_offloaded_once():
+    store = BlobStore(root=tempfile.mkdtemp(), min_size=100)
+    output = {"status": "success", "raw_text": "x" * 1000, "summary": "short"}
+    stored = store.offload(output)
+    again = store.offload(dict(output))
+    print(f"Stored as {stored['raw_text']}")
+    assert stored["raw_text"][BLOB_REF] == again["raw_text"][BLOB_REF]
+    assert stored["summary"] == "short"
+    assert store.load(stored["raw_text"]) == output["raw_text"]
+    assert store.stats()["blobs"] == 1
+    # Small values stay inline
+    assert store.offload({"raw_text": "tiny"}) == {"raw_text": "tiny"}
+
+def test_sweep_deletes_only_old_unreferenced_blobs():
+    store = BlobStore(root=tempfile.mkdtemp(), min_size=100)
+    kept = store.offload({"raw_text": f"kept {uuid.uuid4()} " * 100})
+    add_record(kept)
+    orphan = store.offload({"raw_text": f"orphan {uuid.uuid4()} " * 100})
+    young = store.offload({"raw_text": f"young {uuid.uuid4()} " * 100})
+    kept_path = age(store, kept["raw_text"], 7200)
+    orphan_path = age(store, orphan["raw_text"], 7200)
+
+    report = store.sweep(grace_seconds=3600)
+    print(f"Sweep: {report}")
+    assert report["deleted"] == 1 and report["recent_unreferenced"] == 1
+    assert os.path.exists(kept_path) and not os.path.exists(orphan_path)
+    assert store.load(young["raw_text"]).startswith("young")
+
+def test_reusing_an_old_blob_protects_it_from_the_sweep():
+    """put on an existing blob refreshes it, so a record about to reference it does not lose it"""
+    store = BlobStore(root=tempfile.mkdtemp(), min_size=100)
+    text = f"reused {uuid.uuid4()} " * 100
+    path = age(store, store.offload({"raw_text": text})["raw_text"], 7200)
+    store.offload({"raw_text": text})
+    assert store.sweep(grace_seconds=3600)["deleted"] == 0
+    assert os.path.exists(path)
+
+def test_retention_sweeps_blobs_of_removed_records():
+    output = blob_store.offload({"raw_text": f"expired {uuid.uuid4()} " * 1000})
+    path = age(blob_store, output["raw_text"], 7 * 86400)
+    add_record(output, created_at=datetime.utcnow() - timedelta(days=400))
+
+    manager = RetentionManager()
+    manager.mode = "purge"
+    manager.batch_pause = 0
+    report = manager.run_once()
+    print(f"Retention: {report}")
+    assert report["removed"] >= 1 and report["blobs_swept"] >= 1
+    assert not os.path.exists(path)
+
+if __name__ == "__main__":
+    test_large_fields_are_offloaded_once()
+    test_sweep_deletes_only_old_unreferenced_blobs()
+    test_reusing_an_old_blob_protects_it_from_the_sweep()
+    test_retention_sweeps_blobs_of_removed_records()
+    print("All blob store tests passed")
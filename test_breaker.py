@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test the per-endpoint circuit breaker and its adaptive timeout
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+# Run against a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+import httpx
+
+from app.core.breaker import CircuitBreaker, CircuitOpen
+from app.core.router import ActionRouter
+
+def new_breaker(**settings) -> CircuitBreaker:
+    breaker = CircuitBreaker("test")
+    breaker.window_size, breaker.min_calls, breaker.failure_rate = 10, 4, 0.5
+    breaker.open_seconds, breaker.half_open_calls = 0.2, 2
+    for name, value in settings.items():
+        setattr(breaker, name, value)
+    return breaker
+
+def call(breaker: CircuitBreaker, ok: bool) -> None:
+    breaker.before_call()
+    if ok:
+        breaker.record_success(0.01)
+    else:
+        breaker.record_failure()
+
+def test_opens_on_failure_rate_and_recovers_through_half_open():
+    """Open after the failure rate is reached; probes close it again"""
+    breaker = new_breaker()
+    for ok in (True, False, True, False):
+        call(breaker, ok)
+    print(f"After 2 of 4 failed: {breaker.state}")
+    assert breaker.state == "open"
+    try:
+        breaker.before_call()
+        raise AssertionError("CircuitOpen not raised")
+    except CircuitOpen as e:
+        assert 0 < e.retry_after <= 0.2
+
+    time.sleep(0.25)
+    breaker.before_call()
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    # Both probe slots are taken
+    try:
+        breaker.before_call()
+        raise AssertionError("CircuitOpen not raised")
+    except CircuitOpen:
+        pass
+    breaker.record_success(0.01)
+    breaker.record_success(0.01)
+    print(f"After two good probes: {breaker.snapshot()}")
+    assert breaker.state == "closed" and breaker.counters["opened"] == 1
+
+def test_failed_probe_reopens():
+    breaker = new_breaker()
+    for _ in range(4):
+        call(breaker, False)
+    time.sleep(0.25)
+    call(breaker, False)
+    assert breaker.state == "open" and breaker.counters["opened"] == 2
+
+def test_below_min_calls_stays_closed():
+    breaker = new_breaker()
+    for _ in range(3):
+        call(breaker, False)
+    assert breaker.state == "closed"
+
+def test_timeout_follows_latency():
+    """The timeout is the latency percentile times the multiplier, clamped"""
+    breaker = new_breaker(min_timeout=0.5, max_timeout=30, timeout_multiplier=3, timeout_percentile=0.9)
+    assert breaker.timeout() == 30
+    for n in range(10):
+        breaker.before_call()
+        breaker.record_success(0.2 if n < 9 else 2.0)
+    print(f"Timeout after fast calls: {breaker.timeout()}")
+    assert abs(breaker.timeout() - 0.6) < 1e-9
+    breaker.latencies.extend([0.01] * 100)
+    assert breaker.timeout() == 0.5
+
+def test_router_counts_only_server_failures():
+    """5xx and transport errors count against the endpoint; 4xx responses do not"""
+    statuses = iter([500, 502, 404, 503, 400])
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(next(statuses))
+
+    async def run():
+        router = ActionRouter()
+        router.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        router.breakers["crm"] = new_breaker(min_calls=100)
+        for n in range(5):
+            try:
+                await router.deliver("crm", {}, f"p:{n}:crm")
+            except httpx.HTTPStatusError:
+                pass
+        await router.close()
+        return router.breakers["crm"].counters
+
+    counters = asyncio.run(run())
+    print(f"Breaker counters: {counters}")
+    assert counters["failures"] == 3 and counters["successes"] == 2
+
+if __name__ == "__main__":
+    test_opens_on_failure_rate_and_recovers_through_half_open()
+    test_failed_probe_reopens()
+    test_below_min_calls_stays_closed()
+    test_timeout_follows_latency()
+    test_router_counts_only_server_failures()
+    print("All circuit breaker tests passed")
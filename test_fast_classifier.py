@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test the local fast-path classifier and PDF intent classification
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from app.agents.classifier_agent import classifier_agent
+from app.agents.llm import LLMClient
+
+prompts = []
+
+async def fake_generate(self, prompt: str) -> str:
+    """Stands in for Gemini, recording the prompts it gets"""
+    prompts.append(prompt)
+    if prompt.startswith("Classify this content"):
+        return '{"input_type": "email", "business_intent": "Invoice", "confidence": 0.9, "metadata": {"urgency": "high"}}'
+    return '{"document_type": "invoice", "line_items": [], "totals": {"total": 100.0}}'
+
+@contextmanager
+def fake_llm():
+    """Answer model calls with fake_generate"""
+    original = LLMClient.generate_async
+    LLMClient.generate_async = fake_generate
+    try:
+        yield
+    finally:
+        LLMClient.generate_async = original
+
+def test_structured_inputs_skip_the_llm():
+    """JSON and emails with headers are classified locally"""
+    prompts.clear()
+    webhook = json.dumps({"event_type": "payment", "timestamp": "t", "data": {"amount": 10, "invoice": "A-1"}})
+    email = "From: a@example.com\nTo: b@example.com\nSubject: Invoice due\n\nPlease pay the invoice."
+
+    with fake_llm():
+        json_result = asyncio.run(classifier_agent.classify_async(webhook))["classification"]
+        email_result = asyncio.run(classifier_agent.classify_async(email))["classification"]
+    print(f"JSON: {json_result}\nEmail: {email_result}")
+    assert (json_result["input_type"], json_result["method"]) == ("json", "structural_parse")
+    assert (email_result["input_type"], email_result["method"]) == ("email", "header_sniffing")
+    assert not prompts
+
+def test_pdf_magic_bytes_only_decide_the_format():
+    """PDF bytes give the format without claiming an intent, and are never sent to the model"""
+    prompts.clear()
+    with open("test_sample.pdf", "rb") as f:
+        head = f.read(1024)
+
+    with fake_llm():
+        result = asyncio.run(classifier_agent.classify_async(head))["classification"]
+        print(f"PDF head: {result}")
+        assert result["input_type"] == "pdf" and result["method"] == "magic_bytes"
+        assert result["confidence"] < classifier_agent.fast_path_threshold
+        assert not prompts
+
+        extracted = asyncio.run(classifier_agent.classify_extracted_async("INVOICE\nTotal due: $100", "pdf"))
+    print(f"Extracted text: {extracted}")
+    # The model said "email"; the format recognised from the bytes wins
+    assert extracted["classification"]["input_type"] == "pdf"
+    assert extracted["classification"]["business_intent"] == "Invoice"
+    assert extracted["classification"]["metadata"]["urgency"] == "high"
+    assert len(prompts) == 1
+
+def test_pipeline_classifies_pdf_intent():
+    """An uploaded PDF ends up with the intent found in its text"""
+    from fastapi.testclient import TestClient
+    import main
+
+    with fake_llm(), TestClient(main.app) as client:
+        with open("test_sample.pdf", "rb") as f:
+            response = client.post("/process?no_cache=true", files={"file": ("sample.pdf", f, "application/pdf")})
+        process_id = response.json()["process_id"]
+        for _ in range(100):
+            status = client.get(f"/status/{process_id}").json()
+            if status["status"] in ("completed", "error"):
+                break
+            time.sleep(0.1)
+        records = client.get("/records/search?intent=Invoice&fields=process_id,input_type,business_intent&limit=500").json()
+
+    print(f"Final status: {status['status']}, classification: {status['classification']}")
+    assert status["status"] == "completed"
+    assert status["classification"]["input_type"] == "pdf"
+    assert status["classification"]["business_intent"] == "Invoice"
+    assert process_id in [record["process_id"] for record in records["records"]]
+
+if __name__ == "__main__":
+    test_structured_inputs_skip_the_llm()
+    test_pdf_magic_bytes_only_decide_the_format()
+    test_pipeline_classifies_pdf_intent()
+    print("All fast classifier tests passed")
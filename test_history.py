@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test keyset pagination, filters and projection of /history
+"""
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from fastapi.testclient import TestClient
+
+from app.core.memory import ProcessingRecord, memory_manager
+import main
+
+def add_records(input_type: str, created: list, status: str = "completed") -> list:
+    """Store records of one input type created at the given times, in insertion order"""
+    session = memory_manager.Session()
+    try:
+        process_ids = []
+        for created_at in created:
+            process_id = str(uuid.uuid4())
+            session.add(ProcessingRecord(process_id=process_id, input_type=input_type, status=status, created_at=created_at))
+            process_ids.append(process_id)
+        session.commit()
+        return process_ids
+    finally:
+        session.close()
+
+def all_pages(client: TestClient, **params) -> list:
+    """Follow next_cursor to the last page, returning every page"""
+    pages = []
+    cursor = None
+    while True:
+        response = client.get("/history", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = pages[-1]["next_cursor"]
+        if cursor is None:
+            return pages
+
+def test_pages_follow_created_at_then_id():
+    """Rows with the same created_at are ordered by id, and no row is skipped or repeated"""
+    input_type = f"history-{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow()
+    older = add_records(input_type, [now - timedelta(minutes=5)] * 2)
+    tied = add_records(input_type, [now] * 5)
+
+    with TestClient(main.app) as client:
+        pages = all_pages(client, input_type=input_type, limit=3, fields="process_id")
+    order = [item["process_id"] for page in pages for item in page["history"]]
+    print(f"Page sizes: {[len(page['history']) for page in pages]}")
+    assert [len(page["history"]) for page in pages] == [3, 3, 1]
+    assert order == list(reversed(tied)) + list(reversed(older))
+
+def test_new_records_do_not_shift_later_pages():
+    input_type = f"history-{uuid.uuid4().hex[:8]}"
+    now = datetime.utcnow()
+    process_ids = add_records(input_type, [now - timedelta(seconds=n) for n in range(4)])
+
+    with TestClient(main.app) as client:
+        first = client.get("/history", params={"input_type": input_type, "limit": 2}).json()
+        add_records(input_type, [now + timedelta(seconds=1)])
+        second = client.get("/history", params={"input_type": input_type, "limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [item["process_id"] for item in first["history"]] == process_ids[:2]
+    assert [item["process_id"] for item in second["history"]] == process_ids[2:]
+
+def test_filters_and_projection():
+    input_type = f"history-{uuid.uuid4().hex[:8]}"
+    add_records(input_type, [datetime.utcnow()] * 2)
+    failed = add_records(input_type, [datetime.utcnow()], status="error")
+
+    with TestClient(main.app) as client:
+        page = client.get("/history", params={"input_type": input_type, "status": "error", "fields": "process_id,status"}).json()
+        print(f"Filtered: {page}")
+        assert page == {"history": [{"process_id": failed[0], "status": "error"}], "next_cursor": None}
+
+        default = client.get("/history", params={"input_type": input_type, "limit": 1}).json()["history"][0]
+        assert sorted(default) == ["created_at", "input_type", "process_id", "status", "updated_at"]
+
+        for params in ({"fields": "process_id,agent_output"}, {"cursor": "not-a-cursor"}, {"limit": 0}):
+            response = client.get("/history", params=params)
+            print(f"{params}: {response.status_code} {response.json()['detail']}")
+            assert response.status_code == 400
+
+if __name__ == "__main__":
+    test_pages_follow_created_at_then_id()
+    test_new_records_do_not_shift_later_pages()
+    test_filters_and_projection()
+    print("All history tests passed")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test the durable job queue: leases, worker wake-up and lost leases
+"""
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# Run against a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+from app.core.queue import Job, JobWorkerPool, job_queue
+
+def add_job(priority: int = 0) -> Job:
+    """Insert a queued job and return it"""
+    session = job_queue.Session()
+    try:
+        job = job_queue.new_job(process_id=str(uuid.uuid4()), file_name="test.json", priority=priority)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        session.expunge(job)
+        return job
+    finally:
+        session.close()
+
+def set_job(job_id: int, **values) -> None:
+    session = job_queue.Session()
+    try:
+        session.query(Job).filter(Job.id == job_id).update(values)
+        session.commit()
+    finally:
+        session.close()
+
+def test_claim_and_lease_expiry():
+    """A leased job is not claimed twice until its lease expires"""
+    job = add_job(priority=1000000)
+
+    claimed = job_queue.claim("worker-a")
+    print(f"Claimed by worker-a: {claimed.id if claimed else None}")
+    assert claimed is not None and claimed.id == job.id
+    other = job_queue.claim("worker-b")
+    assert other is None or other.id != job.id
+
+    set_job(job.id, lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+    reclaimed = job_queue.claim("worker-b")
+    print(f"Reclaimed by worker-b after expiry: {reclaimed.id if reclaimed else None}")
+    assert reclaimed is not None and reclaimed.id == job.id
+    assert reclaimed.attempts == 2
+
+    # The first worker lost the lease, so it can no longer finish the job
+    assert not job_queue.complete(job.id, "worker-a")
+    assert job_queue.complete(job.id, "worker-b")
+
+def test_idle_workers_wake_on_enqueue():
+    """Idle workers pick up a new job at once instead of at their next poll"""
+    handled = {}
+
+    async def handler(job):
+        handled[job.process_id] = time.monotonic()
+
+    async def run():
+        pool = JobWorkerPool(job_queue, handler, workers=2)
+        pool.poll_interval = pool.max_poll_interval = 30
+        pool.start()
+        await asyncio.sleep(0.3)
+        job = add_job()
+        enqueued = time.monotonic()
+        job_queue.notify_enqueued()
+        for _ in range(50):
+            if job.process_id in handled:
+                break
+            await asyncio.sleep(0.02)
+        await pool.stop()
+        return handled.get(job.process_id, float("inf")) - enqueued
+
+    delay = asyncio.run(run())
+    print(f"Job picked up {delay:.3f}s after enqueue")
+    assert delay < 1
+
+def test_lost_lease_cancels_handler():
+    """A handler stops when its heartbeat finds the lease taken over"""
+    events = []
+
+    async def handler(job):
+        events.append(("started", job.id))
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            events.append(("cancelled", job.id))
+            raise
+
+    async def run():
+        lease_seconds = job_queue.lease_seconds
+        job_queue.lease_seconds = 3
+        pool = JobWorkerPool(job_queue, handler, workers=1)
+        try:
+            job = add_job(priority=1000000)
+            pool.start()
+            for _ in range(50):
+                if ("started", job.id) in events:
+                    break
+                await asyncio.sleep(0.02)
+            set_job(job.id, lease_owner="another-worker")
+            await asyncio.sleep(2)
+        finally:
+            await pool.stop()
+            job_queue.lease_seconds = lease_seconds
+        return job
+
+    job = asyncio.run(run())
+    session = job_queue.Session()
+    try:
+        stored = session.get(Job, job.id)
+        status, owner = stored.status, stored.lease_owner
+    finally:
+        session.close()
+    print(f"Events: {events}, job now {status} owned by {owner}")
+    assert ("cancelled", job.id) in events
+    # Not released: the job belongs to the worker that took it over
+    assert status == "running" and owner == "another-worker"
+
+if __name__ == "__main__":
+    test_claim_and_lease_expiry()
+    test_idle_workers_wake_on_enqueue()
+    test_lost_lease_cancels_handler()
+    print("All job queue tests passed")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test the persistent LLM response cache
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Keep the LLM response cache out of the working tree
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+
+from app.agents.llm import LLMCacheEntry, LLMClient, LLMResponseCache
+
+class CountingModel:
+    """Stands in for Gemini, counting the requests that reach it"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt: str):
+        self.calls += 1
+        return SimpleNamespace(text=f"answer to {prompt}")
+
+    async def generate_content_async(self, prompt: str):
+        return self.generate_content(prompt)
+
+def new_cache(**settings) -> LLMResponseCache:
+    """A cache in its own throwaway database"""
+    shared_url = os.environ["LLM_CACHE_URL"]
+    os.environ["LLM_CACHE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}"
+    try:
+        cache = LLMResponseCache()
+    finally:
+        os.environ["LLM_CACHE_URL"] = shared_url
+    for name, value in settings.items():
+        setattr(cache, name, value)
+    return cache
+
+def new_client(cache: LLMResponseCache, model_name: str = "gemini-1.5-flash") -> LLMClient:
+    client = LLMClient(model_name, cache=cache)
+    client.model = CountingModel()
+    return client
+
+def test_repeated_prompts_hit_the_cache():
+    """The same prompt reaches the model once; the model name is part of the key"""
+    cache = new_cache()
+    client = new_client(cache)
+
+    first = client.generate("Summarize: invoice 42")
+    second = asyncio.run(client.generate_async("Summarize: invoice 42"))
+    other_model = new_client(cache, "gemini-1.5-pro")
+    other_model.generate("Summarize: invoice 42")
+
+    stats = cache.stats()
+    print(f"Model calls: {client.model.calls}, stats: {stats}")
+    assert first == second == "answer to Summarize: invoice 42"
+    assert client.model.calls == 1 and other_model.model.calls == 1
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["entries"] == 2
+
+def test_expired_entries_are_refetched():
+    """Entries older than the TTL count as misses"""
+    cache = new_cache(ttl=timedelta(hours=1))
+    client = new_client(cache)
+    client.generate("prompt")
+
+    session = cache.Session()
+    try:
+        session.query(LLMCacheEntry).update({"created_at": datetime.utcnow() - timedelta(hours=2)})
+        session.commit()
+    finally:
+        session.close()
+    client.generate("prompt")
+    print(f"Model calls after expiry: {client.model.calls}")
+    assert client.model.calls == 2
+
+def test_eviction_keeps_recently_used_entries():
+    """Trimming to max_entries drops the least recently used responses"""
+    cache = new_cache(max_entries=3)
+    client = new_client(cache)
+    for n in range(5):
+        client.generate(f"prompt {n}")
+    # Touch the oldest so it survives
+    client.generate("prompt 0")
+
+    removed = cache.evict()
+    client.model.calls = 0
+    for n in (0, 3, 4):
+        client.generate(f"prompt {n}")
+    print(f"Evicted {removed}, model calls for kept prompts: {client.model.calls}")
+    assert removed == 2
+    assert client.model.calls == 0
+
+def test_export_and_import_warm_a_new_cache():
+    """An exported cache warms an empty one"""
+    source = new_cache()
+    new_client(source).generate("warm me")
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.ndjson")
+    assert source.export_entries(path) == 1
+
+    target = new_cache()
+    assert target.import_entries(path) == 1
+    client = new_client(target)
+    print(f"Warmed response: {client.generate('warm me')!r}")
+    assert client.model.calls == 0
+
+def test_disabled_cache_always_calls_the_model():
+    cache = new_cache(enabled=False)
+    client = new_client(cache)
+    client.generate("prompt")
+    client.generate("prompt")
+    assert client.model.calls == 2 and cache.stats()["entries"] == 0
+
+if __name__ == "__main__":
+    test_repeated_prompts_hit_the_cache()
+    test_expired_entries_are_refetched()
+    test_eviction_keeps_recently_used_entries()
+    test_export_and_import_warm_a_new_cache()
+    test_disabled_cache_always_calls_the_model()
+    print("All LLM cache tests passed")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test outbox delivery: retries with backoff, dead-lettering and leases
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# Run against a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+import httpx
+
+from app.core.breaker import CircuitBreaker
+from app.core.memory import OutboxMessage
+from app.core.outbox import outbox_dispatcher
+from app.core.router import action_router
+
+async def endpoint(request: httpx.Request) -> httpx.Response:
+    """Downstream services: payloads asking to fail get a 503, others may pick the status or a text body"""
+    payload = json.loads(request.content)
+    if payload.get("fail"):
+        return httpx.Response(503)
+    if "status" in payload:
+        return httpx.Response(payload["status"], text=payload.get("text", ""))
+    return httpx.Response(200, json={"received": request.headers["Idempotency-Key"]})
+
+@contextmanager
+def mock_endpoints():
+    """Answer deliveries with endpoint, with fresh breakers"""
+    client, breakers = action_router.client, action_router.breakers
+    action_router.client = httpx.AsyncClient(transport=httpx.MockTransport(endpoint))
+    action_router.breakers = {action_type: CircuitBreaker(action_type) for action_type in action_router.endpoints}
+    try:
+        yield
+    finally:
+        action_router.client, action_router.breakers = client, breakers
+
+def add_message(payload: dict, **values) -> str:
+    """Insert a pending CRM message and return its idempotency key"""
+    key = f"{uuid.uuid4()}:0:crm"
+    session = outbox_dispatcher.Session()
+    try:
+        session.add(OutboxMessage(
+            process_id=key[:36], action_type="crm", payload=payload, idempotency_key=key, status="pending", **values
+        ))
+        session.commit()
+    finally:
+        session.close()
+    return key
+
+def get_message(key: str) -> OutboxMessage:
+    session = outbox_dispatcher.Session()
+    try:
+        message = session.query(OutboxMessage).filter(OutboxMessage.idempotency_key == key).one()
+        session.expunge(message)
+        return message
+    finally:
+        session.close()
+
+def deliver_due() -> list:
+    """Claim and deliver one batch of due messages"""
+    async def run():
+        messages = outbox_dispatcher.claim()
+        if messages:
+            await outbox_dispatcher.deliver(messages)
+        return [m["idempotency_key"] for m in messages]
+    with mock_endpoints():
+        return asyncio.run(run())
+
+def test_delivery_and_retry_schedule():
+    """Successes are recorded with the response; failures are retried later with backoff"""
+    ok = add_message({"n": 1})
+    failing = add_message({"fail": True})
+
+    claimed = deliver_due()
+    delivered, retrying = get_message(ok), get_message(failing)
+    print(f"Delivered: {delivered.status} {delivered.response}; failing: {retrying.status}, "
+          f"next attempt in {(retrying.next_attempt_at - datetime.utcnow()).total_seconds():.1f}s")
+    assert ok in claimed and failing in claimed
+    assert delivered.status == "delivered" and delivered.attempts == 1 and delivered.response == {"received": ok}
+    assert retrying.status == "pending" and retrying.attempts == 1 and "503" in retrying.last_error
+    assert retrying.next_attempt_at > datetime.utcnow() and retrying.lease_owner is None
+    # Not due yet, so the next pass leaves it alone
+    assert failing not in deliver_due()
+
+def test_exhausted_messages_are_dead_lettered():
+    key = add_message({"fail": True}, attempts=outbox_dispatcher.max_attempts - 1)
+    deliver_due()
+    message = get_message(key)
+    print(f"After the last attempt: {message.status}, {message.attempts} attempts")
+    assert message.status == "dead" and message.attempts == outbox_dispatcher.max_attempts
+
+def test_any_2xx_is_delivered():
+    """Bodies that are not JSON are stored as text"""
+    accepted = add_message({"status": 202, "text": "queued for import"})
+    empty = add_message({"status": 204})
+    deliver_due()
+    print(f"202: {get_message(accepted).response!r}, 204: {get_message(empty).response!r}")
+    assert get_message(accepted).status == "delivered" and get_message(accepted).response == "queued for import"
+    assert get_message(empty).status == "delivered" and get_message(empty).response == ""
+
+def test_client_errors_are_dead_lettered_at_once():
+    """A 4xx cannot succeed on resend, except 408 and 429 which are retried"""
+    rejected = add_message({"status": 422})
+    throttled = add_message({"status": 429})
+    timed_out = add_message({"status": 408})
+    deliver_due()
+    print(f"422: {get_message(rejected).status}, 429: {get_message(throttled).status}, 408: {get_message(timed_out).status}")
+    assert get_message(rejected).status == "dead" and get_message(rejected).attempts == 1
+    assert "422" in get_message(rejected).last_error
+    assert get_message(throttled).status == "pending" and get_message(timed_out).status == "pending"
+
+def test_open_circuit_does_not_spend_an_attempt():
+    key = add_message({"n": 2})
+
+    async def run():
+        messages = outbox_dispatcher.claim()
+        breaker = action_router.breakers["crm"]
+        breaker._transition("open")
+        await outbox_dispatcher.deliver(messages)
+
+    with mock_endpoints():
+        asyncio.run(run())
+    message = get_message(key)
+    print(f"With the circuit open: {message.status}, {message.attempts} attempts")
+    assert message.status == "pending" and message.attempts == 0
+    assert message.next_attempt_at > datetime.utcnow()
+
+def test_queued_messages_wake_the_idle_loop():
+    """A message queued in this process is sent at once, not at the next poll"""
+    poll_interval = outbox_dispatcher.poll_interval
+    outbox_dispatcher.poll_interval = 30
+
+    async def run():
+        outbox_dispatcher.start()
+        try:
+            await asyncio.sleep(0.2)
+            key = await asyncio.to_thread(add_message, {"n": 5})
+            outbox_dispatcher.notify_queued()
+            started = asyncio.get_running_loop().time()
+            while get_message(key).status != "delivered":
+                assert asyncio.get_running_loop().time() - started < 2, "the loop was not woken"
+                await asyncio.sleep(0.02)
+            return asyncio.get_running_loop().time() - started
+        finally:
+            await outbox_dispatcher.stop()
+
+    try:
+        with mock_endpoints():
+            elapsed = asyncio.run(run())
+    finally:
+        outbox_dispatcher.poll_interval = poll_interval
+    print(f"Delivered {elapsed:.2f}s after being queued")
+
+def test_idle_polling_backs_off():
+    """With nothing due the claim interval doubles up to the cap, and a delivery resets it"""
+    claims = []
+    saved = (outbox_dispatcher.poll_interval, outbox_dispatcher.max_poll_interval)
+    outbox_dispatcher.poll_interval, outbox_dispatcher.max_poll_interval = 0.01, 0.16
+    outbox_dispatcher.claim = lambda: claims.append(time.monotonic()) or []
+
+    async def run():
+        outbox_dispatcher.start()
+        await asyncio.sleep(0.8)
+        await outbox_dispatcher.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        del outbox_dispatcher.claim
+        outbox_dispatcher.poll_interval, outbox_dispatcher.max_poll_interval = saved
+    gaps = [round(b - a, 2) for a, b in zip(claims, claims[1:])]
+    print(f"Gaps between idle claims: {gaps}")
+    # 0.01 + 0.02 + 0.04 + 0.08 + 0.16 ... instead of one claim every 10ms
+    assert len(claims) < 12
+    assert max(gaps) < 0.3
+
+def test_expired_delivery_leases_are_reclaimed():
+    """A message left delivering by a crashed process is picked up again after its lease"""
+    now = datetime.utcnow()
+    stuck = add_message({"n": 3})
+    held = add_message({"n": 4})
+    session = outbox_dispatcher.Session()
+    try:
+        for key, expires in ((stuck, now - timedelta(seconds=1)), (held, now + timedelta(minutes=5))):
+            session.query(OutboxMessage).filter(OutboxMessage.idempotency_key == key).update(
+                {"status": "delivering", "lease_owner": "crashed", "lease_expires_at": expires}
+            )
+        session.commit()
+    finally:
+        session.close()
+
+    claimed = deliver_due()
+    print(f"Reclaimed: {stuck in claimed}, still leased elsewhere: {held not in claimed}")
+    assert stuck in claimed and get_message(stuck).status == "delivered"
+    assert held not in claimed and get_message(held).status == "delivering"
+
+if __name__ == "__main__":
+    test_delivery_and_retry_schedule()
+    test_exhausted_messages_are_dead_lettered()
+    test_any_2xx_is_delivered()
+    test_client_errors_are_dead_lettered_at_once()
+    test_open_circuit_does_not_spend_an_attempt()
+    test_queued_messages_wake_the_idle_loop()
+    test_idle_polling_backs_off()
+    test_expired_delivery_leases_are_reclaimed()
+    print("All outbox tests passed")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test streaming PDF page extraction and its timeouts
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+# Keep the LLM response cache out of the working tree
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+
+from app.agents.pdf_agent import DocumentScanner, pdf_agent
+
+# The package exports the agent under the module's name
+pdf_module = sys.modules["app.agents.pdf_agent"]
+
+def collect_pages(source, page_count: int) -> list:
+    async def run():
+        return [item async for item in pdf_agent._iter_pages(source, page_count)]
+    return asyncio.run(run())
+
+def test_small_pdf_pages_are_extracted():
+    """A small PDF is read on the parse executor, page by page"""
+    with open("test_sample.pdf", "rb") as f:
+        content = f.read()
+    pages = collect_pages(content, 1)
+    print(f"Pages: {pages}")
+    assert pages == [(0, "INVOICE")]
+
+def test_small_pdf_extraction_is_bounded():
+    """A stuck extraction on the parse executor is given up after the range deadline"""
+    release = threading.Event()
+    original, page_timeout = pdf_module._extract_page_range, pdf_agent.page_timeout
+
+    def stuck_extraction(source, start, end, page_timeout):
+        release.wait(30)
+        return ["late"] * (end - start)
+
+    pdf_module._extract_page_range = stuck_extraction
+    pdf_agent.page_timeout = 0.1
+    try:
+        started = time.monotonic()
+        pages = collect_pages(b"%PDF-1.4", 2)
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+        pdf_module._extract_page_range, pdf_agent.page_timeout = original, page_timeout
+    print(f"Pages: {pages} after {elapsed:.1f}s")
+    assert pages == [(0, None), (1, None)]
+    assert elapsed < 10
+
+def process_fake_pdf(pages: list, max_text_chars: int) -> tuple:
+    """Run process_pdf over the given page texts, returning the result and the pages extracted"""
+    consumed = []
+
+    async def fake_pages(source, page_count):
+        for index, text in enumerate(pages[:page_count]):
+            consumed.append(index)
+            yield index, text
+
+    class Model:
+        async def generate_content_async(self, prompt):
+            return SimpleNamespace(text='{"document_type": "report"}')
+
+    saved = (pdf_module._count_pages, pdf_agent._iter_pages, pdf_agent.max_text_chars, pdf_agent.llm.model, pdf_agent.llm.cache.enabled)
+    pdf_module._count_pages = lambda source: len(pages)
+    pdf_agent._iter_pages = fake_pages
+    pdf_agent.max_text_chars = max_text_chars
+    pdf_agent.llm.model = Model()
+    pdf_agent.llm.cache.enabled = False
+    try:
+        result = asyncio.run(pdf_agent.process_pdf(b"%PDF-1.4"))
+    finally:
+        (pdf_module._count_pages, pdf_agent._iter_pages, pdf_agent.max_text_chars,
+         pdf_agent.llm.model, pdf_agent.llm.cache.enabled) = saved
+    return result, consumed
+
+def test_extraction_stops_once_capped_and_fully_scanned():
+    """Past the text cap, extraction stops as soon as the scanner has found everything"""
+    keywords = " ".join(k for group in pdf_agent.compliance_keywords.values() for k in group)
+    pages = [f"Page {n}: " + "x" * 290 + "\n" for n in range(50)]
+    pages[1] = f"Page 1: {keywords}\n| a | b |\nSigned by: J. Doe\n"
+    result, consumed = process_fake_pdf(pages, 1000)
+    print(f"Consumed pages {consumed}, metadata {result['metadata']}")
+    assert result["status"] == "success"
+    assert consumed == [0, 1, 2, 3]
+    assert len(result["raw_text"]) == 1000
+    assert result["metadata"]["text_truncated"] and result["metadata"]["has_signatures"]
+
+def test_compliance_covers_pages_past_the_text_cap():
+    """Keywords that only appear after the retained text still count"""
+    pages = [f"Page {n}: " + "x" * 290 + "\n" for n in range(20)]
+    pages[-1] = "Processing is subject to GDPR, HIPAA and PCI rules\n"
+    result, consumed = process_fake_pdf(pages, 1000)
+    print(f"Consumed {len(consumed)} pages, compliance {result['compliance_check']}")
+    assert len(consumed) == 20 and len(result["raw_text"]) == 1000
+    assert "GDPR" not in result["raw_text"]
+    assert result["compliance_check"]["risk_level"] == "high"
+    assert set(result["compliance_check"]["keywords_found"]) == {"GDPR", "HIPAA", "PCI"}
+    assert result["metadata"]["text_truncated"]
+
+def test_scanner_matches_across_pages():
+    """Keywords split over a page boundary are still found"""
+    scanner = DocumentScanner({"GDPR": ["data protection"], "PCI": ["payment card"]})
+    scanner.feed("This notice covers data pro")
+    scanner.feed("tection for all customers.\n| a | b |\n")
+    compliance = scanner.compliance()
+    print(f"Compliance: {compliance}, tables: {scanner.has_tables}")
+    assert compliance["keywords_found"] == {"GDPR": ["data protection"]}
+    assert compliance["risk_level"] == "medium" and scanner.has_tables
+
+if __name__ == "__main__":
+    test_small_pdf_pages_are_extracted()
+    test_small_pdf_extraction_is_bounded()
+    test_extraction_stops_once_capped_and_fully_scanned()
+    test_compliance_covers_pages_past_the_text_cap()
+    test_scanner_matches_across_pages()
+    print("All PDF extraction tests passed")
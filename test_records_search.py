@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test the promoted classification columns and /records/search
+"""
+import asyncio
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from fastapi.testclient import TestClient
+
+from app.core import async_memory_manager
+from app.core.memory import ProcessingRecord, history_query, memory_manager
+import main
+
+def add_processed(intent: str, urgency: str, confidence: float, actions: list) -> str:
+    """Write a record the way the pipeline does, through the async memory manager"""
+    async def run():
+        process_id = str(uuid.uuid4())
+        await async_memory_manager.create_record(process_id, "email", {})
+        await async_memory_manager.update_record(process_id, {
+            "status": "completed",
+            "classification": {"input_type": "email", "business_intent": intent, "confidence": confidence},
+            "agent_output": {"analysis": {"urgency": urgency, "document_type": "invoice"}},
+            "actions_triggered": [{"action_type": action, "status": "pending"} for action in actions]
+        })
+        return process_id
+    return asyncio.run(run())
+
+def search(client: TestClient, **params) -> list:
+    response = client.get("/records/search", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()["records"]
+
+def test_search_by_promoted_columns_and_actions():
+    intent = f"Invoice-{uuid.uuid4().hex[:8]}"
+    urgent = add_processed(intent, "high", 0.95, ["crm", "notification"])
+    routine = add_processed(intent, "low", 0.6, ["crm"])
+
+    with TestClient(main.app) as client:
+        records = search(client, intent=intent)
+        print(f"By intent: {records}")
+        assert [record["process_id"] for record in records] == [routine, urgent]
+        assert records[1]["urgency"] == "high" and records[1]["document_type"] == "invoice"
+        assert records[1]["confidence"] == 0.95 and records[1]["input_type"] == "email"
+
+        assert [r["process_id"] for r in search(client, intent=intent, urgency="high")] == [urgent]
+        assert [r["process_id"] for r in search(client, intent=intent, action_type="notification")] == [urgent]
+        assert [r["process_id"] for r in search(client, intent=intent, min_confidence=0.9)] == [urgent]
+        assert search(client, intent=intent, since=(datetime.utcnow() + timedelta(hours=1)).isoformat()) == []
+
+        page = client.get("/records/search", params={"intent": intent, "limit": 1, "fields": "process_id"}).json()
+        assert page["records"] == [{"process_id": routine}] and page["next_cursor"]
+        assert client.get("/records/search", params={"fields": "classification"}).status_code == 400
+
+def test_backfill_promotes_existing_rows():
+    """Rows written before the columns existed become searchable after the backfill"""
+    intent = f"Legacy-{uuid.uuid4().hex[:8]}"
+    session = memory_manager.Session()
+    try:
+        process_id = str(uuid.uuid4())
+        session.add(ProcessingRecord(
+            process_id=process_id,
+            input_type="pdf",
+            status="completed",
+            classification={"business_intent": intent, "confidence": "0.7"},
+            agent_output={"analysis": {"urgency": "medium"}},
+            actions_triggered=[{"action_type": "compliance"}]
+        ))
+        session.commit()
+    finally:
+        session.close()
+
+    memory_manager.backfill_promoted_columns(chunk_size=50)
+    with TestClient(main.app) as client:
+        records = search(client, intent=intent, action_type="compliance")
+    print(f"Backfilled: {records}")
+    assert len(records) == 1 and records[0]["urgency"] == "medium" and records[0]["confidence"] == 0.7
+
+def test_filters_use_an_index():
+    query, _, _ = history_query(50, intent="Invoice", urgency="high")
+    compiled = query.compile(memory_manager.engine)
+    with memory_manager.engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + compiled.string,
+            tuple(compiled.params[name] for name in compiled.positiontup)
+        ).all()
+    details = [row[-1] for row in plan]
+    print(f"Plan: {details}")
+    assert any("USING INDEX" in detail for detail in details)
+    assert not any(detail.startswith("SCAN processing_records") and "INDEX" not in detail for detail in details)
+
+if __name__ == "__main__":
+    test_search_by_promoted_columns_and_actions()
+    test_backfill_promotes_existing_rows()
+    test_filters_use_an_index()
+    print("All records search tests passed")
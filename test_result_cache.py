@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test that duplicate uploads are served from the result cache
+"""
+import json
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from fastapi.testclient import TestClient
+
+from app.agents.llm import LLMClient
+from app.core.memory import OutboxMessage, memory_manager
+import main
+
+llm_calls = []
+
+async def fake_generate(self, prompt: str) -> str:
+    """Stands in for Gemini"""
+    llm_calls.append(prompt)
+    return '{"business_context": {"type": "payment"}, "urgency": "high", "message": "Large payment"}'
+
+@contextmanager
+def fake_llm():
+    """Answer model calls with fake_generate"""
+    original = LLMClient.generate_async
+    LLMClient.generate_async = fake_generate
+    try:
+        yield
+    finally:
+        LLMClient.generate_async = original
+
+def wait_until_done(client: TestClient, process_id: str) -> dict:
+    for _ in range(100):
+        status = client.get(f"/status/{process_id}").json()
+        if status["status"] in ("completed", "error"):
+            return status
+        time.sleep(0.1)
+    return status
+
+def outbox_keys(process_id: str) -> list:
+    session = memory_manager.Session()
+    try:
+        return [m.idempotency_key for m in session.query(OutboxMessage).filter(OutboxMessage.process_id == process_id)]
+    finally:
+        session.close()
+
+def test_duplicate_upload_skips_actions_and_is_indexed():
+    """A cache hit neither repeats the original's actions nor misses the search index"""
+    marker = f"zebra{uuid.uuid4().hex[:8]}"
+    document = json.dumps({"event_type": "payment", "timestamp": "t", "data": {"amount": 20000, "reference": marker}})
+
+    with fake_llm(), TestClient(main.app) as client:
+        first = client.post("/process", files={"file": ("payment.json", document, "application/json")}).json()
+        original = wait_until_done(client, first["process_id"])
+        calls = len(llm_calls)
+
+        second = client.post("/process", files={"file": ("payment-copy.json", document, "application/json")}).json()
+        duplicate = client.get(f"/status/{second['process_id']}").json()
+        batch = client.post("/process/batch", files=[("files", ("payment-batch.json", document, "application/json"))]).json()
+        found = client.get("/search", params={"q": marker}).json()
+
+    print(f"Original actions: {original['actions_triggered']}")
+    print(f"Duplicate: {second['message']}, actions: {duplicate['actions_triggered']}")
+    assert original["status"] == "completed" and original["actions_triggered"]
+    assert second["message"] == "Result served from cache" and len(llm_calls) == calls
+    assert duplicate["status"] == "completed"
+    assert [a["action_type"] for a in duplicate["actions_triggered"]] == [a["action_type"] for a in original["actions_triggered"]]
+    assert all(a["status"] == "skipped" and "idempotency_key" not in a for a in duplicate["actions_triggered"])
+    assert outbox_keys(first["process_id"]) and not outbox_keys(second["process_id"])
+    assert batch["cached"] == 1 and not outbox_keys(batch["process_ids"][0])
+
+    hits = {hit["process_id"] for hit in found["results"]}
+    print(f"Search for {marker}: {sorted(hits)}")
+    assert {first["process_id"], second["process_id"], batch["process_ids"][0]} <= hits
+
+if __name__ == "__main__":
+    test_duplicate_upload_skips_actions_and_is_indexed()
+    print("All result cache tests passed")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test retention: batched archive and purge, related rows, the lease and cached status entries
+"""
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from sqlalchemy import text
+
+from app.core import async_memory_manager, status_cache
+from app.core.blobs import BlobStore, blob_store
+from app.core.memory import OutboxMessage, ProcessingRecord, RecordAction, memory_manager
+from app.core.queue import Job
+from app.core.retention import RetentionManager
+from app.core.search import FTS_TABLE, document_index
+
+# Older than anything other tests create, so each pass here only sees its own records
+CUTOFF_DAYS = 1000
+
+def add_expired(count: int, status: str = "completed", days_old: int = CUTOFF_DAYS + 10) -> list:
+    session = memory_manager.Session()
+    try:
+        created_at = datetime.utcnow() - timedelta(days=days_old)
+        records = [
+            ProcessingRecord(
+                process_id=str(uuid.uuid4()),
+                input_type="json",
+                status=status,
+                agent_output={"data": {"n": n}},
+                created_at=created_at + timedelta(seconds=n)
+            )
+            for n in range(count)
+        ]
+        session.add_all(records)
+        session.commit()
+        return [record.process_id for record in records]
+    finally:
+        session.close()
+
+def new_manager(mode: str, batch_size: int = 500) -> RetentionManager:
+    manager = RetentionManager()
+    manager.mode = mode
+    manager.max_age = timedelta(days=CUTOFF_DAYS)
+    manager.batch_size = batch_size
+    manager.batch_pause = 0
+    manager.archive_dir = tempfile.mkdtemp()
+    return manager
+
+def remaining(process_ids: list) -> int:
+    session = memory_manager.Session()
+    try:
+        return session.query(ProcessingRecord).filter(ProcessingRecord.process_id.in_(process_ids)).count()
+    finally:
+        session.close()
+
+def test_archive_runs_in_small_batches():
+    process_ids = add_expired(7)
+    unfinished = add_expired(1, status="pending")
+    manager = new_manager("archive", batch_size=3)
+    batches = []
+    delete = manager._delete
+    manager._delete = lambda batch: (batches.append(len(batch)), delete(batch))
+
+    report = manager.run_once()
+    print(f"Batches: {batches}, report: {report}")
+    assert batches == [3, 3, 1] and report["removed"] == 7
+    assert remaining(process_ids) == 0 and remaining(unfinished) == 1
+
+    rows = []
+    for directory, _, files in os.walk(manager.archive_dir):
+        for name in files:
+            with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+                rows.extend(json.loads(line) for line in f)
+    assert sorted(row["process_id"] for row in rows) == sorted(process_ids)
+    assert all(os.path.basename(directory).startswith("date=") for directory, _, files in os.walk(manager.archive_dir) if files)
+
+def test_archive_resolves_blobs():
+    text_value = f"archived body {uuid.uuid4()} " * 50
+    agent_output = BlobStore(root=blob_store.root, min_size=10).offload({"raw_text": text_value})
+    session = memory_manager.Session()
+    try:
+        process_id = str(uuid.uuid4())
+        session.add(ProcessingRecord(
+            process_id=process_id, input_type="pdf", status="completed", agent_output=agent_output,
+            created_at=datetime.utcnow() - timedelta(days=CUTOFF_DAYS + 5)
+        ))
+        session.commit()
+    finally:
+        session.close()
+    manager = new_manager("archive")
+    manager.run_once()
+    for directory, _, files in os.walk(manager.archive_dir):
+        for name in files:
+            with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+                row = json.loads(f.readline())
+    assert row["process_id"] == process_id and row["agent_output"]["raw_text"] == text_value
+
+def test_purge_removes_related_rows_but_keeps_pending_work():
+    [process_id] = add_expired(1)
+    session = memory_manager.Session()
+    try:
+        session.add_all([
+            RecordAction(process_id=process_id, action_type="crm"),
+            OutboxMessage(process_id=process_id, action_type="crm", idempotency_key=f"{process_id}:0:crm", status="delivered"),
+            OutboxMessage(process_id=process_id, action_type="crm", idempotency_key=f"{process_id}:1:crm", status="pending"),
+            Job(process_id=process_id, file_name="a.json", status="done")
+        ])
+        session.commit()
+    finally:
+        session.close()
+    asyncio.run(document_index.index_document(process_id, "a.json", "purged document"))
+
+    new_manager("purge").run_once()
+    session = memory_manager.Session()
+    try:
+        assert remaining([process_id]) == 0
+        assert session.query(RecordAction).filter(RecordAction.process_id == process_id).count() == 0
+        assert session.query(Job).filter(Job.process_id == process_id).count() == 0
+        assert [m.status for m in session.query(OutboxMessage).filter(OutboxMessage.process_id == process_id)] == ["pending"]
+        if document_index.enabled:
+            assert session.execute(text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH 'purged'")).scalar() == 0
+    finally:
+        session.close()
+
+def test_only_the_lease_holder_runs_a_pass():
+    """Of several worker processes, only the one holding the lease runs; an expired lease is taken over"""
+    process_ids = add_expired(2)
+    first, second = new_manager("purge"), new_manager("purge")
+    first.owner, second.owner = f"worker-a-{uuid.uuid4()}", f"worker-b-{uuid.uuid4()}"
+    session = memory_manager.Session()
+    try:
+        session.execute(text("DELETE FROM maintenance_leases"))
+        session.commit()
+    finally:
+        session.close()
+
+    assert first.claim_lease(60)
+    assert second.run_once(lease=True) is None
+    assert remaining(process_ids) == 2
+    assert first.run_once(lease=True)["removed"] == 2
+
+    # The holder keeps the lease until its next pass; once that lapses another worker takes over
+    assert first.claim_lease(-1)
+    assert second.claim_lease(60) and not first.claim_lease(60)
+
+def test_cached_status_of_a_removed_record_expires():
+    """Another worker's cached entry of a removed record stops being served at its next version check"""
+    [process_id] = add_expired(1)
+    serialize = lambda record: {"status": record.status}
+    cached = asyncio.run(async_memory_manager.get_status(process_id, serialize))
+    new_manager("purge").run_once()
+    assert status_cache.get(process_id) is None
+    # Stand in for a worker process whose cache this pass could not reach
+    status_cache.put(process_id, cached)
+
+    revalidate_after = status_cache.revalidate_after
+    status_cache.revalidate_after = 0
+    try:
+        assert asyncio.run(async_memory_manager.get_status(process_id, serialize)) is None
+        assert status_cache.get(process_id) is None
+    finally:
+        status_cache.revalidate_after = revalidate_after
+
+if __name__ == "__main__":
+    test_archive_runs_in_small_batches()
+    test_archive_resolves_blobs()
+    test_purge_removes_related_rows_but_keeps_pending_work()
+    test_only_the_lease_holder_runs_a_pass()
+    test_cached_status_of_a_removed_record_expires()
+    print("All retention tests passed")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test routing rule compilation, evaluation and hot reload
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+
+# Run against a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+from app.core.rules import RULES_PATH, CompiledRules, RuleEngine, RuleError, load_rules_document
+
+def test_shipped_rules_route_agent_outputs():
+    """The default rules pick one action per group, highest priority first"""
+    rules = CompiledRules(load_rules_document(RULES_PATH))
+
+    payment = {"analysis": {"urgency": "high"}, "data": {"amount": 25000}}
+    actions = rules.evaluate(payment)
+    print(f"Payment: {actions}")
+    assert [target for target, _ in actions] == ["notification", "risk_alert"]
+    assert actions[0][1] == {"priority": "high", "message": "Urgent action required", "source": "agent_analysis"}
+    assert actions[1][1]["amount"] == 25000 and actions[1][1]["details"] == {}
+
+    # gdpr_mention outranks compliance_issues in the shared compliance group
+    pdf = {"compliance_check": {"risk_level": "low", "keywords_found": ["GDPR"]}}
+    actions = rules.evaluate(pdf)
+    print(f"PDF: {actions}")
+    assert [target for target, _ in actions] == ["compliance"]
+    assert actions[0][1]["alert_type"] == "gdpr_mention"
+
+    assert rules.evaluate({"data": {"amount": 10000}}) == []
+    assert rules.evaluate("not a dict") == []
+
+def test_operators_and_shared_predicates():
+    rules = CompiledRules({"rules": [
+        {"name": "big", "target": "a", "when": {"all": [{"path": "x", "op": "gte", "value": 10}, {"path": "tag", "op": "in", "value": ["p", "q"]}]}},
+        {"name": "small", "target": "b", "when": {"all": [{"path": "x", "op": "lt", "value": 10}]}},
+        {"name": "named", "target": "c", "when": {"any": [{"path": "name", "op": "contains", "value": "acme"}, {"path": "flag", "op": "truthy"}]},
+         "payload": {"who": {"$path": ["name", "alias"], "default": "?"}}},
+        {"name": "always", "target": "d"},
+    ]})
+    assert [t for t, _ in rules.evaluate({"x": 10, "tag": "q"})] == ["a", "d"]
+    assert [t for t, _ in rules.evaluate({"x": 9.5, "tag": "q"})] == ["b", "d"]
+    assert rules.evaluate({"name": "acme corp"})[0] == ("c", {"who": "acme corp"})
+    assert rules.evaluate({"flag": 1})[0] == ("c", {"who": "?"})
+
+def test_invalid_rules_are_rejected():
+    for document in (
+        {},
+        {"rules": [{"name": "no target", "when": {}}]},
+        {"rules": [{"target": "a", "when": {"all": [{"path": "x", "op": "near"}]}}]},
+        {"rules": [{"target": "a", "when": {"all": [{"path": "x", "op": "gt", "value": "ten"}]}}]},
+    ):
+        try:
+            CompiledRules(document)
+            raise AssertionError(f"RuleError not raised for {document}")
+        except RuleError as e:
+            print(f"Rejected: {e}")
+
+def test_reload_picks_up_edits_and_skips_a_broken_file_until_it_changes():
+    """A broken edit keeps the old rules and is reported once, not on every check"""
+    path = os.path.join(tempfile.mkdtemp(), "rules.json")
+
+    def write(document, mtime):
+        with open(path, "w") as f:
+            f.write(document if isinstance(document, str) else json.dumps(document))
+        os.utime(path, (mtime, mtime))
+
+    errors = []
+    handler = logging.Handler()
+    handler.emit = lambda record: errors.append(record.getMessage()) if record.levelno >= logging.ERROR else None
+    logging.getLogger("app.core.rules").addHandler(handler)
+    try:
+        now = time.time()
+        write({"rules": [{"target": "a"}]}, now - 30)
+        engine = RuleEngine(path)
+        engine.check_interval = 0
+
+        write({"rules": [{"target": "b"}]}, now - 20)
+        assert engine.evaluate({}) == [("b", {})]
+
+        write("{not json", now - 10)
+        for _ in range(3):
+            assert engine.evaluate({}) == [("b", {})]
+        print(f"Errors for the broken file: {errors}")
+        assert len(errors) == 1
+
+        write({"rules": [{"target": "c"}]}, now)
+        assert engine.evaluate({}) == [("c", {})]
+    finally:
+        logging.getLogger("app.core.rules").removeHandler(handler)
+
+if __name__ == "__main__":
+    test_shipped_rules_route_agent_outputs()
+    test_operators_and_shared_predicates()
+    test_invalid_rules_are_rejected()
+    test_reload_picks_up_edits_and_skips_a_broken_file_until_it_changes()
+    print("All routing rule tests passed")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test the SQLite FTS5 document index and /search
+"""
+import asyncio
+import os
+import random
+import string
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from fastapi.testclient import TestClient
+
+from app.core.blobs import BlobStore, blob_store
+from app.core.memory import ProcessingRecord, memory_manager
+from app.core.search import document_index
+import main
+
+def unique_word() -> str:
+    """A letters-only token no other test document contains"""
+    return "".join(random.choices(string.ascii_lowercase, k=12))
+
+def add_record(input_type: str, file_name: str, agent_output: dict, created_at: datetime = None) -> str:
+    session = memory_manager.Session()
+    try:
+        process_id = str(uuid.uuid4())
+        session.add(ProcessingRecord(
+            process_id=process_id,
+            input_type=input_type,
+            input_metadata={"filename": file_name},
+            status="completed",
+            agent_output=agent_output,
+            created_at=created_at or datetime.utcnow()
+        ))
+        session.commit()
+        return process_id
+    finally:
+        session.close()
+
+def index(process_id: str, title: str, body: str) -> bool:
+    return asyncio.run(document_index.index_document(process_id, title, body))
+
+def search(client: TestClient, q: str, **params) -> list:
+    response = client.get("/search", params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()["results"]
+
+def test_matches_are_ranked_and_highlighted():
+    """Title matches outrank body matches, and terms match their stems"""
+    word = unique_word()
+    # Unrelated documents, so the term is rare enough for BM25 to score it
+    for n in range(3):
+        filler = add_record("pdf", f"filler-{n}.pdf", {})
+        index(filler, f"filler-{n}.pdf", "Nothing to see here")
+    in_body = add_record("pdf", "notes.pdf", {})
+    in_title = add_record("pdf", f"{word}.pdf", {})
+    assert index(in_body, "notes.pdf", f"The {word} invoices are attached for review")
+    assert index(in_title, f"{word}.pdf", "Quarterly summary")
+    assert not index(str(uuid.uuid4()), "missing", "no such record")
+
+    with TestClient(main.app) as client:
+        results = search(client, word)
+        print(f"Results: {[(r['process_id'][:8], r['score'], r['title']) for r in results]}")
+        assert [r["process_id"] for r in results] == [in_title, in_body]
+        assert results[0]["score"] > results[1]["score"] > 0
+        assert f"<mark>{word}</mark>" in results[0]["title"]
+        assert f"<mark>{word}</mark>" in results[1]["snippet"]
+
+        # Porter stemming: "invoice" finds "invoices"
+        assert [r["process_id"] for r in search(client, f"{word} AND invoice")] == [in_body]
+        assert [r["process_id"] for r in search(client, f'"{word} invoices"')] == [in_body]
+
+def test_metadata_and_date_filters():
+    word = unique_word()
+    input_type = f"search-{uuid.uuid4().hex[:8]}"
+    recent = add_record(input_type, "a.json", {})
+    old = add_record(input_type, "b.json", {}, created_at=datetime.utcnow() - timedelta(days=40))
+    other = add_record("email", "c.eml", {})
+    for process_id in (recent, old, other):
+        index(process_id, "", f"{word} payment")
+
+    with TestClient(main.app) as client:
+        assert {r["process_id"] for r in search(client, word, input_type=input_type)} == {recent, old}
+        since = (datetime.utcnow() - timedelta(days=7)).isoformat()
+        assert [r["process_id"] for r in search(client, word, input_type=input_type, since=since)] == [recent]
+        assert [r["process_id"] for r in search(client, word, until=since)] == [old]
+        assert len(search(client, word, limit=2)) == 2
+        assert len(search(client, word, limit=2, offset=2)) == 1
+
+        for q in ('"unterminated', "   "):
+            response = client.get("/search", params={"q": q})
+            print(f"{q!r}: {response.status_code} {response.json()['detail']}")
+            assert response.status_code == 400
+
+def test_catch_up_indexes_missed_records_from_the_blob_store():
+    """Completed records without a document are indexed, reading offloaded text back"""
+    word = unique_word()
+    agent_output = BlobStore(root=blob_store.root, min_size=10).offload({"raw_text": f"Contract mentioning {word} and HIPAA"})
+    process_id = add_record("pdf", "contract.pdf", agent_output)
+
+    assert document_index.catch_up(chunk_size=50) >= 1
+    assert document_index.catch_up() == 0
+    with TestClient(main.app) as client:
+        results = search(client, f"{word} hipaa")
+    print(f"After catch-up: {results}")
+    assert [r["process_id"] for r in results] == [process_id]
+    assert results[0]["title"] == "contract.pdf"
+
+if __name__ == "__main__":
+    test_matches_are_ranked_and_highlighted()
+    test_metadata_and_date_filters()
+    test_catch_up_indexes_missed_records_from_the_blob_store()
+    print("All search tests passed")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test streaming uploads to the spool directory
+"""
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp())
+
+from starlette.datastructures import UploadFile
+
+from app.core.spool import CHUNK_SIZE, SPOOL_DIR, DocumentHandle, UploadTooLarge, spool_stream, spool_upload
+
+def spooled_files() -> set:
+    return set(os.listdir(SPOOL_DIR)) if os.path.isdir(SPOOL_DIR) else set()
+
+def test_upload_is_streamed_and_fingerprinted():
+    """A multi-chunk upload lands on disk with its size and SHA-256"""
+    data = os.urandom(CHUNK_SIZE * 2 + 123)
+    upload = asyncio.run(spool_upload(UploadFile(io.BytesIO(data), filename="big.bin")))
+    handle = upload.handle()
+    print(f"Spooled {upload.size} bytes to {upload.path}")
+    assert upload.size == len(data) == handle.size
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert handle.head(4) == data[:4] and handle.read_bytes() == data
+    handle.discard()
+    assert not os.path.exists(upload.path)
+
+def test_oversized_upload_leaves_nothing_behind():
+    """Exceeding the limit raises and removes the partial file"""
+    before = spooled_files()
+    for spool in (
+        lambda: asyncio.run(spool_upload(UploadFile(io.BytesIO(b"x" * (CHUNK_SIZE + 1))), max_size=CHUNK_SIZE)),
+        lambda: spool_stream(io.BytesIO(b"x" * (CHUNK_SIZE + 1)), max_size=CHUNK_SIZE),
+    ):
+        try:
+            spool()
+            raise AssertionError("UploadTooLarge not raised")
+        except UploadTooLarge as e:
+            print(f"Rejected: {e}")
+    assert spooled_files() == before
+
+def test_document_handle_decodes_once():
+    """Text falls back to latin-1 and in-memory handles behave like spooled ones"""
+    handle = DocumentHandle(data="café".encode("latin-1"))
+    assert handle.text() == "café"
+    assert handle.pdf_source() == "café".encode("latin-1")
+
+    spooled = spool_stream(io.BytesIO("naïve".encode("utf-8")))
+    handle = spooled.handle()
+    assert handle.text() == "naïve" and handle.pdf_source() == spooled.path
+    handle.discard()
+    handle.discard()
+
+if __name__ == "__main__":
+    test_upload_is_streamed_and_fingerprinted()
+    test_oversized_upload_leaves_nothing_behind()
+    test_document_handle_decodes_once()
+    print("All spool tests passed")
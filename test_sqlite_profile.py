@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test the tuned SQLite engine profile and concurrent writers from several processes
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+
+# Run against a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+from sqlalchemy import text
+
+from app.core.async_memory import create_async_database_engine
+from app.core.memory import create_database_engine, uses_sqlite_profile
+
+def pragmas(connection) -> dict:
+    return {
+        name: connection.execute(text(f"PRAGMA {name}")).scalar()
+        for name in ("journal_mode", "synchronous", "busy_timeout", "auto_vacuum", "temp_store")
+    }
+
+def temp_url() -> str:
+    return f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'profile.db')}"
+
+def test_file_databases_get_the_profile():
+    engine = create_database_engine(temp_url())
+    with engine.connect() as connection:
+        settings = pragmas(connection)
+    print(f"Sync engine: {settings}")
+    # synchronous=NORMAL is 1, auto_vacuum=INCREMENTAL is 2, temp_store=MEMORY is 2
+    assert settings == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 30000, "auto_vacuum": 2, "temp_store": 2}
+
+    async def read_async():
+        engine = create_async_database_engine(temp_url())
+        async with engine.connect() as connection:
+            settings = await connection.run_sync(pragmas)
+        await engine.dispose()
+        return settings
+
+    settings = asyncio.run(read_async())
+    print(f"Async engine: {settings}")
+    assert settings["journal_mode"] == "wal" and settings["synchronous"] == 1
+
+def test_profile_can_be_switched_off():
+    assert not uses_sqlite_profile("sqlite:///:memory:")
+    assert not uses_sqlite_profile("postgresql://db/flowbit")
+    os.environ["SQLITE_TUNING"] = "false"
+    try:
+        assert not uses_sqlite_profile(temp_url())
+        engine = create_database_engine(temp_url())
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+    finally:
+        del os.environ["SQLITE_TUNING"]
+
+def write_rows(url: str, worker: int, rows: int) -> None:
+    """Insert rows one transaction at a time, as a separate worker process would"""
+    engine = create_database_engine(url)
+    for n in range(rows):
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO writes (worker, n) VALUES (:w, :n)"), {"w": worker, "n": n})
+    engine.dispose()
+
+def test_concurrent_writer_processes_do_not_fail():
+    """Writers in several processes wait for the lock instead of raising 'database is locked'"""
+    url = temp_url()
+    engine = create_database_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE writes (id INTEGER PRIMARY KEY, worker INTEGER, n INTEGER)"))
+
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=write_rows, args=(url, worker, 200)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+    with engine.connect() as connection:
+        count = connection.execute(text("SELECT count(*) FROM writes")).scalar()
+    print(f"Exit codes: {[p.exitcode for p in workers]}, rows: {count}")
+    assert all(process.exitcode == 0 for process in workers)
+    assert count == 800
+
+if __name__ == "__main__":
+    test_file_databases_get_the_profile()
+    test_profile_can_be_switched_off()
+    test_concurrent_writer_processes_do_not_fail()
+    print("All SQLite profile tests passed")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test the /status payload cache: in-process invalidation, revalidation and ETags
+"""
+import asyncio
+import json
+import os
+import tempfile
+import uuid
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, update
+
+from app.core import async_memory_manager, status_cache
+from app.core.memory import ProcessingRecord, memory_manager
+import main
+
+def serialize(record: ProcessingRecord) -> dict:
+    return {"process_id": record.process_id, "status": record.status}
+
+def statements_during(coro) -> tuple:
+    """Run a coroutine and list the statements it sent to the database"""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0])
+
+    engine = async_memory_manager.engine.sync_engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        return asyncio.run(coro), statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+def written_elsewhere(statement) -> None:
+    """Change the table the way another worker process would, bypassing this process's cache"""
+    with memory_manager.engine.begin() as conn:
+        conn.execute(statement)
+
+def test_fresh_entries_are_served_without_a_query():
+    process_id = str(uuid.uuid4())
+    asyncio.run(async_memory_manager.create_record(process_id, "json", {}))
+    first, statements = statements_during(async_memory_manager.get_status(process_id, serialize))
+    assert "SELECT" in statements
+    again, statements = statements_during(async_memory_manager.get_status(process_id, serialize))
+    print(f"Cached read sent {statements}")
+    assert again is first and statements == []
+
+def test_local_writes_replace_the_entry():
+    """Staged transitions and flushes drop the entry, so polls see them at once"""
+    async def run():
+        process_id = str(uuid.uuid4())
+        await async_memory_manager.create_record(process_id, "json", {})
+        before = await async_memory_manager.get_status(process_id, serialize)
+        async_memory_manager.stage_update(process_id, {"status": "processed"})
+        staged = await async_memory_manager.get_status(process_id, serialize)
+        await async_memory_manager.flush_state()
+        flushed = await async_memory_manager.get_status(process_id, serialize)
+        return process_id, before, staged, flushed
+
+    process_id, before, staged, flushed = asyncio.run(run())
+    assert json.loads(staged.body)["status"] == "processed" and staged.etag != before.etag
+    # The flush moved the row version but not the payload
+    assert flushed.version != staged.version and flushed.etag == staged.etag
+    assert status_cache.get(process_id) is flushed
+
+def test_stale_entries_are_revalidated_against_the_row():
+    """Past the revalidation window, writes and deletes by other processes are noticed"""
+    process_id = str(uuid.uuid4())
+    asyncio.run(async_memory_manager.create_record(process_id, "json", {}))
+    cached = asyncio.run(async_memory_manager.get_status(process_id, serialize))
+    revalidate_after = status_cache.revalidate_after
+    status_cache.revalidate_after = 0
+    try:
+        # Unchanged row: one version read, same entry
+        same, statements = statements_during(async_memory_manager.get_status(process_id, serialize))
+        assert same is cached and statements == ["SELECT"]
+
+        written_elsewhere(update(ProcessingRecord).where(ProcessingRecord.process_id == process_id).values(status="completed"))
+        changed = asyncio.run(async_memory_manager.get_status(process_id, serialize))
+        print(f"After a write elsewhere: {changed.body}")
+        assert json.loads(changed.body)["status"] == "completed"
+
+        written_elsewhere(delete(ProcessingRecord).where(ProcessingRecord.process_id == process_id))
+        assert asyncio.run(async_memory_manager.get_status(process_id, serialize)) is None
+        assert status_cache.get(process_id) is None
+    finally:
+        status_cache.revalidate_after = revalidate_after
+
+def test_status_endpoint_answers_conditional_requests():
+    session = memory_manager.Session()
+    try:
+        process_id = str(uuid.uuid4())
+        session.add(ProcessingRecord(process_id=process_id, input_type="json", status="completed"))
+        session.commit()
+    finally:
+        session.close()
+
+    with TestClient(main.app) as client:
+        response = client.get(f"/status/{process_id}")
+        etag = response.headers["etag"]
+        print(f"Status {response.status_code}, ETag {etag}")
+        assert response.status_code == 200 and response.json()["status"] == "completed"
+
+        not_modified = client.get(f"/status/{process_id}", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304 and not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+        assert client.get(f"/status/{process_id}", headers={"If-None-Match": '"other"'}).status_code == 200
+        assert client.get(f"/status/{uuid.uuid4()}").status_code == 404
+
+if __name__ == "__main__":
+    test_fresh_entries_are_served_without_a_query()
+    test_local_writes_replace_the_entry()
+    test_stale_entries_are_revalidated_against_the_row()
+    test_status_endpoint_answers_conditional_requests()
+    print("All status cache tests passed")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test status change events and the Server-Sent Events status stream
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Run against throwaway storage
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("LLM_CACHE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_cache.db')}")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp())
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp())
+
+from fastapi.testclient import TestClient
+
+from app.agents.llm import LLMClient
+from app.core.events import StatusBroadcaster
+import main
+
+async def slow_generate(self, prompt: str) -> str:
+    """Stands in for Gemini, slowly enough for a client to watch the transitions"""
+    await asyncio.sleep(0.5)
+    if prompt.startswith("Classify this content"):
+        return '{"input_type": "json", "business_intent": "Order", "confidence": 0.9}'
+    return '{"business_context": {"type": "order"}}'
+
+@contextmanager
+def fake_llm():
+    original = LLMClient.generate_async
+    LLMClient.generate_async = slow_generate
+    try:
+        yield
+    finally:
+        LLMClient.generate_async = original
+
+def test_events_cross_threads_and_closed_loops():
+    """Publishing from a worker thread reaches the subscriber's loop; dead loops are dropped"""
+    broadcaster = StatusBroadcaster()
+
+    async def watch():
+        events = broadcaster.subscribe("p1")
+        threading.Thread(target=broadcaster.publish, args=("p1", "processed"), kwargs={"step": 2}).start()
+        return await asyncio.wait_for(events.get(), 2)
+
+    event = asyncio.run(watch())
+    print(f"Received: {event}")
+    assert event == {"process_id": "p1", "status": "processed", "step": 2}
+
+    # The loop of that subscriber is closed now; publishing unsubscribes it
+    broadcaster.publish("p1", "completed")
+    assert "p1" not in broadcaster._subscribers
+
+def test_stream_follows_a_job_to_completion():
+    """The stream sends one payload per state change and ends after completion"""
+    document = json.dumps({"event_type": "order", "timestamp": "t", "data": {"stream": time.time()}})
+    with fake_llm(), TestClient(main.app) as client:
+        process_id = client.post("/process?no_cache=true", files={"file": ("order.json", document, "application/json")}).json()["process_id"]
+        statuses = []
+        with client.stream("GET", f"/status/{process_id}/stream") as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            for line in response.iter_lines():
+                if line.startswith("data: "):
+                    statuses.append(json.loads(line[len("data: "):])["status"])
+        missing = client.get("/status/does-not-exist/stream")
+
+    print(f"Streamed statuses: {statuses}")
+    assert statuses[-1] == "completed"
+    assert len(statuses) >= 2 and len(statuses) == len(set(statuses))
+    assert missing.status_code == 404
+
+if __name__ == "__main__":
+    test_events_cross_threads_and_closed_loops()
+    test_stream_follows_a_job_to_completion()
+    print("All status stream tests passed")
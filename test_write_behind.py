@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test the write-behind job state buffer: staged transitions, overlay and grouped flushes
+"""
+import asyncio
+import os
+import tempfile
+import uuid
+
+# Run against a throwaway database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+from sqlalchemy import event
+
+from app.core import async_memory_manager
+from app.core.memory import OutboxMessage, ProcessingRecord, memory_manager
+
+def stored(process_id: str) -> ProcessingRecord:
+    """The row as committed, without the staged overlay"""
+    session = memory_manager.Session()
+    try:
+        return session.query(ProcessingRecord).filter(ProcessingRecord.process_id == process_id).one()
+    finally:
+        session.close()
+
+class StatementCounter:
+    """Counts statements sent to the database while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement.split()[0])
+
+def test_staged_transitions_are_visible_before_they_are_written():
+    async def run():
+        process_id = str(uuid.uuid4())
+        await async_memory_manager.create_record(process_id, "json", {"filename": "a.json"})
+        async_memory_manager.stage_update(process_id, {"status": "classified", "classification": {"business_intent": "RFQ"}})
+        async_memory_manager.stage_update(process_id, {"status": "processed"})
+        overlaid = await async_memory_manager.get_record(process_id)
+        committed = stored(process_id)
+        return process_id, overlaid, committed
+
+    process_id, overlaid, committed = asyncio.run(run())
+    print(f"Overlay: {overlaid.status}/{overlaid.business_intent}, committed: {committed.status}")
+    assert overlaid.status == "processed" and overlaid.business_intent == "RFQ"
+    assert committed.status == "pending"
+    asyncio.run(async_memory_manager.flush_state())
+
+def test_flush_writes_many_jobs_in_one_grouped_commit():
+    """Transitions of many jobs go out as primary-key updates without re-selecting the rows"""
+    async def run():
+        process_ids = [str(uuid.uuid4()) for _ in range(20)]
+        for process_id in process_ids:
+            await async_memory_manager.create_record(process_id, "email", {})
+            async_memory_manager.stage_update(process_id, {"status": "classified"})
+            async_memory_manager.stage_update(process_id, {"status": "processed"})
+        with StatementCounter(async_memory_manager.engine.sync_engine) as counter:
+            written = await async_memory_manager.flush_state()
+        return process_ids, written, counter.statements
+
+    process_ids, written, statements = asyncio.run(run())
+    print(f"Flushed {written} records with statements {statements}")
+    assert written == 20
+    assert statements.count("UPDATE") == 1 and "SELECT" not in statements
+    assert all(stored(process_id).status == "processed" for process_id in process_ids)
+
+def test_completion_applies_staged_updates_with_the_outbox():
+    """The final transition, staged fields and outbox rows commit together"""
+    async def run():
+        process_id = str(uuid.uuid4())
+        await async_memory_manager.create_record(process_id, "pdf", {})
+        async_memory_manager.stage_update(process_id, {"status": "processed", "agent_output": {"status": "success"}})
+        queued = await async_memory_manager.complete_with_outbox(
+            process_id, {"status": "completed"}, [("crm", {"n": 1}), ("notification", {"n": 2})]
+        )
+        return process_id, queued
+
+    process_id, queued = asyncio.run(run())
+    record = stored(process_id)
+    session = memory_manager.Session()
+    try:
+        keys = [m.idempotency_key for m in session.query(OutboxMessage).filter(OutboxMessage.process_id == process_id)]
+    finally:
+        session.close()
+    print(f"Completed with {queued}")
+    assert record.status == "completed" and record.agent_output == {"status": "success"}
+    assert sorted(keys) == sorted(action["idempotency_key"] for action in queued)
+    assert record.actions_triggered == queued
+    # Nothing is left staged for the next flush
+    assert not async_memory_manager.state.overlay(process_id)
+
+def test_flush_never_lands_after_a_newer_direct_write():
+    """Flushes and completions share one lock, so a staged state never overwrites the final one"""
+    async def run():
+        process_ids = [str(uuid.uuid4()) for _ in range(20)]
+        for process_id in process_ids:
+            await async_memory_manager.create_record(process_id, "json", {})
+            async_memory_manager.stage_update(process_id, {"status": "processed"})
+        await asyncio.gather(
+            async_memory_manager.flush_state(),
+            *(async_memory_manager.complete_with_outbox(process_id, {"status": "completed"}, []) for process_id in process_ids),
+            async_memory_manager.flush_state()
+        )
+        return process_ids
+
+    process_ids = asyncio.run(run())
+    statuses = {stored(process_id).status for process_id in process_ids}
+    print(f"Statuses after racing flushes with completions: {statuses}")
+    assert statuses == {"completed"}
+
+if __name__ == "__main__":
+    test_staged_transitions_are_visible_before_they_are_written()
+    test_flush_writes_many_jobs_in_one_grouped_commit()
+    test_completion_applies_staged_updates_with_the_outbox()
+    test_flush_never_lands_after_a_newer_direct_write()
+    print("All write-behind tests passed")